@@ -33,6 +33,14 @@ class InadequateConfiguration(Exception):
     """A configuration is incompatible with the current state of X."""
 
 
+class CallCancelled(Exception):
+    """A call to xrandr was cancelled."""
+
+
+class CallTimeout(CallCancelled):
+    """A call to xrandr took too long and was cancelled."""
+
+
 class BetterList(list):
     """List that can be split like a string"""
 
@@ -55,6 +63,8 @@ class BetterList(list):
 
 class Size(tuple):
     """2-tuple of width and height that can be created from a '<width>x<height>' string"""
+    __slots__ = ()
+
     def __new__(cls, arg):
         if isinstance(arg, str):
             arg = [int(x) for x in arg.split("x")]
@@ -72,6 +82,8 @@ class Size(tuple):
 class Mode:
     """Object that behaves like a size, but has attributes for name and rates"""
 
+    __slots__ = ('_size', 'name', 'rates')
+
     def __init__(self, size, name, rates):
         self._size = size
         self.name = name
@@ -97,6 +109,8 @@ class Mode:
 
 class Position(tuple):
     """2-tuple of left and top that can be created from a '<left>x<top>' string"""
+    __slots__ = ()
+
     def __new__(cls, arg):
         if isinstance(arg, str):
             arg = [int(x) for x in arg.split("x")]
@@ -114,6 +128,8 @@ class Position(tuple):
 class Geometry(tuple):
     """4-tuple of width, height, left and top that can be created from an XParseGeometry style string"""
     # FIXME: use XParseGeometry instead of an own incomplete implementation
+    __slots__ = ()
+
     def __new__(cls, width, height=None, left=None, top=None):
         if isinstance(width, str):
             width, rest = width.split("x")
@@ -134,6 +150,7 @@ class Geometry(tuple):
 
 class Rotation(str):
     """String that represents a rotation by a multiple of 90 degree"""
+    __slots__ = ()
 
     def __init__(self, _original_me):
         super().__init__()
@@ -0,0 +1,312 @@
+# ARandR -- Another XRandR GUI
+# Copyright (C) 2008 -- 2011 chrysn <chrysn@fsfe.org>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Benchmarks for the screenlayout library, run on synthetic xrandr output.
+
+Run as ``python3 -m screenlayout.benchmark``. Results can be stored with
+--save and compared against such a stored baseline with --compare, which
+fails if an operation got slower by more than the threshold. Operations that
+need Gtk or cairo are skipped if those are not available."""
+
+import collections
+import json
+import math
+import optparse
+import platform
+import sys
+import timeit
+
+from .auxiliary import Position
+from .snap import Snap
+from .snapshot import ReplayBackend, from_output
+from .xrandr import XRandR
+
+RESULTS_FORMAT = 'arandr-benchmark'
+RESULTS_VERSION = 1
+
+FACTOR = 8  # the widget's default zoom factor
+
+
+def synthetic_verbose(outputs, modes):
+    """Return text that looks like ``xrandr --verbose`` on a display with
+    `outputs` connected outputs of `modes` mode lines each, all outputs
+    arranged in a square grid in their first mode."""
+    sizes = [(640 + 32 * i, 480 + 18 * i) for i in range(max(1, modes // 3 + 1))]
+    columns = int(math.ceil(math.sqrt(outputs)))
+    rows = int(math.ceil(outputs / columns))
+    lines = ["Screen 0: minimum 320 x 200, current %d x %d, maximum 32767 x 32767" % (
+        sizes[0][0] * columns, sizes[0][1] * rows)]
+    for out in range(outputs):
+        lines.append(
+            "DP-%d connected %dx%d+%d+%d (0x%x) normal (normal left inverted right x axis y axis) 527mm x 296mm" % (
+                out, sizes[0][0], sizes[0][1], sizes[0][0] * (out % columns), sizes[0][1] * (out // columns), 0x40)
+        )
+        lines.append("\tIdentifier: 0x%x " % (0x100 + out))
+        lines.append("\tEDID: ")
+        lines.append("\t\t00ffffffffffff0010ac6ca04c4b4b32")
+        for i in range(modes):
+            width, height = sizes[i // 3]
+            rate = 60.0 - (i % 3) * 0.03
+            flags = " *current +preferred" if i == 0 else ""
+            lines.append("  %dx%d (0x%x) 148.500MHz +HSync +VSync%s" % (width, height, 0x40 + i, flags))
+            lines.append("        h: width  %d start 2008 end 2052 total 2200 skew    0 clock  67.50KHz" % width)
+            lines.append("        v: height %d start 1084 end 1089 total 1125           clock  %.2fHz" % (height, rate))
+    return "\n".join(lines) + "\n"
+
+
+class Fixture:
+    """A synthetic display loaded into an XRandR object, and (if Gtk is
+    available) an ARandRWidget showing it"""
+
+    def __init__(self, outputs, modes):
+        self.verbose = synthetic_verbose(outputs, modes)
+        self.xrandr = XRandR(backend=ReplayBackend(from_output(self.verbose)))
+        self.xrandr.load_from_x()
+        self.script = self.xrandr.save_to_shellscript_string()
+        self._widget = None
+
+    def widget(self):
+        """Return the widget, or None if Gtk is not available."""
+        if self._widget is None:
+            try:
+                import gi  # pylint: disable=import-outside-toplevel
+                gi.require_version('Gtk', '3.0')
+                from gi.repository import Gtk  # pylint: disable=import-outside-toplevel
+                if not Gtk.init_check(sys.argv)[0]:
+                    return None
+                from .widget import ARandRWidget  # pylint: disable=import-outside-toplevel
+            except (ImportError, ValueError):
+                return None
+            self._widget = ARandRWidget(window=None, factor=FACTOR, backend=self.xrandr.backend)
+            self._widget.load_from_x()
+        return self._widget
+
+
+#################### operations ####################
+#
+# Each operation takes a Fixture and returns a function to time, or None if
+# it can not be run here.
+
+
+def op_parse(fixture):
+    lines = fixture.verbose.splitlines(True)
+    xrandr = fixture.xrandr
+    return lambda: collections.deque(xrandr._load_raw_lines(lines), 0)  # pylint: disable=protected-access
+
+
+def op_load_from_x(fixture):
+    return fixture.xrandr.load_from_x
+
+
+def op_load_from_string(fixture):
+    return lambda: fixture.xrandr.load_from_string(fixture.script)
+
+
+def op_commandlineargs(fixture):
+    return fixture.xrandr.configuration.commandlineargs
+
+
+def op_save_to_shellscript_string(fixture):
+    return fixture.xrandr.save_to_shellscript_string
+
+
+def op_check_configuration(fixture):
+    return fixture.xrandr.check_configuration
+
+
+def _snap_arguments(fixture):
+    outputs = fixture.xrandr.configuration.outputs
+    moving = next(iter(outputs))
+    return (
+        outputs[moving].size,
+        FACTOR * 5,
+        [(Position((0, 0)), fixture.xrandr.state.virtual.max)] + [
+            (output.position, output.size) for (name, output) in outputs.items() if name != moving and output.active
+        ]
+    )
+
+
+def op_snap_construct(fixture):
+    arguments = _snap_arguments(fixture)
+    return lambda: Snap(*arguments)
+
+
+def op_snap_suggest(fixture):
+    """100 suggestions along a diagonal of the screen"""
+    snap = Snap(*_snap_arguments(fixture))
+    virtual = fixture.xrandr.configuration.virtual
+    points = [Position((virtual[0] * i // 100, virtual[1] * i // 100)) for i in range(100)]
+
+    def suggest():
+        for point in points:
+            snap.suggest(point)
+    return suggest
+
+
+def op_hit_test(fixture):
+    """100 hit tests along a diagonal of the screen"""
+    widget = fixture.widget()
+    if widget is None:
+        return None
+    virtual = fixture.xrandr.configuration.virtual
+    points = [(virtual[0] * i / 100 / FACTOR, virtual[1] * i / 100 / FACTOR) for i in range(100)]
+
+    def hit_test():
+        for point in points:
+            widget._get_point_outputs(*point)  # pylint: disable=protected-access
+    return hit_test
+
+
+def op_draw(fixture):
+    try:
+        import cairo  # pylint: disable=import-outside-toplevel
+        from .render import Renderer  # pylint: disable=import-outside-toplevel
+    except (ImportError, ValueError):
+        return None
+    renderer = Renderer(FACTOR)
+    virtual = fixture.xrandr.state.virtual.max
+    surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, virtual[0] // FACTOR, virtual[1] // FACTOR)
+
+    def draw():
+        context = cairo.Context(surface)
+        renderer.set_up_scale(context)
+        renderer.draw(fixture.xrandr, context)
+        surface.flush()
+    return draw
+
+
+OPERATIONS = collections.OrderedDict([
+    ('parse', op_parse),
+    ('load_from_x', op_load_from_x),
+    ('load_from_string', op_load_from_string),
+    ('commandlineargs', op_commandlineargs),
+    ('save_to_shellscript_string', op_save_to_shellscript_string),
+    ('check_configuration', op_check_configuration),
+    ('snap_construct', op_snap_construct),
+    ('snap_suggest', op_snap_suggest),
+    ('hit_test', op_hit_test),
+    ('draw', op_draw),
+])
+
+
+#################### running ####################
+
+
+def measure(function, repeat=5):
+    """Return the best time in seconds of a single call to `function`"""
+    timer = timeit.Timer(function)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def run(operations, outputs_list, modes_list, repeat=5):
+    """Return a list of result records of all `operations` (names in
+    OPERATIONS) on synthetic displays of all given sizes."""
+    results = []
+    for outputs in outputs_list:
+        for modes in modes_list:
+            fixture = Fixture(outputs, modes)
+            for name in operations:
+                function = OPERATIONS[name](fixture)
+                results.append({
+                    'operation': name,
+                    'outputs': outputs,
+                    'modes': modes,
+                    'seconds': None if function is None else measure(function, repeat),
+                })
+    return results
+
+
+def _key(record):
+    return (record['operation'], record['outputs'], record['modes'])
+
+
+def compare(results, baseline, threshold):
+    """Yield (record, baseline seconds, ratio) of all results that took more
+    than 1 + `threshold` times as long as in the `baseline` results."""
+    old = dict((_key(record), record['seconds']) for record in baseline)
+    for record in results:
+        before = old.get(_key(record))
+        if not before or record['seconds'] is None:
+            continue
+        ratio = record['seconds'] / before
+        if ratio > 1 + threshold:
+            yield record, before, ratio
+
+
+def print_table(results, outputs_list, modes_list):
+    by_key = dict((_key(record), record['seconds']) for record in results)
+    for name in collections.OrderedDict((record['operation'], None) for record in results):
+        print("%s time (ms), outputs x modes per output" % name)
+        print("%8s" % "outputs" + "".join("%10d" % m for m in modes_list))
+        for outputs in outputs_list:
+            row = [by_key.get((name, outputs, modes)) for modes in modes_list]
+            print("%8d" % outputs + "".join(
+                "%10s" % "skipped" if t is None else "%10.3f" % (t * 1000) for t in row
+            ))
+        print()
+
+
+def main():
+    parser = optparse.OptionParser(description=__doc__)
+    parser.add_option('--outputs', default='1,4,16,64,256', help='Comma separated output counts')
+    parser.add_option('--modes', default='10,50,100,500', help='Comma separated mode counts per output')
+    parser.add_option('--operations', default=','.join(OPERATIONS),
+                      help='Comma separated operations to run (default: %default)')
+    parser.add_option('--repeat', type='int', default=5, help='Take the best of N runs')
+    parser.add_option('--save', metavar='FILE', help='Store the results as JSON in FILE')
+    parser.add_option('--compare', metavar='FILE', help='Compare the results against a baseline stored with --save')
+    parser.add_option('--threshold', type='float', default=0.25,
+                      help='Relative slowdown that counts as a regression (default: %default)')
+    (options, _args) = parser.parse_args()
+
+    outputs_list = [int(o) for o in options.outputs.split(',')]
+    modes_list = [int(m) for m in options.modes.split(',')]
+    operations = options.operations.split(',')
+    for name in operations:
+        if name not in OPERATIONS:
+            parser.error("Unknown operation: %s" % name)
+
+    results = run(operations, outputs_list, modes_list, options.repeat)
+    print_table(results, outputs_list, modes_list)
+
+    if options.save:
+        with open(options.save, 'w') as resultsfile:
+            json.dump({
+                'format': RESULTS_FORMAT,
+                'version': RESULTS_VERSION,
+                'python': platform.python_version(),
+                'results': results,
+            }, resultsfile, indent=1)
+
+    if options.compare:
+        with open(options.compare) as baselinefile:
+            baseline = json.load(baselinefile)
+        if baseline.get('format') != RESULTS_FORMAT or baseline.get('version') != RESULTS_VERSION:
+            parser.error("%s is not a benchmark result file" % options.compare)
+        regressions = list(compare(results, baseline['results'], options.threshold))
+        for record, before, ratio in regressions:
+            print("REGRESSION %s (%d outputs, %d modes): %.3f ms -> %.3f ms (%+.0f%%)" % (
+                record['operation'], record['outputs'], record['modes'],
+                before * 1000, record['seconds'] * 1000, (ratio - 1) * 100
+            ))
+        if regressions:
+            sys.exit(1)
+        print("No regressions against %s." % options.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -35,7 +35,7 @@ def main():
     arandr.load_from_x()
 
     reload_button = Gtk.Button("Reload")
-    reload_button.connect('clicked', lambda *args: arandr.load_from_x())
+    reload_button.connect('clicked', lambda *args: arandr.load_from_x(probe=True))
 
     apply_button = Gtk.Button("Apply")
     apply_button.connect('clicked', lambda *args: arandr.save_to_x())
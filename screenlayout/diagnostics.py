@@ -0,0 +1,144 @@
+# ARandR -- Another XRandR GUI
+# Copyright (C) 2008 -- 2011 chrysn <chrysn@fsfe.org>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Overlap and adjacency analysis of output layouts
+
+Layouts are given as dictionaries of output names to (left, top, right,
+bottom) bounds. Outputs are adjacent if they share a piece of an edge (the
+pointer can move between them); touching corners do not count."""
+
+import heapq
+
+from .i18n import _
+
+OVERLAP = 'overlap'
+MIRROR = 'mirror'
+ADJACENT = 'adjacent'
+
+
+class Diagnostic:
+    """Finding about the layout of some outputs"""
+
+    OVERLAP = OVERLAP  # outputs partially show the same area
+    MIRROR = MIRROR  # outputs show exactly the same area
+    DETACHED = 'detached'  # the pointer can not move to these outputs from the others
+
+    def __init__(self, kind, outputs):
+        self.kind = kind
+        self.outputs = tuple(sorted(outputs))
+
+    def __str__(self):
+        names = ", ".join(self.outputs)
+        if self.kind == self.OVERLAP:
+            return _("Outputs %s overlap.") % names
+        if self.kind == self.MIRROR:
+            return _("Outputs %s show the same area.") % names
+        return _("Outputs %s are not connected to the other outputs.") % names
+
+    def __repr__(self):
+        return '<%s %s %s>' % (type(self).__name__, self.kind, ", ".join(self.outputs))
+
+    def __eq__(self, other):
+        return isinstance(other, Diagnostic) and (self.kind, self.outputs) == (other.kind, other.outputs)
+
+    def __hash__(self):
+        return hash((self.kind, self.outputs))
+
+
+def relation(first, second):
+    """Return OVERLAP, MIRROR or ADJACENT for two bounds, or None if they
+    neither overlap nor share a piece of an edge."""
+    width = min(first[2], second[2]) - max(first[0], second[0])
+    height = min(first[3], second[3]) - max(first[1], second[1])
+    if width > 0 and height > 0:
+        return MIRROR if first == second else OVERLAP
+    if (width == 0 and height > 0) or (height == 0 and width > 0):
+        return ADJACENT
+    return None
+
+
+def related_pairs(bounds):
+    """Yield (name, name, relation) for all pairs of the `bounds` dictionary
+    that overlap or are adjacent.
+
+    This sweeps a line over the left edges, keeping the outputs it currently
+    crosses in a heap ordered by their right edges, so only outputs whose x
+    ranges meet are compared: O(n log n) plus the number of such pairs, which
+    for side-by-side layouts is about the number of outputs in a column."""
+    active = []  # (right, sequence number, name)
+    for number, (name, box) in enumerate(sorted(bounds.items(), key=lambda item: item[1][0])):
+        while active and active[0][0] < box[0]:
+            heapq.heappop(active)
+        for _right, _number, other in active:
+            found = relation(box, bounds[other])
+            if found is not None:
+                yield other, name, found
+        heapq.heappush(active, (box[2], number, name))
+
+
+def diagnose(bounds):
+    """Return the Diagnostics of a complete layout: overlapping and mirrored
+    outputs, and groups of outputs that are detached from the largest group
+    of connected outputs."""
+    pairs = list(related_pairs(bounds))
+    diagnostics = [Diagnostic(found, (first, second)) for (first, second, found) in pairs if found != ADJACENT]
+    return diagnostics + detached(bounds, pairs)
+
+
+def detached(bounds, pairs=None):
+    """Return a DETACHED Diagnostic for every group of connected outputs but
+    the largest one. The related_pairs of the `bounds` can be passed as
+    `pairs` if they are known already."""
+    groups = dict((name, name) for name in bounds)  # union-find forest
+
+    def root(name):
+        while groups[name] != name:
+            groups[name] = groups[groups[name]]
+            name = groups[name]
+        return name
+
+    for first, second, _found in related_pairs(bounds) if pairs is None else pairs:
+        groups[root(first)] = root(second)
+
+    components = {}
+    for name in bounds:
+        components.setdefault(root(name), []).append(name)
+    ordered = sorted(components.values(), key=lambda names: (-len(names), sorted(names)))
+    return [Diagnostic(Diagnostic.DETACHED, names) for names in ordered[1:]]
+
+
+def diagnose_output(bounds, name):
+    """Return the overlap and mirror Diagnostics that involve the output
+    `name`, comparing it against all others in linear time. Which outputs are
+    detached depends on the whole layout; see detached()."""
+    diagnostics = []
+    box = bounds[name]
+    for other, other_box in bounds.items():
+        if other == name:
+            continue
+        found = relation(box, other_box)
+        if found is not None and found != ADJACENT:
+            diagnostics.append(Diagnostic(found, (name, other)))
+    return diagnostics
+
+
+def merge(previous, name, found):
+    """Return the `previous` Diagnostics of a layout in which only the output
+    `name` changed, updated with what XRandR.diagnose found for it: its own
+    overlaps and mirrors, and the detached groups of the whole layout."""
+    return [
+        d for d in previous if d.kind != Diagnostic.DETACHED and name not in d.outputs
+    ] + found
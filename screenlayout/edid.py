@@ -0,0 +1,70 @@
+# ARandR -- Another XRandR GUI
+# Copyright (C) 2008 -- 2011 chrysn <chrysn@fsfe.org>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Parsing of EDID monitor descriptions, as far as needed to tell monitors
+apart"""
+
+import hashlib
+
+HEADER = bytes.fromhex('00ffffffffffff00')
+BLOCK_SIZE = 128
+
+# display descriptor tags
+SERIAL_TAG = 0xff
+NAME_TAG = 0xfc
+
+
+class EDID:
+    """The identification of a monitor in the EDID base block `data`
+
+    `fingerprint` tells monitors apart across reboots and connectors: it
+    consists of manufacturer, product code and serial number, or is a hash of
+    the base block if that does not have the EDID header."""
+
+    manufacturer = product = serial = name = None
+
+    def __init__(self, data):
+        self.data = data
+        if len(data) < BLOCK_SIZE or not data.startswith(HEADER):
+            self.fingerprint = 'edid-' + hashlib.sha1(data[:BLOCK_SIZE]).hexdigest()[:16]
+            return
+
+        packed = data[8] << 8 | data[9]
+        self.manufacturer = ''.join(chr(64 + (packed >> shift & 0x1f)) for shift in (10, 5, 0))
+        self.product = data[10] | data[11] << 8
+        self.serial = '%08x' % int.from_bytes(data[12:16], 'little')
+        for offset in range(54, 126, 18):
+            descriptor = data[offset:offset + 18]
+            if descriptor[:3] != b'\0\0\0':
+                continue  # detailed timing
+            text = descriptor[5:].split(b'\n')[0].decode('ascii', 'replace').strip()
+            if descriptor[3] == SERIAL_TAG and text:
+                self.serial = text
+            elif descriptor[3] == NAME_TAG:
+                self.name = text
+        self.fingerprint = '%s-%04x-%s' % (self.manufacturer, self.product, self.serial.replace(' ', '_'))
+
+    @classmethod
+    def from_hex(cls, text):
+        """Parse the hex dump xrandr prints, or return None if it is none."""
+        try:
+            data = bytes.fromhex(''.join(text.split()))
+        except ValueError:
+            return None
+        return cls(data) if data else None
+
+    def __repr__(self):
+        return '<%s %s%s>' % (type(self).__name__, self.fingerprint, ' (%s)' % self.name if self.name else '')
@@ -0,0 +1,117 @@
+# ARandR -- Another XRandR GUI
+# Copyright (C) 2008 -- 2011 chrysn <chrysn@fsfe.org>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Notifications about RandR changes (needs xcffib)
+
+A RandRWatcher has its own connection to the X server on which it selects
+screen, CRTC and output change notifications. Its file descriptor can be
+integrated into any main loop; the events received so far are summarized as
+Changes, which XRandR.load_changes uses to update only what changed."""
+
+import xcffib
+import xcffib.randr
+
+RR_DISCONNECTED = 1  # from randr.h
+
+
+class Changes:
+    """Summary of a batch of RandR notifications"""
+
+    def __init__(self):
+        self.screen = False
+        self.outputs = set()
+        self.crtcs = set()
+        self.hotplug = False
+
+    def __bool__(self):
+        return self.screen or bool(self.outputs) or bool(self.crtcs)
+
+    def update(self, other):
+        """Merge the Changes `other` into these."""
+        self.screen |= other.screen
+        self.outputs |= other.outputs
+        self.crtcs |= other.crtcs
+        self.hotplug |= other.hotplug
+
+    def __repr__(self):
+        return '<%s screen=%s outputs=%s crtcs=%s hotplug=%s>' % (
+            type(self).__name__, self.screen, sorted(self.outputs), sorted(self.crtcs), self.hotplug
+        )
+
+
+class RandRWatcher:
+    """Receiver of RandR change notifications for the screen of `display`"""
+
+    MASK = (
+        xcffib.randr.NotifyMask.ScreenChange |
+        xcffib.randr.NotifyMask.CrtcChange |
+        xcffib.randr.NotifyMask.OutputChange
+    )
+
+    def __init__(self, display=None):
+        self.conn = xcffib.connect(display=display)
+        self.randr = self.conn(xcffib.randr.key)
+        self.root = self.conn.get_setup().roots[self.conn.pref_screen].root
+
+        # connection state per output, to tell hotplugs from other changes
+        resources = self.randr.GetScreenResourcesCurrent(self.root).reply()
+        self._connections = dict(
+            (output, self.randr.GetOutputInfo(output, resources.config_timestamp).reply().connection)
+            for output in resources.outputs
+        )
+
+        self.randr.SelectInput(self.root, self.MASK)
+        self.conn.flush()
+
+    def fileno(self):
+        return self.conn.get_file_descriptor()
+
+    def close(self):
+        self.conn.disconnect()
+
+    def _add(self, changes, event):
+        if isinstance(event, xcffib.randr.ScreenChangeNotifyEvent):
+            changes.screen = True
+        elif isinstance(event, xcffib.randr.NotifyEvent):
+            if event.subCode == xcffib.randr.Notify.CrtcChange:
+                changes.crtcs.add(event.u.cc.crtc)
+            elif event.subCode == xcffib.randr.Notify.OutputChange:
+                change = event.u.oc
+                changes.outputs.add(change.output)
+                connected = change.connection != RR_DISCONNECTED
+                if connected != (self._connections.get(change.output, RR_DISCONNECTED) != RR_DISCONNECTED):
+                    changes.hotplug = True
+                self._connections[change.output] = change.connection
+
+    def pending(self):
+        """Return the Changes of all events received so far without blocking."""
+        changes = Changes()
+        while True:
+            event = self.conn.poll_for_event()
+            if event is None:
+                break
+            self._add(changes, event)
+        return changes
+
+    def wait(self):
+        """Block until there are changes, and return them."""
+        while True:
+            changes = Changes()
+            self._add(changes, self.conn.wait_for_event())
+            # coalesce everything that arrived along with it
+            changes.update(self.pending())
+            if changes:
+                return changes
@@ -30,6 +30,9 @@ from gi.repository import Gtk
 
 from . import widget
 from .i18n import _
+from .xrandr import QueryMode, BACKENDS, create_backend
+from . import profiles, profiling, snapshot
+from .auxiliary import CallCancelled, CallTimeout
 from .meta import (
     __version__, TRANSLATORS, COPYRIGHT, PROGRAMNAME, PROGRAMDESCRIPTION,
 )
@@ -83,6 +86,7 @@ class Application:
                 <menuitem action="SaveAs" />
                 <separator />
                 <menuitem action="Apply" />
+                <menuitem action="ForceApply" />
                 <menuitem action="LayoutSettings" />
                 <separator />
                 <menuitem action="Quit" />
@@ -109,12 +113,14 @@ class Application:
     </ui>
     """
 
-    def __init__(self, file=None, randr_display=None, force_version=False):
+    def __init__(  # pylint: disable=too-many-arguments
+            self, file=None, randr_display=None, force_version=False, query_mode=QueryMode.PROBE, backend=None
+    ):
         self.window = window = Gtk.Window()
         window.props.title = "Screen Layout Editor"
 
         # actions
-        actiongroup = Gtk.ActionGroup('default')
+        self.actiongroup = actiongroup = Gtk.ActionGroup('default')
         actiongroup.add_actions([
             ("Layout", None, _("_Layout")),
             ("New", Gtk.STOCK_NEW, None, None, None, self.do_new),
@@ -122,6 +128,7 @@ class Application:
             ("SaveAs", Gtk.STOCK_SAVE_AS, None, None, None, self.do_save_as),
 
             ("Apply", Gtk.STOCK_APPLY, None, '<Control>Return', None, self.do_apply),
+            ("ForceApply", None, _("Apply to _All Outputs"), '<Control><Shift>Return', None, self.do_force_apply),
             ("LayoutSettings", Gtk.STOCK_PROPERTIES, None,
              '<Alt>Return', None, self.do_open_properties),
 
@@ -156,15 +163,16 @@ class Application:
         # widget
         self.widget = widget.ARandRWidget(
             display=randr_display, force_version=force_version,
-            window=self.window
+            query_mode=query_mode, backend=backend, window=self.window
         )
         if file is None:
             self.filetemplate = self.widget.load_from_x()
         else:
             self.filetemplate = self.widget.load_from_file(file)
 
-        self.widget.connect('changed', self._widget_changed)
-        self._widget_changed(self.widget)
+        if not isinstance(backend, snapshot.ReplayBackend):
+            # if that fails, changes are only seen on explicit reloads
+            self.widget.watch_changes(randr_display)
 
         # window layout
         vbox = Gtk.VBox()
@@ -173,8 +181,49 @@ class Application:
         toolbar = self.uimanager.get_widget('/ToolBar')
         vbox.pack_start(toolbar, expand=False, fill=False, padding=0)
 
+        # progress display for xrandr calls, see _run_busy
+        self._busy_call = None
+        self.busybar = Gtk.InfoBar()
+        self.busybar.add_button(Gtk.STOCK_CANCEL, Gtk.ResponseType.CANCEL)
+        self.busybar.connect('response', self._busy_response)
+        self._busy_label = Gtk.Label()
+        busy_content = self.busybar.get_content_area()
+        busy_content.pack_start(Gtk.Spinner(active=True), expand=False, fill=False, padding=0)
+        busy_content.pack_start(self._busy_label, expand=False, fill=False, padding=0)
+        self.busybar.show_all()
+        self.busybar.set_no_show_all(True)
+        self.busybar.hide()
+        vbox.pack_start(self.busybar, expand=False, fill=False, padding=0)
+
+        # notice of changes from outside that were not loaded to keep the edits
+        self.changedbar = Gtk.InfoBar(message_type=Gtk.MessageType.WARNING)
+        self.changedbar.add_button(Gtk.STOCK_REFRESH, Gtk.ResponseType.APPLY)
+        self.changedbar.connect('response', self._changed_response)
+        self.changedbar.get_content_area().pack_start(Gtk.Label(_(
+            "The screen layout was changed by another program. Applying keeps your changes; "
+            "reloading discards them."
+        )), expand=False, fill=False, padding=0)
+        self.changedbar.show_all()
+        self.changedbar.set_no_show_all(True)
+        self.changedbar.hide()
+        vbox.pack_start(self.changedbar, expand=False, fill=False, padding=0)
+
+        # findings about the layout, see ARandRWidget.diagnostics
+        self.diagnosticsbar = Gtk.InfoBar(message_type=Gtk.MessageType.INFO)
+        self._diagnostics_label = Gtk.Label()
+        self.diagnosticsbar.get_content_area().pack_start(
+            self._diagnostics_label, expand=False, fill=False, padding=0
+        )
+        self.diagnosticsbar.show_all()
+        self.diagnosticsbar.set_no_show_all(True)
+        self.diagnosticsbar.hide()
+        vbox.pack_start(self.diagnosticsbar, expand=False, fill=False, padding=0)
+
         vbox.add(self.widget)
 
+        self.widget.connect('changed', self._widget_changed)
+        self._widget_changed(self.widget)
+
         window.add(vbox)
         window.show_all()
 
@@ -215,22 +264,30 @@ class Application:
 
     @actioncallback
     def do_apply(self):
+        self._apply(force=False)
+
+    @actioncallback
+    def do_force_apply(self):
+        """Apply settings even to outputs that did not change."""
+        self._apply(force=True)
+
+    def _apply(self, force):
         if self.widget.abort_if_unsafe():
             return
 
-        try:
-            self.widget.save_to_x()
-        except Exception as exc:  # pylint: disable=broad-except
-            dialog = Gtk.MessageDialog(
-                None, Gtk.DialogFlags.MODAL, Gtk.MessageType.ERROR,
-                Gtk.ButtonsType.OK, _("XRandR failed:\n%s") % exc
-            )
-            dialog.run()
-            dialog.destroy()
+        self._run_busy(
+            _("Applying configuration"),
+            lambda callback, errback: self.widget.save_to_x_async(callback, errback, force=force),
+            lambda: None
+        )
 
     @actioncallback
     def do_new(self):
-        self.filetemplate = self.widget.load_from_x()
+        self._run_busy(
+            _("Loading configuration"),
+            lambda callback, errback: self.widget.load_from_x_async(callback, errback, probe=True),
+            self._set_filetemplate
+        )
 
     @actioncallback
     def do_open(self):
@@ -244,7 +301,14 @@ class Application:
         if result == Gtk.ResponseType.ACCEPT:
             assert len(filenames) == 1
             filename = filenames[0]
-            self.filetemplate = self.widget.load_from_file(filename)
+            self._run_busy(
+                _("Loading configuration"),
+                lambda callback, errback: self.widget.load_from_file_async(filename, callback, errback),
+                self._set_filetemplate
+            )
+
+    def _set_filetemplate(self, template):
+        self.filetemplate = template
 
     @actioncallback
     def do_save_as(self):
@@ -261,7 +325,11 @@ class Application:
             filename = filenames[0]
             if not filename.endswith('.sh'):
                 filename = filename + '.sh'
-            self.widget.save_to_file(filename, self.filetemplate)
+            template = self.filetemplate
+            if profiles.in_directory(filename):
+                # the monitors it is for are needed to apply it on hotplug
+                template = profiles.with_fingerprints(template)
+            self.widget.save_to_file(filename, template)
 
     def _new_file_dialog(self, title, dialog_type, buttontype):  # pylint: disable=no-self-use
         dialog = Gtk.FileChooserDialog(title, None, dialog_type)
@@ -282,10 +350,65 @@ class Application:
 
         return dialog
 
+    #################### running xrandr ####################
+
+    BUSY_ACTIONS = ('New', 'Open', 'SaveAs', 'Apply', 'ForceApply')
+
+    def _run_busy(self, message, start, callback):
+        """Call `start` with a callback and an errback to start an
+        asynchronous operation, and show `message` until it completes.
+        `callback` receives the operation's result; errors are shown."""
+        def finish():
+            self._busy_call = None
+            self.busybar.hide()
+            self.widget.set_sensitive(True)
+            for name in self.BUSY_ACTIONS:
+                self.actiongroup.get_action(name).set_sensitive(True)
+
+        def done(*args):
+            finish()
+            callback(*args)
+
+        def failed(exc):
+            finish()
+            if isinstance(exc, CallCancelled) and not isinstance(exc, CallTimeout):
+                return
+            dialog = Gtk.MessageDialog(
+                None, Gtk.DialogFlags.MODAL, Gtk.MessageType.ERROR,
+                Gtk.ButtonsType.OK, _("XRandR failed:\n%s") % exc
+            )
+            dialog.run()
+            dialog.destroy()
+
+        self._busy_label.props.label = message
+        self.busybar.show()
+        self.widget.set_sensitive(False)
+        for name in self.BUSY_ACTIONS:
+            self.actiongroup.get_action(name).set_sensitive(False)
+        try:
+            self._busy_call = start(done, failed)
+        except Exception as exc:  # pylint: disable=broad-except
+            failed(exc)
+
+    def _busy_response(self, _infobar, response):
+        if response == Gtk.ResponseType.CANCEL and self._busy_call is not None:
+            self._busy_call.cancel()
+
     #################### widget maintenance ####################
 
     def _widget_changed(self, _widget):
         self._populate_outputs()
+        self.changedbar.set_visible(self.widget.external_changes)
+        self._diagnostics_label.props.label = "\n".join(str(d) for d in self.widget.diagnostics)
+        self.diagnosticsbar.set_visible(bool(self.widget.diagnostics))
+
+    def _changed_response(self, _infobar, response):
+        if response == Gtk.ResponseType.APPLY:
+            self._run_busy(
+                _("Loading configuration"),
+                self.widget.load_from_x_async,
+                lambda _template: None
+            )
 
     def _populate_outputs(self):
         outputs_widget = self.uimanager.get_widget('/MenuBar/Outputs')
@@ -332,8 +455,49 @@ def main():
         help='Even run with untested XRandR versions',
         action='store_true'
     )
+    parser.add_option(
+        '--query-mode',
+        help=(
+            'How to query the xrandr state: "probe" re-probes all outputs, '
+            '"current" and "plain" (without output properties) use the '
+            'server\'s cached state; "New" always probes (default: %default)'
+        ),
+        type='choice', choices=sorted(QueryMode.ARGUMENTS), default=QueryMode.PROBE,
+        metavar='MODE'
+    )
+    parser.add_option(
+        '--backend',
+        help=(
+            'How to talk to the X server: "xrandr" runs the xrandr program, '
+            '"xcb" uses the RandR extension directly (needs xcffib; default: %default)'
+        ),
+        type='choice', choices=BACKENDS, default='xrandr', metavar='B'
+    )
+    parser.add_option(
+        '--replay',
+        help=(
+            'Show the state stored in a snapshot or in captured xrandr output '
+            'instead of asking the X server'
+        ),
+        metavar='FILE'
+    )
+    parser.add_option(
+        '--profile',
+        help=(
+            'Print how long talking to the X server, parsing, drawing and '
+            'building menus took when exiting'
+        ),
+        action='store_true'
+    )
+    parser.add_option(
+        '--profile-output',
+        help='With --profile, also run under cProfile and store its data in FILE',
+        metavar='FILE'
+    )
 
     (options, args) = parser.parse_args()
+    if options.profile:
+        profiling.enable(options.profile_output)
     if not args:
         file_to_open = None
     elif len(args) == 1:
@@ -344,6 +508,11 @@ def main():
     app = Application(
         file=file_to_open,
         randr_display=options.randr_display,
-        force_version=options.force_version
+        force_version=options.force_version,
+        query_mode=options.query_mode,
+        backend=(
+            snapshot.ReplayBackend(snapshot.load(options.replay)) if options.replay
+            else create_backend(options.backend, options.randr_display)
+        )
     )
     app.run()
@@ -0,0 +1,124 @@
+# ARandR -- Another XRandR GUI
+# Copyright (C) 2008 -- 2011 chrysn <chrysn@fsfe.org>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Layouts that are applied when a certain set of monitors is connected
+
+Layout scripts saved by ARandR record the fingerprints (see edid.EDID) of the
+monitors that were connected in a comment line. A ProfileIndex maps these
+sets of fingerprints to the scripts of a directory, so that the layout for
+the monitors connected after a hotplug is found with a single lookup."""
+
+import os
+
+FINGERPRINTS_PREFIX = '# fingerprints:'
+
+DEFAULT_DIRECTORY = os.path.expanduser('~/.screenlayout')
+
+
+def setup_key(state):
+    """Return the key of the monitors connected in an XRandR state: the sorted
+    fingerprints, with the output name (after an @) standing in for monitors
+    without one."""
+    return tuple(sorted(
+        output.fingerprint or '@' + output.name for output in state.outputs.values() if output.connected
+    ))
+
+
+def fingerprints_line(state):
+    return ' '.join((FINGERPRINTS_PREFIX,) + setup_key(state))
+
+
+def with_fingerprints(template):
+    """Return the script template `template` (see XRandR.load_from_string)
+    with a fingerprints line after the shebang if it has none yet."""
+    if '%(fingerprints)s' in template:
+        return template
+    return template[:1] + ['%(fingerprints)s'] + template[1:]
+
+
+def in_directory(filename, directory=DEFAULT_DIRECTORY):
+    """Tell whether `filename` is a script in the profile `directory`, i.e.
+    one that a ProfileIndex of it would find."""
+    return os.path.dirname(os.path.realpath(filename)) == os.path.realpath(directory)
+
+
+def script_key(lines):
+    """Return the key recorded in the lines of a layout script, or None."""
+    for line in lines:
+        if line.startswith(FINGERPRINTS_PREFIX):
+            return tuple(sorted(line[len(FINGERPRINTS_PREFIX):].split()))
+    return None
+
+
+class ProfileIndex:
+    """The layout scripts in `directory`, indexed by their keys. If several
+    scripts were saved for the same monitors, the most recent one is used."""
+
+    def __init__(self, directory=DEFAULT_DIRECTORY):
+        self.directory = directory
+        self.profiles = {}  # key -> (modification time, file name)
+        self._scanned = None  # modification time of the directory when it was scanned
+        self.scan()
+
+    def scan(self):
+        """Read the keys of all scripts in the directory again."""
+        self.profiles = {}
+        try:
+            self._scanned = os.stat(self.directory).st_mtime
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+        for name in names:
+            if name.endswith('.sh'):
+                self.add(os.path.join(self.directory, name))
+
+    def refresh(self):
+        """Scan the directory again if files were added, removed or renamed
+        in it since the last scan."""
+        try:
+            mtime = os.stat(self.directory).st_mtime
+        except OSError:
+            mtime = None
+        if mtime != self._scanned:
+            self.scan()
+
+    def add(self, filename):
+        """Index the script `filename`, which may have been saved just now."""
+        try:
+            with open(filename) as script:
+                key = script_key(script)
+            mtime = os.stat(filename).st_mtime
+        except (OSError, UnicodeDecodeError):
+            return
+        if key and (key not in self.profiles or self.profiles[key][0] <= mtime):
+            self.profiles[key] = (mtime, filename)
+
+    def lookup(self, state):
+        """Return the file name of the layout for the monitors connected in
+        `state`, or None."""
+        found = self.profiles.get(setup_key(state))
+        return found[1] if found is not None else None
+
+    def apply(self, xrandr):
+        """Load and apply the layout for the monitors connected to `xrandr`,
+        and return its file name, or None if there is no such layout."""
+        filename = self.lookup(xrandr.state)
+        if filename is None:
+            return None
+        with open(filename) as script:
+            xrandr.load_from_string(script.read())
+        xrandr.save_to_x()
+        return filename
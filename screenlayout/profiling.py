@@ -0,0 +1,159 @@
+# ARandR -- Another XRandR GUI
+# Copyright (C) 2008 -- 2011 chrysn <chrysn@fsfe.org>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Timers and counters for the phases of loading, applying and painting
+
+Nothing is measured unless enable() was called (which the --profile options
+of arandr and unxrandr do). The timers used by the library are:
+
+xrandr.spawn, xrandr.wait, xrandr.decode
+    Starting the xrandr program, waiting for its output, and decoding it.
+parse
+    Loading the state, mostly parsing xrandr's output, without the xrandr.*
+    times.
+apply
+    Applying a configuration, including the xrandr.* times of doing so.
+check_configuration, draw, contextmenu
+    Checking a configuration, painting the outputs, and building context
+    menu items (as opposed to reusing them).
+
+Timers and counters can be used from any thread."""
+
+import atexit
+import contextlib
+import functools
+import sys
+import threading
+import time
+
+clock = time.perf_counter  # pylint: disable=invalid-name
+
+enabled = False  # pylint: disable=invalid-name
+timers = {}  # name -> [calls, total seconds, longest call in seconds]
+counters = {}  # name -> count
+_lock = threading.Lock()  # protects timers and counters
+_local = threading.local()  # .totals: name -> seconds recorded by this thread
+
+
+def enable(cprofile_file=None):
+    """Start measuring, and print a summary to stderr when the program exits.
+    If a `cprofile_file` is given, the program is run under cProfile as well,
+    and its data is written to that file in the pstats format."""
+    global enabled  # pylint: disable=global-statement,invalid-name
+    enabled = True
+
+    profiler = None
+    if cprofile_file is not None:
+        import cProfile  # pylint: disable=import-outside-toplevel
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    def done():
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(cprofile_file)
+        sys.stderr.write(summary())
+    atexit.register(done)
+
+
+def reset():
+    with _lock:
+        timers.clear()
+        counters.clear()
+
+
+def record(name, seconds):
+    """Add a call that took `seconds` to the timer `name`."""
+    if not enabled:
+        return
+    totals = _thread_totals()
+    totals[name] = totals.get(name, 0.0) + seconds
+    with _lock:
+        entry = timers.get(name)
+        if entry is None:
+            entry = timers[name] = [0, 0.0, 0.0]
+        entry[0] += 1
+        entry[1] += seconds
+        entry[2] = max(entry[2], seconds)
+
+
+def total(name):
+    with _lock:
+        entry = timers.get(name)
+        return entry[1] if entry is not None else 0.0
+
+
+def _thread_totals():
+    try:
+        return _local.totals
+    except AttributeError:
+        _local.totals = {}
+        return _local.totals
+
+
+def count(name, increment=1):
+    if enabled:
+        with _lock:
+            counters[name] = counters.get(name, 0) + increment
+
+
+@contextlib.contextmanager
+def timer(name, exclude=()):
+    """Time the block as a call of `name`, without the time that the timers
+    `exclude` record meanwhile in the same thread (e.g. to tell parsing from
+    waiting for the input that is parsed)."""
+    if not enabled:
+        yield
+        return
+    totals = _thread_totals()
+    excluded = sum(totals.get(other, 0.0) for other in exclude)
+    start = clock()
+    try:
+        yield
+    finally:
+        elapsed = clock() - start
+        record(name, elapsed - (sum(totals.get(other, 0.0) for other in exclude) - excluded))
+
+
+def timed(name):
+    """Decorator that times every call of the function as `name`"""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return function(*args, **kwargs)
+            with timer(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def summary():
+    """Return a table of all timers and counters."""
+    with _lock:
+        timer_items = sorted((name, tuple(entry)) for (name, entry) in timers.items())
+        counter_items = sorted(counters.items())
+    lines = ["%-24s %8s %12s %12s %12s" % ("timer", "calls", "total ms", "mean ms", "max ms")]
+    for name, (calls, seconds, longest) in timer_items:
+        lines.append("%-24s %8d %12.3f %12.3f %12.3f" % (
+            name, calls, seconds * 1000, seconds * 1000 / calls, longest * 1000
+        ))
+    if counter_items:
+        lines.append("")
+        lines.append("%-24s %8s" % ("counter", "count"))
+        for name, value in counter_items:
+            lines.append("%-24s %8d" % (name, value))
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,345 @@
+# ARandR -- Another XRandR GUI
+# Copyright (C) 2008 -- 2011 chrysn <chrysn@fsfe.org>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Painting of screen layouts with cairo, independent of Gtk and X
+
+The Renderer is what the widget paints with; render() and render_script() use
+it to write layouts to PNG or SVG files. Run as ``python3 -m
+screenlayout.render`` to render previews of a directory of layout scripts in
+parallel."""
+
+# pylint: disable=wrong-import-position
+
+import collections
+import concurrent.futures
+import optparse
+import os
+import sys
+
+import cairo
+import gi
+gi.require_version('PangoCairo', '1.0')
+from gi.repository import GLib, Pango, PangoCairo
+
+from . import profiling
+from .auxiliary import BetterList, FileLoadError, Size, ROTATIONS
+from .snapshot import FORMAT, FORMAT_VERSION, ReplayBackend, load as load_snapshot
+from .xrandr import XRandR, SHELLSHEBANG, MODE_NAME_SIZE
+
+FORMATS = ('png', 'svg')
+
+
+class Renderer:
+    """Paints the outputs of XRandR objects on cairo contexts.
+
+    `factor` is the number of screen pixels per device unit; it determines
+    line widths, so that they look alike at every zoom level."""
+
+    LABEL_CACHE_SIZE = 256  # label layouts kept between frames
+
+    def __init__(self, factor=8):
+        self.factor = factor
+        self.drawn = {}  # output name -> (extents, label overflow) of the last frame
+        self._label_cache = collections.OrderedDict()
+
+    def set_up_scale(self, context):
+        """Make `context` use screen coordinates, and return its clip extents
+        in them."""
+        clip = [c * self.factor for c in context.clip_extents()]
+
+        context.scale(1 / self.factor, 1 / self.factor)
+        context.set_line_width(self.factor * 1.5)
+        return clip
+
+    @profiling.timed('draw')
+    def draw(self, xrandr, context, sequence=None, clip=None, exclude=None):  # pylint: disable=too-many-arguments
+        """Paint the outputs on `context`, which is set up to use screen
+        coordinates, from bottom to top in the order of `sequence` (by
+        default, sorted by name). Outputs that are painted completely outside
+        `clip` (left, top, right, bottom in screen coordinates) are skipped,
+        as is the output `exclude`."""
+        cfg = xrandr.configuration
+        state = xrandr.state
+
+        context.set_source_rgb(0.25, 0.25, 0.25)
+        context.rectangle(0, 0, *state.virtual.max)
+        context.fill()
+
+        context.set_source_rgb(0.5, 0.5, 0.5)
+        context.rectangle(0, 0, *cfg.virtual)
+        context.fill()
+
+        for output_name in (sorted(cfg.outputs) if sequence is None else sequence):
+            output = cfg.outputs[output_name]
+            if output.active and output_name != exclude:
+                self.draw_output(context, output_name, output, clip)
+
+    def draw_output(self, context, output_name, output, clip=None):  # pylint: disable=too-many-locals
+        extents = self.extents(output, self.drawn.get(output_name, (None, 0))[1])
+        if clip is not None and (
+                extents[2] < clip[0] or extents[0] > clip[2] or extents[3] < clip[1] or extents[1] > clip[3]
+        ):
+            return
+
+        size = output.size
+        position = output.tentative_position if hasattr(output, 'tentative_position') else output.position
+        rect = (position[0], position[1], size[0], size[1])
+        center = rect[0] + rect[2] / 2, rect[1] + rect[3] / 2
+
+        # paint rectangle
+        context.set_source_rgba(1, 1, 1, 0.7)
+        context.rectangle(*rect)
+        context.fill()
+        context.set_source_rgb(0, 0, 0)
+        context.rectangle(*rect)
+        context.stroke()
+
+        # set up for text
+        context.save()
+        textwidth = rect[3 if output.rotation.is_odd else 2]
+        widthperchar = textwidth / len(output_name)
+        # i think this looks nice and won't overflow even for wide fonts
+        textheight = int(widthperchar * 0.8)
+
+        layout, layoutsize = self._label_layout(context, output_name, textheight, output.primary)
+        labelsize = tuple(reversed(layoutsize)) if output.rotation.is_odd else layoutsize
+        overflow = max(0, (labelsize[0] - rect[2]) / 2, (labelsize[1] - rect[3]) / 2)
+        self.drawn[output_name] = self.extents(output, overflow), overflow
+
+        # position text
+        layoutoffset = -layoutsize[0] / 2, -layoutsize[1] / 2
+        context.move_to(*center)
+        context.rotate(output.rotation.angle)
+        context.rel_move_to(*layoutoffset)
+
+        # paint text
+        PangoCairo.show_layout(context, layout)
+        context.restore()
+
+    def _label_layout(self, context, output_name, textheight, primary):
+        """Return a Pango layout showing `output_name` for drawing on
+        `context`, and its pixel size. Layouts are kept in an LRU cache."""
+        key = (output_name, textheight, primary, self.factor)
+        cached = self._label_cache.get(key)
+        if cached is not None:
+            self._label_cache.move_to_end(key)
+            PangoCairo.update_layout(context, cached[0])
+            return cached
+
+        newdescr = Pango.FontDescription("sans")
+        newdescr.set_size(textheight * Pango.SCALE)
+
+        # create text
+        output_name_markup = GLib.markup_escape_text(output_name)
+        layout = PangoCairo.create_layout(context)
+        layout.set_font_description(newdescr)
+        if primary:
+            output_name_markup = "<u>%s</u>" % output_name_markup
+
+        layout.set_markup(output_name_markup, -1)
+
+        cached = self._label_cache[key] = layout, layout.get_pixel_size()
+        if len(self._label_cache) > self.LABEL_CACHE_SIZE:
+            self._label_cache.popitem(last=False)
+        return cached
+
+    def extents(self, output, overflow=0):
+        """Return the (left, top, right, bottom) screen area an active
+        output is painted in, including the border line and `overflow` by
+        which its label exceeds it on any side."""
+        size = output.size
+        position = output.tentative_position if hasattr(output, 'tentative_position') else output.position
+        margin = self.factor * 2 + overflow  # line width and antialiasing
+        return (
+            position[0] - margin, position[1] - margin,
+            position[0] + size[0] + margin, position[1] + size[1] + margin
+        )
+
+
+#################### files ####################
+
+
+def layout_size(xrandr):
+    """Return the size of the screen needed for the active outputs of the
+    configuration, but at least the minimum screen size."""
+    width, height = xrandr.state.virtual.min
+    for output in xrandr.configuration.outputs.values():
+        if output.active:
+            width = max(width, output.bounds[2])
+            height = max(height, output.bounds[3])
+    return Size((width, height))
+
+
+def render(xrandr, filename, file_format='png', size=256):
+    """Write a picture of the configuration of `xrandr` that is at most
+    `size` pixels wide and high to `filename`, in one of the FORMATS."""
+    screen = layout_size(xrandr)
+    factor = max(screen[0], screen[1]) / size
+    width, height = max(1, round(screen[0] / factor)), max(1, round(screen[1] / factor))
+
+    if file_format == 'svg':
+        surface = cairo.SVGSurface(filename, width, height)
+    elif file_format == 'png':
+        surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, width, height)
+    else:
+        raise ValueError("Unknown format: %s" % file_format)
+
+    renderer = Renderer(factor)
+    context = cairo.Context(surface)
+    renderer.set_up_scale(context)
+    renderer.draw(xrandr, context)
+
+    if file_format == 'png':
+        surface.write_to_png(filename)
+    surface.finish()
+
+
+def snapshot_for_script(data):
+    """Return a snapshot (see the snapshot module) of a display that has just
+    the outputs and modes a layout script uses, all switched off. Mode names
+    have to start with the mode's size, as they do for modes xrandr
+    generates."""
+    commands = [l.strip() for l in data.split("\n") if l.strip().startswith('xrandr ')]
+    if len(commands) != 1:
+        raise FileLoadError('Not exactly one xrandr command in this shell script.')
+
+    outputs = []
+    for arguments in BetterList(commands[0].split()).split('--output'):
+        if not arguments or arguments[0] == 'xrandr':
+            continue
+        odata = {'name': arguments[0], 'connected': True, 'rotations': sorted(ROTATIONS), 'xid': None, 'modes': []}
+        pairs = [a for a in arguments[1:] if a not in ('--primary', '--off')]
+        options = dict(zip(pairs[0::2], pairs[1::2]))
+        if '--mode' in options:
+            match = MODE_NAME_SIZE.match(options['--mode'])
+            if match is None:
+                raise FileLoadError("Size of mode %s unknown; a state snapshot is needed." % options['--mode'])
+            odata['modes'].append([
+                options['--mode'], int(match.group(1)), int(match.group(2)), [options.get('--rate', '60.00')]
+            ])
+        outputs.append(odata)
+
+    return {
+        'format': FORMAT,
+        'version': FORMAT_VERSION,
+        'state': {'virtual': {'min': [320, 200], 'max': [32767, 32767]}, 'outputs': outputs},
+        'configuration': {
+            'virtual': [320, 200],
+            'outputs': [{'name': odata['name'], 'active': False, 'primary': False} for odata in outputs],
+        },
+    }
+
+
+def render_script(script, filename, file_format='png', size=256, snapshot=None):  # pylint: disable=too-many-arguments
+    """Render the layout script `script` like render does. The script is
+    loaded against the state in `snapshot`, or against the outputs and modes
+    it mentions if that is None."""
+    with open(script) as scriptfile:
+        data = scriptfile.read()
+    if not data.startswith(SHELLSHEBANG):
+        raise FileLoadError('Not a shell script.')
+
+    xrandr = XRandR(backend=ReplayBackend(snapshot or snapshot_for_script(data)))
+    xrandr.load_from_x()
+    xrandr.load_from_string(data)
+    # the screen is resized to fit the outputs when the script is run
+    xrandr.configuration.virtual = layout_size(xrandr)
+    render(xrandr, filename, file_format, size)
+
+
+#################### batch rendering ####################
+
+
+_worker_snapshot = None  # pylint: disable=invalid-name
+
+
+def _init_worker(snapshot):
+    global _worker_snapshot  # pylint: disable=global-statement,invalid-name
+    _worker_snapshot = snapshot
+
+
+def _render_job(job):
+    """Run render_script on a (script, filename, format, size) tuple, and
+    return the error message, if any (for use in worker processes)"""
+    try:
+        render_script(*job, snapshot=_worker_snapshot)
+    except Exception as exc:  # pylint: disable=broad-except
+        return "%s: %s" % (job[0], exc)
+    return None
+
+
+def render_all(jobs, snapshot=None, processes=None):
+    """Render (script, filename, format, size) `jobs` like render_script, in
+    a pool of `processes` processes (by default, one per CPU), and yield the
+    error messages of those that failed. The `snapshot` is sent to every
+    process only once."""
+    jobs = list(jobs)
+    with concurrent.futures.ProcessPoolExecutor(processes, initializer=_init_worker,
+                                                initargs=(snapshot,)) as pool:
+        # large chunks, as a single script is quickly rendered
+        chunksize = max(1, len(jobs) // ((processes or os.cpu_count() or 1) * 4))
+        for error in pool.map(_render_job, jobs, chunksize=chunksize):
+            if error is not None:
+                yield error
+
+
+def main():
+    parser = optparse.OptionParser(
+        description=__doc__, usage="%prog [options] DIRECTORY|SCRIPT...",
+    )
+    parser.add_option('-o', '--output-directory', metavar='DIR',
+                      help='Write the pictures to DIR (default: next to the scripts)')
+    parser.add_option('--format', type='choice', choices=FORMATS, default='png',
+                      help='Picture format: %s (default: %%default)' % ", ".join(FORMATS))
+    parser.add_option('--size', type='int', default=256, help='Maximum width and height in pixels (default: %default)')
+    parser.add_option('--state', metavar='FILE',
+                      help='Load the scripts against a snapshot, as stored by unxrandr --snapshot, instead of '
+                      'against the outputs and modes they mention')
+    parser.add_option('-j', '--jobs', type='int', help='Number of processes (default: one per CPU)')
+    (options, args) = parser.parse_args()
+    if not args:
+        args = [os.path.expanduser('~/.screenlayout')]
+
+    scripts = []
+    for arg in args:
+        if os.path.isdir(arg):
+            scripts.extend(sorted(
+                os.path.join(arg, name) for name in os.listdir(arg) if name.endswith('.sh')
+            ))
+        else:
+            scripts.append(arg)
+
+    snapshot = load_snapshot(options.state) if options.state else None
+    if options.output_directory and not os.path.isdir(options.output_directory):
+        os.makedirs(options.output_directory)
+
+    jobs = []
+    for script in scripts:
+        filename = os.path.splitext(script)[0] + '.' + options.format
+        if options.output_directory:
+            filename = os.path.join(options.output_directory, os.path.basename(filename))
+        jobs.append((script, filename, options.format, options.size))
+
+    failed = 0
+    for error in render_all(jobs, snapshot, options.jobs):
+        print(error, file=sys.stderr)
+        failed += 1
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -14,40 +14,121 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import bisect
+
 from .auxiliary import Position
 
 
 class Snap:
-    """Snap-to-edges manager"""
+    """Snap-to-edges manager
+
+    Candidate positions for an output of `size` are collected from the
+    `positions` (pairs of position and size) of the other outputs and kept in
+    sorted lists, so suggestions are looked up by bisection. There are three
+    kinds of candidates, tried in this order: CORNER (a corner of the output
+    meets a corner of another one; snaps both coordinates), EDGE (an edge is
+    aligned with an edge of another output) and CENTRE (the output is centred
+    on another one); EDGE and CENTRE work per coordinate."""
+
+    CORNER = 'corner'
+    EDGE = 'edge'
+    CENTRE = 'centre'
 
     def __init__(self, size, tolerance, positions):
         self.tolerance = tolerance
 
-        self.horizontal = set()
-        self.vertical = set()
+        vertical = set()
+        horizontal = set()
+        vertical_centres = set()
+        horizontal_centres = set()
         for i in positions:
-            self.vertical.add(i[0].left)
-            self.vertical.add(i[0].left + i[1].width)
-            self.horizontal.add(i[0].top)
-            self.horizontal.add(i[0].top + i[1].height)
+            # left and right edges aligned with the other's left and right edges
+            lefts = (
+                i[0].left, i[0].left + i[1].width,
+                i[0].left - size.width, i[0].left + i[1].width - size.width,
+            )
+            tops = (
+                i[0].top, i[0].top + i[1].height,
+                i[0].top - size.height, i[0].top + i[1].height - size.height,
+            )
+            vertical.update(lefts)
+            horizontal.update(tops)
 
-            self.vertical.add(i[0].left - size.width)
-            self.vertical.add(i[0].left + i[1].width - size.width)
-            self.horizontal.add(i[0].top - size.height)
-            self.horizontal.add(i[0].top + i[1].height - size.height)
+            vertical_centres.add((i[0].left + i[1].width / 2) - size.width / 2)
+            horizontal_centres.add((i[0].top + i[1].height / 2) - size.height / 2)
 
-            self.vertical.add((i[0].left + i[1].width / 2) - size.width / 2)
-            self.horizontal.add((i[0].top + i[1].height / 2) - size.height / 2)
+        self.vertical = sorted(vertical)
+        self.horizontal = sorted(horizontal)
+        self.vertical_centres = sorted(vertical_centres)
+        self.horizontal_centres = sorted(horizontal_centres)
+        self.corners = sorted(set(self._corners(size, positions)))
 
-    def suggest(self, position):
-        vertical = [x for x in self.vertical if abs(
-            x - position[0]) < self.tolerance]
-        horizontal = [y for y in self.horizontal if abs(
-            y - position[1]) < self.tolerance]
+    @staticmethod
+    def _corners(size, positions):
+        """Positions at which a corner of the output meets a corner of another"""
+        for i in positions:
+            for left in (i[0].left - size.width, i[0].left + i[1].width):
+                for top in (i[0].top - size.height, i[0].top + i[1].height):
+                    yield left, top  # diagonally adjacent
+            for left in (i[0].left - size.width, i[0].left + i[1].width):
+                for top in (i[0].top, i[0].top + i[1].height - size.height):
+                    yield left, top  # side by side, top or bottom aligned
+            for left in (i[0].left, i[0].left + i[1].width - size.width):
+                for top in (i[0].top - size.height, i[0].top + i[1].height):
+                    yield left, top  # on top of each other, left or right aligned
 
-        if vertical:
-            position = Position((vertical[0], position[1]))
-        if horizontal:
-            position = Position((position[0], horizontal[0]))
+    def _nearest(self, values, value):
+        """Return the item of the sorted `values` nearest to `value` if it is
+        within the tolerance, or None"""
+        index = bisect.bisect_left(values, value)
+        best = None
+        for candidate in values[max(index - 1, 0):index + 1]:
+            distance = abs(candidate - value)
+            if distance < self.tolerance and (best is None or distance < abs(best - value)):
+                best = candidate
+        return best
 
-        return position
+    def _nearest_corner(self, position):
+        best = None
+        best_distance = None
+        index = bisect.bisect_left(self.corners, (position[0] - self.tolerance,))
+        for corner in self.corners[index:]:
+            if corner[0] >= position[0] + self.tolerance:
+                break
+            # like _nearest, candidates exactly one tolerance away on either side don't snap
+            if abs(corner[0] - position[0]) >= self.tolerance or abs(corner[1] - position[1]) >= self.tolerance:
+                continue
+            distance = abs(corner[0] - position[0]) + abs(corner[1] - position[1])
+            if best is None or distance < best_distance:
+                best, best_distance = corner, distance
+        return best
+
+    def snap(self, position):
+        """Return the suggested position and the kind of candidate it was
+        snapped to (None if it was not snapped)."""
+        corner = self._nearest_corner(position)
+        if corner is not None:
+            return Position(corner), self.CORNER
+
+        kind = None
+        coordinates = list(position)
+        for axis, (edges, centres) in enumerate((
+                (self.vertical, self.vertical_centres),
+                (self.horizontal, self.horizontal_centres),
+        )):
+            edge = self._nearest(edges, position[axis])
+            if edge is not None:
+                coordinates[axis] = edge
+                kind = self.EDGE
+                continue
+            centre = self._nearest(centres, position[axis])
+            if centre is not None:
+                coordinates[axis] = centre
+                kind = kind or self.CENTRE
+
+        if kind is None:
+            return position, None
+        return Position(coordinates), kind
+
+    def suggest(self, position):
+        return self.snap(position)[0]
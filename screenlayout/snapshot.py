@@ -0,0 +1,267 @@
+# ARandR -- Another XRandR GUI
+# Copyright (C) 2008 -- 2011 chrysn <chrysn@fsfe.org>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Snapshots of an XRandR state and configuration, and a backend replaying them
+
+A snapshot is a dictionary that can be stored as JSON or, more compactly, in a
+zlib compressed binary form (see dumps and loads). It contains the encoded
+state and configuration, and optionally the raw output of the xrandr calls it
+was taken from, so that both the parser and everything after it can be run
+without an X server."""
+
+import json
+import re
+import zlib
+
+from .auxiliary import FileLoadError, FileSyntaxError, Size, Position, Rotation, Mode
+from .xrandr import XRandR, Backend, Feature, QueryMode
+
+FORMAT = 'arandr-snapshot'
+FORMAT_VERSION = 1
+BINARY_MAGIC = b'ARSNAP\0'
+
+VERBOSE_DETAIL = re.compile(r'^\s+h: +width', re.MULTILINE)
+
+#################### encoding ####################
+
+
+def encode_state(state):
+    return {
+        'virtual': {'min': list(state.virtual.min), 'max': list(state.virtual.max)},
+        'outputs': [
+            {
+                'name': output.name,
+                'connected': output.connected,
+                'rotations': sorted(output.rotations),
+                'xid': output.xid,
+                'properties': dict(output.properties),
+                'modes': [[mode.name, mode.width, mode.height, list(mode.rates)] for mode in output.modes],
+            }
+            for output in state.outputs.values()
+        ],
+    }
+
+
+def decode_state(data):
+    state = XRandR.State()
+    state.virtual = state.Virtual(min_mode=Size(data['virtual']['min']), max_mode=Size(data['virtual']['max']))
+    for odata in data['outputs']:
+        output = state.Output(odata['name'])
+        output.connected = odata['connected']
+        output.rotations = set(Rotation(r) for r in odata['rotations'])
+        output.xid = odata['xid']
+        output.properties.update(odata.get('properties', {}))
+        for name, width, height, rates in odata['modes']:
+            output.add_mode(state.intern_mode(Mode(Size((width, height)), name=name, rates=rates)))
+        state.outputs[output.name] = output
+    return state
+
+
+def encode_configuration(configuration):
+    outputs = []
+    for name, output in configuration.outputs.items():
+        odata = {'name': name, 'active': output.active, 'primary': output.primary}
+        if output.active:
+            odata.update(
+                mode=[output.mode.name, output.mode.width, output.mode.height],
+                rate=getattr(output, 'rate', None),  # unset until one is chosen for new outputs
+                position=list(output.position),
+                rotation=str(output.rotation),
+            )
+        outputs.append(odata)
+    return {'virtual': list(configuration.virtual), 'outputs': outputs}
+
+
+def decode_configuration(data, xrandr, state):
+    """Decode a configuration for `xrandr`; mode rates are taken from the
+    matching modes of `state`."""
+    configuration = xrandr.Configuration(xrandr)
+    configuration.virtual = Size(data['virtual'])
+    for odata in data['outputs']:
+        output = configuration.OutputConfiguration(False, odata['primary'], None, None, None, None)
+        if odata['active']:
+            name, width, height = odata['mode']
+            rate = odata.get('rate')
+            known = state.outputs[odata['name']].mode_by_name(name)
+            if known is not None:
+                rates = known.rates
+            else:
+                rates = [rate] if rate is not None else []
+            output.active = True
+            output.mode = state.intern_mode(Mode(Size((width, height)), name=name, rates=rates))
+            if rate is not None:
+                output.rate = rate
+            output.position = Position(odata['position'])
+            output.rotation = Rotation(odata['rotation'])
+        configuration.outputs[odata['name']] = output
+    return configuration
+
+
+#################### snapshots ####################
+
+
+def take(xrandr, raw=None):
+    """Return a snapshot of the state and loaded configuration of `xrandr`.
+    `raw` can be a dictionary of xrandr outputs (see RecordingBackend) to
+    include; by default, the recordings of a RecordingBackend are used."""
+    if raw is None and isinstance(xrandr.backend, RecordingBackend):
+        raw = xrandr.backend.recorded
+    snapshot = {
+        'format': FORMAT,
+        'version': FORMAT_VERSION,
+        'features': sorted(xrandr.features),
+        'state': encode_state(xrandr.state),
+        'configuration': encode_configuration(xrandr.loaded_configuration or xrandr.configuration),
+    }
+    if raw:
+        snapshot['raw'] = dict(raw)
+    return snapshot
+
+
+def from_output(text, version_output=None):
+    """Return a snapshot that only consists of the `text` xrandr printed
+    (either ``--verbose`` or plain)."""
+    args = QueryMode.ARGUMENTS[QueryMode.PROBE if VERBOSE_DETAIL.search(text) else QueryMode.PLAIN]
+    raw = {' '.join(args): text}
+    if version_output is not None:
+        raw['--version'] = version_output
+    return {'format': FORMAT, 'version': FORMAT_VERSION, 'raw': raw}
+
+
+def restore(xrandr, snapshot):
+    """Make `xrandr` use the state and configuration of `snapshot` without
+    asking its backend (see XRandR.load_snapshot)."""
+    state = decode_state(snapshot['state'])
+    xrandr.load_snapshot(state, decode_configuration(snapshot['configuration'], xrandr, state))
+
+
+def dumps(snapshot, binary=False):
+    """Serialize `snapshot` to a JSON string, or to compressed bytes if
+    `binary` is True."""
+    if binary:
+        return BINARY_MAGIC + zlib.compress(json.dumps(snapshot, separators=(',', ':')).encode('utf-8'), 9)
+    return json.dumps(snapshot, indent=1, sort_keys=True)
+
+
+def loads(data):
+    """Parse a snapshot serialized by dumps. Raw xrandr output is accepted as
+    well and turned into a snapshot with from_output."""
+    if isinstance(data, bytes):
+        if data.startswith(BINARY_MAGIC):
+            try:
+                data = zlib.decompress(data[len(BINARY_MAGIC):])
+            except zlib.error as exc:
+                raise FileSyntaxError("Corrupt snapshot: %s" % exc)
+        data = data.decode('utf-8')
+    if data.startswith('Screen '):
+        return from_output(data)
+    try:
+        snapshot = json.loads(data)
+    except ValueError as exc:
+        raise FileSyntaxError("Not a snapshot: %s" % exc)
+    if not isinstance(snapshot, dict) or snapshot.get('format') != FORMAT:
+        raise FileSyntaxError("Not a snapshot.")
+    if snapshot.get('version') != FORMAT_VERSION:
+        raise FileLoadError("Unsupported snapshot version: %s" % snapshot.get('version'))
+    return snapshot
+
+
+def load(filename):
+    with open(filename, 'rb') as snapshot_file:
+        return loads(snapshot_file.read())
+
+
+def save(filename, snapshot, binary=False):
+    data = dumps(snapshot, binary)
+    with open(filename, 'wb') as snapshot_file:
+        snapshot_file.write(data if binary else data.encode('utf-8'))
+
+
+#################### backends ####################
+
+
+class RecordingBackend(Backend):
+    """Backend that passes calls on to a `backend` based on output_lines (like
+    SubprocessBackend) and records what it printed for queries in `recorded`,
+    keyed by the space separated arguments."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.recorded = {}
+
+    def output_lines(self, *args):
+        key = ' '.join(args)
+        if key != '--version' and key not in (' '.join(a) for a in QueryMode.ARGUMENTS.values()):
+            # not a query, but a configuration being applied
+            for line in self.backend.output_lines(*args):
+                yield line
+            return
+        lines = []
+        for line in self.backend.output_lines(*args):
+            lines.append(line)
+            yield line
+        self.recorded[key] = ''.join(lines)
+
+    def cancel(self):
+        self.backend.cancel()
+
+
+class ReplayBackend(Backend):
+    """Backend that serves a `snapshot` instead of asking an X server.
+
+    Queries are answered from the raw xrandr output in the snapshot if there
+    is any (falling back to another recorded query mode if the requested one
+    was not recorded), so that the parser is exercised; otherwise, the encoded
+    state and configuration are used directly. Configurations that are applied
+    are only recorded as xrandr argument lists in `applied`."""
+
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+        self.raw = snapshot.get('raw', {})
+        self.applied = []
+
+    def version(self):
+        if '--version' in self.raw:
+            return self.raw['--version']
+        if Feature.PRIMARY in self.snapshot.get('features', (Feature.PRIMARY,)):
+            return "Server reports RandR version 1.5\n"
+        return "Server reports RandR version 1.2\n"
+
+    def output_lines(self, *args):
+        key = ' '.join(args)
+        if key in self.raw:
+            return iter(self.raw[key].splitlines(True))
+        raise Exception("No recorded output for xrandr %s" % key)
+
+    def _raw_query(self, query_mode):
+        preferred = [query_mode, QueryMode.PROBE, QueryMode.CURRENT, QueryMode.PLAIN]
+        for mode in preferred:
+            if ' '.join(QueryMode.ARGUMENTS[mode]) in self.raw:
+                return mode
+        return None
+
+    def load(self, xrandr, query_mode):
+        recorded_mode = self._raw_query(query_mode)
+        if recorded_mode is not None:
+            super().load(xrandr, recorded_mode)
+        elif 'state' in self.snapshot:
+            xrandr.state = decode_state(self.snapshot['state'])
+            xrandr.configuration = decode_configuration(self.snapshot['configuration'], xrandr, xrandr.state)
+        else:
+            raise Exception("The snapshot contains no xrandr state.")
+
+    def apply(self, xrandr, diff=None):
+        self.applied.append(xrandr.configuration.commandlineargs(diff))
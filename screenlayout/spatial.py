@@ -0,0 +1,134 @@
+# ARandR -- Another XRandR GUI
+# Copyright (C) 2008 -- 2011 chrysn <chrysn@fsfe.org>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Lookup structures for the widget: which outputs are at a point, and in
+which order they are stacked"""
+
+import bisect
+
+
+class GridIndex:
+    """Uniform grid over `bounds`, a dictionary of names to (left, top,
+    right, bottom), for finding the rectangles that contain a point. The
+    rectangles are extended by `margin` on every side."""
+
+    MIN_CELL = 64
+
+    def __init__(self, bounds, margin=0):
+        self.margin = margin
+        self.bounds = dict(bounds)
+        if self.bounds:
+            # about one rectangle per cell for evenly sized outputs
+            self.cell = max(self.MIN_CELL, sum(
+                max(right - left, bottom - top) for (left, top, right, bottom) in self.bounds.values()
+            ) // len(self.bounds))
+        else:
+            self.cell = self.MIN_CELL
+
+        self.cells = {}
+        for name, (left, top, right, bottom) in self.bounds.items():
+            for column in range(int(left - margin) // self.cell, int(right + margin) // self.cell + 1):
+                for row in range(int(top - margin) // self.cell, int(bottom + margin) // self.cell + 1):
+                    self.cells.setdefault((column, row), []).append(name)
+
+    def query(self, x, y):
+        """Return the set of names whose rectangles contain the point."""
+        margin = self.margin
+        result = set()
+        for name in self.cells.get((int(x) // self.cell, int(y) // self.cell), ()):
+            left, top, right, bottom = self.bounds[name]
+            if left - margin <= x <= right + margin and top - margin <= y <= bottom + margin:
+                result.add(name)
+        return result
+
+
+class ZOrder:
+    """Stacking order of names, from bottom to top.
+
+    Every name has a numeric key; raising a name gives it a key above the
+    current top, and lowering it picks a key between two neighbours, so the
+    keys of other names stay the same and topmost/bottommost only compare
+    keys. The names are additionally kept in a list sorted by key, which is
+    what iteration uses; it is searched by bisection, but inserting into and
+    deleting from it still shifts the names above, so raising, lowering and
+    removing take linear time (with a small constant: there are only a few
+    outputs)."""
+
+    def __init__(self, names=()):
+        self._keys = {}
+        self._order = []  # sorted (key, name)
+        for name in names:
+            self.raise_(name)
+
+    def __iter__(self):
+        return (name for (_key, name) in self._order)
+
+    def __len__(self):
+        return len(self._order)
+
+    def __contains__(self, name):
+        return name in self._keys
+
+    def __repr__(self):
+        return '<%s %r>' % (type(self).__name__, list(self))
+
+    def _set(self, name, key):
+        if name in self._keys:
+            del self._order[bisect.bisect_left(self._order, (self._keys[name], name))]
+        self._keys[name] = key
+        bisect.insort(self._order, (key, name))
+
+    def raise_(self, name):
+        """Put `name` on top, adding it if it was not there yet."""
+        if self._order and self._order[-1][1] == name:
+            return
+        self._set(name, self._order[-1][0] + 1 if self._order else 0)
+
+    def lower_below(self, name, other):
+        """Put `name` directly below `other`."""
+        if name == other:
+            return
+        del self._order[bisect.bisect_left(self._order, (self._keys[name], name))]
+        index = bisect.bisect_left(self._order, (self._keys[other], other))
+        upper = self._order[index][0]
+        lower = self._order[index - 1][0] if index > 0 else upper - 2
+        key = (lower + upper) / 2
+        if not lower < key < upper:
+            # ran out of floating point precision between the neighbours
+            self._order.insert(index, (None, name))
+            self._renumber()
+            return
+        self._keys[name] = key
+        self._order.insert(index, (key, name))
+
+    def _renumber(self):
+        self._order = [(key, name) for (key, (_old, name)) in enumerate(self._order)]
+        self._keys = dict((name, key) for (key, name) in self._order)
+
+    def remove(self, name):
+        del self._order[bisect.bisect_left(self._order, (self._keys.pop(name), name))]
+
+    def top(self):
+        """Return the highest name."""
+        return self._order[-1][1]
+
+    def topmost(self, names):
+        """Return the highest of `names`."""
+        return max(names, key=self._keys.__getitem__)
+
+    def bottommost(self, names):
+        """Return the lowest of `names`."""
+        return min(names, key=self._keys.__getitem__)
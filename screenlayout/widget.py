@@ -19,38 +19,58 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 # pylint: disable=wrong-import-position,missing-docstring,fixme
 
 from __future__ import division
+import math
 import os
 import stat
+import warnings
 
+import cairo
 import gi
 gi.require_version('Gtk', '3.0')
-gi.require_version('PangoCairo', '1.0')
-from gi.repository import GObject, Gtk, Pango, PangoCairo, Gdk, GLib
+from gi.repository import GObject, Gtk, Gdk, GLib
 
+from . import diagnostics, profiling
+from .render import Renderer
 from .snap import Snap
-from .xrandr import XRandR, Feature
-from .auxiliary import Position, NORMAL, ROTATIONS, InadequateConfiguration
+from .spatial import GridIndex, ZOrder
+from .xrandr import XRandR, Feature, QueryMode
+from .auxiliary import Position, NORMAL, ROTATIONS, InadequateConfiguration, CallCancelled, CallTimeout
 from .i18n import _
 
 
 class ARandRWidget(Gtk.DrawingArea):
 
-    sequence = None
+    sequence = None  # ZOrder of the output names
+    _hit_index = None  # GridIndex of the active outputs, built when needed
+    diagnostics = ()  # see XRandR.diagnose; updated with every change
+    _watcher = None
+    _pending_changes = None  # events.Changes reported but not loaded yet
+    _reload = None  # (AsyncCall, Changes) while reported changes are loaded
+    _busy = 0  # asynchronous calls on behalf of the user that are running
+    external_changes = False  # the layout changed outside while the configuration had unapplied edits
     _lastclick = None
     _draggingoutput = None
     _draggingfrom = None
     _draggingsnap = None
+    _drag_background = None  # surface with everything but the dragged output
+    _drag_pointer = None  # latest drag motion position not handled yet
+    _drag_tick = None  # tick callback id while _drag_pointer is pending
 
     __gsignals__ = {
         # 'expose-event':'override', # FIXME: still needed?
         'changed': (GObject.SIGNAL_RUN_LAST, GObject.TYPE_NONE, ()),
     }
 
-    def __init__(self, window, factor=8, display=None, force_version=False):
+    def __init__(  # pylint: disable=too-many-arguments
+            self, window, factor=8, display=None, force_version=False, query_mode=QueryMode.PROBE, backend=None
+    ):
         super(ARandRWidget, self).__init__()
 
         self.window = window
         self._factor = factor
+        self._renderer = Renderer(factor)
+        self._overview_menus = {}  # slot -> (output names, menu, items by output name)
+        self._output_menus = {}  # (output name, slot) -> OutputMenu
 
         self.set_size_request(
             1024 // self.factor, 1024 // self.factor
@@ -61,7 +81,9 @@ class ARandRWidget(Gtk.DrawingArea):
 
         self.setup_draganddrop()
 
-        self._xrandr = XRandR(display=display, force_version=force_version)
+        self._xrandr = XRandR(
+            display=display, force_version=force_version, query_mode=query_mode, backend=backend
+        )
 
         self.connect('draw', self.do_expose_event)
 
@@ -69,6 +91,9 @@ class ARandRWidget(Gtk.DrawingArea):
 
     def _set_factor(self, fac):
         self._factor = fac
+        self._renderer.factor = fac
+        self._drag_background = None
+        self._geometry_changed()
         self._update_size_request()
         self._force_repaint()
 
@@ -116,28 +141,192 @@ class ARandRWidget(Gtk.DrawingArea):
     #################### loading ####################
 
     def load_from_file(self, file):
+        self._cancel_reload()
         data = open(file).read()
         template = self._xrandr.load_from_string(data)
         self._xrandr_was_reloaded()
         return template
 
-    def load_from_x(self):
-        self._xrandr.load_from_x()
+    def load_from_x(self, probe=False):
+        self._cancel_reload()
+        self._xrandr.load_from_x(probe=probe)
         self._xrandr_was_reloaded()
         return self._xrandr.DEFAULTTEMPLATE
 
     def _xrandr_was_reloaded(self):
-        self.sequence = sorted(self._xrandr.outputs)
+        self.sequence = ZOrder(sorted(self._xrandr.outputs))
         self._lastclick = (-1, -1)
+        self._drag_background = None
+        self._geometry_changed()
+        self.diagnostics = self._xrandr.diagnose()
+        self.external_changes = False
 
         self._update_size_request()
         if self.window:
             self._force_repaint()
         self.emit('changed')
 
-    def save_to_x(self):
-        self._xrandr.save_to_x()
-        self.load_from_x()
+    def watch_changes(self, display=None):
+        """Follow changes of the screen layout, be they hotplugs or changes
+        made by other programs, as they are reported by the X server. Return
+        False if that is not possible because the xcffib module is missing or
+        the server can not be connected to.
+
+        The changes are loaded in the background, but not while an
+        asynchronous call is running, and not into a configuration with
+        unapplied edits: external_changes tells about those instead."""
+        try:
+            import xcffib  # pylint: disable=import-outside-toplevel
+            from .events import RandRWatcher  # pylint: disable=import-outside-toplevel
+        except ImportError:
+            return False
+
+        try:
+            self._watcher = RandRWatcher(display)
+        except xcffib.XcffibException as exc:
+            warnings.warn("Not watching for screen changes: %s" % exc)
+            return False
+        GLib.io_add_watch(self._watcher.fileno(), GLib.PRIORITY_DEFAULT, GLib.IO_IN, self._randr_changes_cb)
+        return True
+
+    def _randr_changes_cb(self, _fd, _condition):
+        try:
+            changes = self._watcher.pending()
+        except Exception as exc:  # pylint: disable=broad-except
+            # the connection is unusable; don't get called for it over and over
+            warnings.warn("Not watching for screen changes any more: %s" % exc)
+            self._watcher = None
+            self._xrandr.state_is_cached = True  # refresh it when applying
+            return GLib.SOURCE_REMOVE
+        if changes:
+            self._hold_changes(changes)
+            self._load_pending_changes()
+        return GLib.SOURCE_CONTINUE
+
+    def _load_pending_changes(self):
+        changes = self._pending_changes
+        if not changes or self._busy or self._reload is not None or self._draggingoutput:
+            return
+        if self._xrandr.configuration_diff():
+            # keep the edits; applying them refreshes the state first
+            self._xrandr.state_is_cached = True
+            if not self.external_changes:
+                self.external_changes = True
+                self.emit('changed')
+            return
+        self._pending_changes = None
+
+        def done(_result):
+            self._reload = None
+            self._xrandr_was_updated()
+            self._load_pending_changes()
+
+        def failed(exc):
+            if self._reload is None or self._reload[0] is not call:
+                # dropped by _cancel_reload, which held its changes again
+                self._load_pending_changes()
+                return
+            self._reload = None
+            if isinstance(exc, CallCancelled) and not isinstance(exc, CallTimeout):
+                self._hold_changes(changes)  # edited meanwhile
+            else:
+                warnings.warn("Loading the changed screen layout failed: %s" % exc)
+                self._xrandr.state_is_cached = True  # refresh it when applying
+            self._load_pending_changes()
+
+        call = self._xrandr.run_async(
+            lambda xrandr: xrandr.load_changes(changes), done, failed, GLib.idle_add, keep_edits=True
+        )
+        self._reload = (call, changes)
+
+    def _hold_changes(self, changes):
+        if self._pending_changes is None:
+            self._pending_changes = changes
+        else:
+            self._pending_changes.update(changes)
+
+    def _cancel_reload(self):
+        """Drop the result of a background load, which would overwrite what
+        is loaded or applied now; its changes are loaded again later."""
+        if self._reload is not None:
+            call, changes = self._reload
+            self._reload = None
+            call.cancel()
+            self._hold_changes(changes)
+
+    def _xrandr_was_updated(self):
+        """Like _xrandr_was_reloaded, but keep the stacking order."""
+        outputs = self._xrandr.outputs
+        for output_name in [o for o in self.sequence if o not in outputs]:
+            self.sequence.remove(output_name)
+        for output_name in sorted(o for o in outputs if o not in self.sequence):
+            self.sequence.raise_(output_name)
+        self._drag_background = None
+        self._geometry_changed()
+        self.diagnostics = self._xrandr.diagnose()
+        self.external_changes = False
+
+        self._update_size_request()
+        if self.window:
+            self._force_repaint()
+        self.emit('changed')
+
+    def save_to_x(self, force=False):
+        self._cancel_reload()
+        self._xrandr.save_to_x(force=force)
+        if self._watcher is None:
+            self.load_from_x()
+        # otherwise, the server reports the changes by itself
+
+    # asynchronous variants: they return an AsyncCall that can be cancelled,
+    # and call `callback` or `errback` from the main loop when they are done
+
+    def _run_async(self, function, callback, errback):
+        """XRandR.run_async for calls on behalf of the user; changes reported
+        meanwhile are loaded after them."""
+        self._cancel_reload()
+        self._busy += 1
+
+        def finish():
+            self._busy -= 1
+            self._load_pending_changes()
+
+        def done(result):
+            callback(result)
+            finish()
+
+        def failed(exc):
+            errback(exc)
+            finish()
+        return self._xrandr.run_async(function, done, failed, GLib.idle_add)
+
+    def load_from_file_async(self, file, callback, errback):
+        data = open(file).read()
+
+        def done(template):
+            self._xrandr_was_reloaded()
+            callback(template)
+        return self._run_async(lambda xrandr: xrandr.load_from_string(data), done, errback)
+
+    def load_from_x_async(self, callback, errback, probe=False):
+        def done(_result):
+            self._xrandr_was_reloaded()
+            callback(self._xrandr.DEFAULTTEMPLATE)
+        return self._run_async(lambda xrandr: xrandr.load_from_x(probe=probe), done, errback)
+
+    def save_to_x_async(self, callback, errback, force=False):
+        reload = self._watcher is None
+
+        def save(xrandr):
+            xrandr.save_to_x(force=force)
+            if reload:
+                xrandr.load_from_x()
+
+        def done(_result):
+            if reload:
+                self._xrandr_was_reloaded()
+            callback()
+        return self._run_async(save, done, errback)
 
     def save_to_file(self, file, template=None, additional=None):
         data = self._xrandr.save_to_shellscript_string(template, additional)
@@ -148,17 +337,25 @@ class ARandRWidget(Gtk.DrawingArea):
     #################### doing changes ####################
 
     def _set_something(self, which, output_name, data):
+        self._cancel_reload()
         old = getattr(self._xrandr.configuration.outputs[output_name], which)
         setattr(self._xrandr.configuration.outputs[output_name], which, data)
         try:
-            self._xrandr.check_configuration()
+            found = self._xrandr.check_configuration(output_name)
         except InadequateConfiguration:
             setattr(self._xrandr.configuration.outputs[output_name], which, old)
             raise
+        self._update_diagnostics(output_name, found)
+        self._geometry_changed()
 
-        self._force_repaint()
+        self._damage((output_name,))
         self.emit('changed')
 
+    def _update_diagnostics(self, output_name, found):
+        """Replace the diagnostics involving `output_name`, and the detached
+        groups, with `found`."""
+        self.diagnostics = diagnostics.merge(self.diagnostics, output_name, found)
+
     def set_position(self, output_name, pos):
         self._set_something('position', output_name, pos)
 
@@ -166,16 +363,31 @@ class ARandRWidget(Gtk.DrawingArea):
         self._set_something('rotation', output_name, rot)
 
     def set_resolution(self, output_name, res):
-        self._set_something('mode', output_name, res)
+        output = self._xrandr.configuration.outputs[output_name]
+        old_rate = getattr(output, 'rate', None)
+        if res.rates and old_rate not in res.rates:
+            output.rate = res.rates[0]
+        try:
+            self._set_something('mode', output_name, res)
+        except InadequateConfiguration:
+            if old_rate is None:
+                del output.rate
+            else:
+                output.rate = old_rate
+            raise
 
     def set_refresh_rate(self, output_name, rate):
         self._set_something('rate', output_name, rate)
 
     def set_primary(self, output_name, primary):
+        self._cancel_reload()
         output = self._xrandr.configuration.outputs[output_name]
 
+        changed = [output_name]
         if primary and not output.primary:
             for output_2 in self._xrandr.outputs:
+                if self._xrandr.configuration.outputs[output_2].primary:
+                    changed.append(output_2)
                 self._xrandr.configuration.outputs[output_2].primary = False
             output.primary = True
         elif not primary and output.primary:
@@ -183,10 +395,11 @@ class ARandRWidget(Gtk.DrawingArea):
         else:
             return
 
-        self._force_repaint()
+        self._damage(changed)
         self.emit('changed')
 
     def set_active(self, output_name, active):
+        self._cancel_reload()
         virtual_state = self._xrandr.state.virtual
         output = self._xrandr.configuration.outputs[output_name]
 
@@ -198,26 +411,45 @@ class ARandRWidget(Gtk.DrawingArea):
                 output.active = True  # nothing can go wrong, position already set
             else:
                 pos = Position((0, 0))
-                for mode in self._xrandr.state.outputs[output_name].modes:
-                    # determine first possible mode
-                    if mode[0] <= virtual_state.max[0] and mode[1] <= virtual_state.max[1]:
-                        first_mode = mode
-                        break
-                else:
+                first_mode = self._xrandr.state.outputs[output_name].first_fitting_mode(virtual_state.max)
+                if first_mode is None:
                     raise InadequateConfiguration(
                         "Smallest mode too large for virtual.")
 
                 output.active = True
                 output.position = pos
                 output.mode = first_mode
+                if first_mode.rates:
+                    output.rate = first_mode.rates[0]
                 output.rotation = NORMAL
 
-        self._force_repaint()
+        self._update_diagnostics(output_name, self._xrandr.diagnose(output_name))
+        self._geometry_changed()
+        self._damage((output_name,))
         self.emit('changed')
 
     #################### painting ####################
 
     def do_expose_event(self, _event, context):
+        background = self._drag_background
+        if background is not None and (background.get_width(), background.get_height()) != (
+                self.get_allocated_width(), self.get_allocated_height()):
+            background = self._drag_background = None  # resized while dragging
+
+        if background is None:
+            self._paint(context)
+            return
+
+        # everything but the dragged output is unchanged
+        self._clip_to_virtual(context)
+        context.set_source_surface(background, 0, 0)
+        context.paint()
+        clip = self._renderer.set_up_scale(context)
+        self._renderer.draw_output(
+            context, self._draggingoutput, self._xrandr.configuration.outputs[self._draggingoutput], clip
+        )
+
+    def _clip_to_virtual(self, context):
         context.rectangle(
             0, 0,
             self._xrandr.state.virtual.max[0] // self.factor,
@@ -225,75 +457,35 @@ class ARandRWidget(Gtk.DrawingArea):
         )
         context.clip()
 
+    def _paint(self, context, exclude=None):
+        """Paint the widget on `context`, leaving out the output `exclude`."""
+        self._clip_to_virtual(context)
+
         # clear
         context.set_source_rgb(0, 0, 0)
         context.rectangle(0, 0, *self.window.get_size())
         context.fill()
         context.save()
 
-        context.scale(1 / self.factor, 1 / self.factor)
-        context.set_line_width(self.factor * 1.5)
-
-        self._draw(self._xrandr, context)
-
-    def _draw(self, xrandr, context):  # pylint: disable=too-many-locals
-        cfg = xrandr.configuration
-        state = xrandr.state
-
-        context.set_source_rgb(0.25, 0.25, 0.25)
-        context.rectangle(0, 0, *state.virtual.max)
-        context.fill()
-
-        context.set_source_rgb(0.5, 0.5, 0.5)
-        context.rectangle(0, 0, *cfg.virtual)
-        context.fill()
-
-        for output_name in self.sequence:
-            output = cfg.outputs[output_name]
-            if not output.active:
-                continue
-
-            rect = (output.tentative_position if hasattr(
-                output, 'tentative_position') else output.position) + tuple(output.size)
-            center = rect[0] + rect[2] / 2, rect[1] + rect[3] / 2
-
-            # paint rectangle
-            context.set_source_rgba(1, 1, 1, 0.7)
-            context.rectangle(*rect)
-            context.fill()
-            context.set_source_rgb(0, 0, 0)
-            context.rectangle(*rect)
-            context.stroke()
-
-            # set up for text
-            context.save()
-            textwidth = rect[3 if output.rotation.is_odd else 2]
-            widthperchar = textwidth / len(output_name)
-            # i think this looks nice and won't overflow even for wide fonts
-            textheight = int(widthperchar * 0.8)
-
-            newdescr = Pango.FontDescription("sans")
-            newdescr.set_size(textheight * Pango.SCALE)
-
-            # create text
-            output_name_markup = GLib.markup_escape_text(output_name)
-            layout = PangoCairo.create_layout(context)
-            layout.set_font_description(newdescr)
-            if output.primary:
-                output_name_markup = "<u>%s</u>" % output_name_markup
-
-            layout.set_markup(output_name_markup, -1)
-
-            # position text
-            layoutsize = layout.get_pixel_size()
-            layoutoffset = -layoutsize[0] / 2, -layoutsize[1] / 2
-            context.move_to(*center)
-            context.rotate(output.rotation.angle)
-            context.rel_move_to(*layoutoffset)
-
-            # paint text
-            PangoCairo.show_layout(context, layout)
-            context.restore()
+        clip = self._renderer.set_up_scale(context)
+
+        self._renderer.draw(self._xrandr, context, self.sequence, clip, exclude)
+
+    def _damage(self, output_names):
+        """Queue a repaint of the areas the outputs were last painted in and
+        of the areas they are to be painted in now."""
+        areas = []
+        for output_name in output_names:
+            drawn, overflow = self._renderer.drawn.get(output_name, (None, 0))
+            if drawn is not None:
+                areas.append(drawn)
+            output = self._xrandr.configuration.outputs.get(output_name)
+            if output is not None and output.active:
+                areas.append(self._renderer.extents(output, overflow))
+        for left, top, right, bottom in areas:
+            left, top = int(math.floor(left / self.factor)), int(math.floor(top / self.factor))
+            right, bottom = int(math.ceil(right / self.factor)), int(math.ceil(bottom / self.factor))
+            self.queue_draw_area(left, top, right - left, bottom - top)
 
     def _force_repaint(self):
         # using self.allocation as rect is offset by the menu bar.
@@ -314,154 +506,93 @@ class ARandRWidget(Gtk.DrawingArea):
             # this was the second click to that stack
             if self._lastclick == (event.x, event.y):
                 # push the highest of the undermouse windows below the lowest
-                newpos = min(self.sequence.index(a) for a in undermouse)
-                self.sequence.remove(which)
-                self.sequence.insert(newpos, which)
+                self.sequence.lower_below(which, self.sequence.bottommost(undermouse))
                 # sequence changed
-                which = self._get_point_active_output(event.x, event.y)
+                which = self.sequence.topmost(undermouse)
             # pull the clicked window to the absolute top
-            self.sequence.remove(which)
-            self.sequence.append(which)
+            self.sequence.raise_(which)
 
             self._lastclick = (event.x, event.y)
-            self._force_repaint()
+            self._damage(undermouse)
         if event.button == 3:
             if undermouse:
-                target = [a for a in self.sequence if a in undermouse][-1]
+                target = self.sequence.topmost(undermouse)
                 menu = self._contextmenu(target)
                 menu.popup(None, None, None, None, event.button, event.time)
             else:
-                menu = self.contextmenu()
+                menu = self.contextmenu('popup')
                 menu.popup(None, None, None, None, event.button, event.time)
 
         # deposit for drag and drop until better way found to determine exact starting coordinates
         self._lastclick = (event.x, event.y)
 
+    def _geometry_changed(self):
+        """Drop the hit testing index; call whenever outputs are moved,
+        resized, switched on or off, or the factor changes."""
+        self._hit_index = None
+
     def _get_point_outputs(self, x, y):
-        x, y = x * self.factor, y * self.factor
-        outputs = set()
-        for output_name, output in self._xrandr.configuration.outputs.items():
-            if not output.active:
-                continue
-            if (
-                    output.position[0] - self.factor <= x <= output.position[0] + output.size[0] + self.factor
-            ) and (
-                output.position[1] - self.factor <= y <= output.position[1] + output.size[1] + self.factor
-            ):
-                outputs.add(output_name)
-        return outputs
+        if self._hit_index is None:
+            self._hit_index = GridIndex(
+                dict(
+                    (output_name, output.bounds)
+                    for (output_name, output) in self._xrandr.configuration.outputs.items() if output.active
+                ),
+                margin=self.factor
+            )
+        return self._hit_index.query(x * self.factor, y * self.factor)
 
     def _get_point_active_output(self, x, y):
         undermouse = self._get_point_outputs(x, y)
         if not undermouse:
             raise IndexError("No output here.")
-        active = [a for a in self.sequence if a in undermouse][-1]
-        return active
+        return self.sequence.topmost(undermouse)
 
     #################### context menu ####################
 
-    def contextmenu(self):
-        menu = Gtk.Menu()
-        for output_name in self._xrandr.outputs:
+    def contextmenu(self, slot='outputs'):
+        """Return the menu listing all outputs with their context menus.
+
+        Menus are reused: every `slot` (a menu can only be attached to one
+        place at a time) has one, which is only rebuilt when the outputs
+        themselves change."""
+        names = tuple(self._xrandr.outputs)
+        cached = self._overview_menus.get(slot)
+        if cached is None or cached[0] != names:
+            with profiling.timer('contextmenu'):
+                for key in [k for k in self._output_menus if k[0] not in names]:
+                    del self._output_menus[key]
+                menu = Gtk.Menu()
+                items = {}
+                for output_name in names:
+                    output_menu = self._output_menu(output_name, slot)
+                    i = Gtk.MenuItem(output_name)
+                    i.props.submenu = output_menu.menu
+                    i.connect('select', lambda _item, output_menu=output_menu: output_menu.update())
+                    menu.add(i)
+                    items[output_name] = i
+                menu.show_all()
+                cached = self._overview_menus[slot] = names, menu, items
+        else:
+            profiling.count('contextmenu.reused')
+
+        _names, menu, items = cached
+        for output_name, i in items.items():
             output_config = self._xrandr.configuration.outputs[output_name]
             output_state = self._xrandr.state.outputs[output_name]
-
-            i = Gtk.MenuItem(output_name)
-            i.props.submenu = self._contextmenu(output_name)
-            menu.add(i)
-
-            if not output_config.active and not output_state.connected:
-                i.props.sensitive = False
-        menu.show_all()
+            i.props.sensitive = output_config.active or output_state.connected
         return menu
 
-    def _contextmenu(self, output_name):  # pylint: disable=too-many-locals
-        menu = Gtk.Menu()
-        output_config = self._xrandr.configuration.outputs[output_name]
-        output_state = self._xrandr.state.outputs[output_name]
-
-        enabled = Gtk.CheckMenuItem(_("Active"))
-        enabled.props.active = output_config.active
-        enabled.connect('activate', lambda menuitem: self.set_active(
-            output_name, menuitem.props.active))
-
-        menu.add(enabled)
-
-        if output_config.active:
-            if Feature.PRIMARY in self._xrandr.features:
-                primary = Gtk.CheckMenuItem(_("Primary"))
-                primary.props.active = output_config.primary
-                primary.connect('activate', lambda menuitem: self.set_primary(
-                    output_name, menuitem.props.active))
-                menu.add(primary)
-
-            res_m = Gtk.Menu()
-            rate_m = None
-            for mode in output_state.modes:
-                i = Gtk.CheckMenuItem(str(mode))
-                i.props.draw_as_radio = True
-                i.props.active = (output_config.mode.name == mode.name)
-
-                if i.props.active and output_config.mode.rates:
-                    rate_m = Gtk.Menu()
-                    if not hasattr(output_config, 'rate'):
-                        output_config.rate = output_config.mode.rates[0]
-                    for rate in output_config.mode.rates:
-                        j = Gtk.CheckMenuItem(str(rate))
-                        j.props.draw_as_radio = True
-                        j.props.active = (rate == output_config.rate)
-
-                        def _rate_set(_menuitem, output_name, rate):
-                            try:
-                                self.set_refresh_rate(output_name, rate)
-                            except InadequateConfiguration as exc:
-                                self.error_message(
-                                    _("Setting this refresh rate is not possible here: %s") % exc
-                                )
-                        j.connect('activate', _rate_set, output_name, rate)
-                        rate_m.add(j)
-
-                def _res_set(_menuitem, output_name, mode):
-                    try:
-                        self.set_resolution(output_name, mode)
-                    except InadequateConfiguration as exc:
-                        self.error_message(
-                            _("Setting this resolution is not possible here: %s") % exc
-                        )
-                i.connect('activate', _res_set, output_name, mode)
-                res_m.add(i)
-
-            or_m = Gtk.Menu()
-            for rotation in ROTATIONS:
-                i = Gtk.CheckMenuItem("%s" % rotation)
-                i.props.draw_as_radio = True
-                i.props.active = (output_config.rotation == rotation)
-
-                def _rot_set(_menuitem, output_name, rotation):
-                    try:
-                        self.set_rotation(output_name, rotation)
-                    except InadequateConfiguration as exc:
-                        self.error_message(
-                            _("This orientation is not possible here: %s") % exc
-                        )
-                i.connect('activate', _rot_set, output_name, rotation)
-                if rotation not in output_state.rotations:
-                    i.props.sensitive = False
-                or_m.add(i)
-
-            res_i = Gtk.MenuItem(_("Resolution"))
-            res_i.props.submenu = res_m
-            rate_i = Gtk.MenuItem(_("Refresh Rate"))
-            rate_i.props.submenu = rate_m
-            or_i = Gtk.MenuItem(_("Orientation"))
-            or_i.props.submenu = or_m
-
-            menu.add(res_i)
-            menu.add(rate_i)
-            menu.add(or_i)
+    def _contextmenu(self, output_name):
+        output_menu = self._output_menu(output_name, 'single')
+        output_menu.update()
+        return output_menu.menu
 
-        menu.show_all()
-        return menu
+    def _output_menu(self, output_name, slot):
+        key = (output_name, slot)
+        if key not in self._output_menus:
+            self._output_menus[key] = OutputMenu(self, output_name)
+        return self._output_menus[key]
 
     #################### drag&drop ####################
 
@@ -498,6 +629,7 @@ class ARandRWidget(Gtk.DrawingArea):
             Gtk.drag_set_icon_stock(context, Gtk.STOCK_CANCEL, 10, 10)
             return
 
+        self._cancel_reload()  # it would replace the configuration being dragged in
         self._draggingoutput = output
         self._draggingfrom = self._lastclick
         Gtk.drag_set_icon_stock(context, Gtk.STOCK_FULLSCREEN, 10, 10)
@@ -512,6 +644,14 @@ class ARandRWidget(Gtk.DrawingArea):
             ]
         )
 
+        if self.sequence.top() == output:
+            # nothing is painted above the dragged output, so the rest can be
+            # painted once and reused for every frame of the drag
+            self._drag_background = cairo.ImageSurface(
+                cairo.FORMAT_ARGB32, self.get_allocated_width(), self.get_allocated_height()
+            )
+            self._paint(cairo.Context(self._drag_background), exclude=output)
+
     def _dragmotion_cb(self, widget, context, x, y, time):  # pylint: disable=too-many-arguments
         # if not 'screenlayout-output' in context.list_targets():  # from outside
             # return False
@@ -520,6 +660,32 @@ class ARandRWidget(Gtk.DrawingArea):
 
         Gdk.drag_status(context, Gdk.DragAction.MOVE, time)
 
+        # only the latest position is handled, once per frame
+        profiling.count('drag.motion_events')
+        if self._drag_pointer is not None:
+            profiling.count('drag.coalesced_motion_events')
+        self._drag_pointer = (x, y)
+        if self._drag_tick is None:
+            self._drag_tick = self.add_tick_callback(self._drag_tick_cb)
+
+        return True
+
+    def _drag_tick_cb(self, _widget, _frame_clock):
+        self._drag_tick = None
+        self._flush_drag_motion()
+        return GLib.SOURCE_REMOVE
+
+    def _flush_drag_motion(self):
+        """Move the dragged output according to the pending pointer position."""
+        if self._drag_tick is not None:
+            self.remove_tick_callback(self._drag_tick)
+            self._drag_tick = None
+        if self._drag_pointer is None or not self._draggingoutput:
+            self._drag_pointer = None
+            return
+        x, y = self._drag_pointer
+        self._drag_pointer = None
+
         rel = x - self._draggingfrom[0], y - self._draggingfrom[1]
 
         oldpos = self._xrandr.configuration.outputs[self._draggingoutput].position
@@ -528,14 +694,13 @@ class ARandRWidget(Gtk.DrawingArea):
         self._xrandr.configuration.outputs[
             self._draggingoutput
         ].tentative_position = self._draggingsnap.suggest(newpos)
-        self._force_repaint()
-
-        return True
+        self._damage((self._draggingoutput,))
 
     def _dragdrop_cb(self, widget, context, x, y, time):  # pylint: disable=too-many-arguments
         if not self._draggingoutput:
             return
 
+        self._flush_drag_motion()
         try:
             self.set_position(
                 self._draggingoutput,
@@ -548,10 +713,161 @@ class ARandRWidget(Gtk.DrawingArea):
         context.finish(True, False, time)
 
     def _dragend_cb(self, widget, context):
+        self._drag_pointer = None  # drop pending motion of a cancelled drag
+        self._flush_drag_motion()
         try:
             del self._xrandr.configuration.outputs[self._draggingoutput].tentative_position
         except (KeyError, AttributeError):
             pass  # already reloaded
+        self._drag_background = None
+        self._damage((self._draggingoutput,))
         self._draggingoutput = None
         self._draggingfrom = None
-        self._force_repaint()
+        self._load_pending_changes()
+
+
+class OutputMenu:
+    """Context menu of a single output in an ARandRWidget
+
+    The items are created once and reused; the entries of the submenus are
+    only created when the submenu is about to be opened. update() (which
+    needs to be called before the menu is shown) and opening a submenu
+    update the state of existing items."""
+
+    def __init__(self, widget, output_name):
+        self.widget = widget
+        self.output_name = output_name
+        self._syncing = False  # setting a CheckMenuItem active emits 'activate'
+        self._resolution_labels = None
+        self._rate_labels = None
+        self._rotation_items = None
+
+        self.menu = Gtk.Menu()
+
+        self.enabled = Gtk.CheckMenuItem(_("Active"))
+        self.enabled.connect('activate', self._active_cb)
+        self.primary = Gtk.CheckMenuItem(_("Primary"))
+        self.primary.connect('activate', self._primary_cb)
+        self.resolutions = self._submenu_item(_("Resolution"), self._update_resolutions)
+        self.rates = self._submenu_item(_("Refresh Rate"), self._update_rates)
+        self.rotations = self._submenu_item(_("Orientation"), self._update_rotations)
+
+        for item in (self.enabled, self.primary, self.resolutions, self.rates, self.rotations):
+            self.menu.add(item)
+        self.enabled.show()
+
+    @staticmethod
+    def _submenu_item(label, update):
+        item = Gtk.MenuItem(label)
+        item.props.submenu = Gtk.Menu()
+        # the submenu only opens after its item got selected
+        item.connect('select', lambda _item: update())
+        return item
+
+    xrandr = property(lambda self: self.widget._xrandr)  # pylint: disable=protected-access
+    output_config = property(lambda self: self.xrandr.configuration.outputs[self.output_name])
+    output_state = property(lambda self: self.xrandr.state.outputs[self.output_name])
+
+    def _set_active(self, item, active):
+        self._syncing = True
+        try:
+            item.props.active = active
+        finally:
+            self._syncing = False
+
+    @profiling.timed('contextmenu')
+    def _replace_items(self, menu, labels, callback):
+        for child in menu.get_children():
+            menu.remove(child)
+            child.destroy()
+        items = []
+        for index, label in enumerate(labels):
+            i = Gtk.CheckMenuItem(label)
+            i.props.draw_as_radio = True
+            i.connect('activate', callback, index)
+            menu.add(i)
+            items.append(i)
+        menu.show_all()
+        return items
+
+    def update(self):
+        output_config = self.output_config
+
+        self._set_active(self.enabled, output_config.active)
+        self.primary.props.visible = output_config.active and Feature.PRIMARY in self.xrandr.features
+        self._set_active(self.primary, output_config.primary)
+        for item in (self.resolutions, self.rates, self.rotations):
+            item.props.visible = output_config.active
+        self.rates.props.sensitive = output_config.active and bool(output_config.mode.rates)
+
+    def _update_resolutions(self):
+        modes = self.output_state.modes
+        labels = [str(mode) for mode in modes]
+        if labels != self._resolution_labels:
+            self._replace_items(self.resolutions.props.submenu, labels, self._resolution_cb)
+            self._resolution_labels = labels
+
+        current_mode = self.output_state.mode_by_name(self.output_config.mode.name)
+        for mode, item in zip(modes, self.resolutions.props.submenu.get_children()):
+            self._set_active(item, mode is current_mode)
+
+    def _update_rates(self):
+        output_config = self.output_config
+        if not output_config.mode.rates:
+            return
+        if not hasattr(output_config, 'rate'):
+            output_config.rate = output_config.mode.rates[0]
+        labels = [str(rate) for rate in output_config.mode.rates]
+        if labels != self._rate_labels:
+            self._replace_items(self.rates.props.submenu, labels, self._rate_cb)
+            self._rate_labels = labels
+
+        for rate, item in zip(output_config.mode.rates, self.rates.props.submenu.get_children()):
+            self._set_active(item, rate == output_config.rate)
+
+    def _update_rotations(self):
+        if self._rotation_items is None:
+            self._rotation_items = self._replace_items(
+                self.rotations.props.submenu, ["%s" % rotation for rotation in ROTATIONS], self._rotation_cb
+            )
+        for rotation, item in zip(ROTATIONS, self._rotation_items):
+            self._set_active(item, self.output_config.rotation == rotation)
+            item.props.sensitive = rotation in self.output_state.rotations
+
+    def _active_cb(self, menuitem):
+        if not self._syncing:
+            self.widget.set_active(self.output_name, menuitem.props.active)
+
+    def _primary_cb(self, menuitem):
+        if not self._syncing:
+            self.widget.set_primary(self.output_name, menuitem.props.active)
+
+    def _resolution_cb(self, _menuitem, index):
+        if self._syncing:
+            return
+        try:
+            self.widget.set_resolution(self.output_name, self.output_state.modes[index])
+        except InadequateConfiguration as exc:
+            self.widget.error_message(
+                _("Setting this resolution is not possible here: %s") % exc
+            )
+
+    def _rate_cb(self, _menuitem, index):
+        if self._syncing:
+            return
+        try:
+            self.widget.set_refresh_rate(self.output_name, self.output_config.mode.rates[index])
+        except InadequateConfiguration as exc:
+            self.widget.error_message(
+                _("Setting this refresh rate is not possible here: %s") % exc
+            )
+
+    def _rotation_cb(self, _menuitem, index):
+        if self._syncing:
+            return
+        try:
+            self.widget.set_rotation(self.output_name, ROTATIONS[index])
+        except InadequateConfiguration as exc:
+            self.widget.error_message(
+                _("This orientation is not possible here: %s") % exc
+            )
@@ -0,0 +1,344 @@
+# ARandR -- Another XRandR GUI
+# Copyright (C) 2008 -- 2011 chrysn <chrysn@fsfe.org>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Backend that talks to the RandR extension directly using xcffib
+
+This avoids running the xrandr program for every load and apply; state is read
+in a few round trips from the screen resources, outputs and CRTCs. It needs
+the xcffib module and can be tried out against a virtual X server::
+
+    Xvfb :99 -screen 0 1024x768x24 &
+    ./arandr --backend xcb --randr-display :99
+"""
+
+import xcffib
+import xcffib.randr
+import xcffib.xproto
+
+from .auxiliary import Size, Geometry, NORMAL, LEFT, INVERTED, RIGHT
+from .xrandr import Backend, Feature, QueryMode
+
+# from randr.h
+RR_CONNECTED, RR_DISCONNECTED, RR_UNKNOWN_CONNECTION = 0, 1, 2
+RR_INTERLACE = 0x10
+RR_DOUBLE_SCAN = 0x20
+
+ROTATION_BITS = {NORMAL: 1, LEFT: 2, INVERTED: 4, RIGHT: 8}
+
+
+def _to_str(data):
+    """Convert an xcffib list of bytes to a string"""
+    return _to_bytes(data).decode('utf-8', 'replace')
+
+
+def _to_bytes(data):
+    """Convert an xcffib list of bytes to bytes"""
+    return b"".join(bytes([c]) if isinstance(c, int) else c for c in data)
+
+
+def mode_rate(info):
+    """Refresh rate of a ModeInfo as xrandr would print it"""
+    vtotal = info.vtotal
+    if info.mode_flags & RR_DOUBLE_SCAN:
+        vtotal *= 2
+    if info.mode_flags & RR_INTERLACE:
+        vtotal /= 2
+    if not info.htotal or not vtotal:
+        return "%.2f" % 0
+    return "%.2f" % (info.dot_clock / (info.htotal * vtotal))
+
+
+class XCBBackend(Backend):
+    """Backend that uses the RandR protocol over an xcffib connection"""
+
+    def __init__(self, display=None):
+        self.conn = xcffib.connect(display=display)
+        self.randr = self.conn(xcffib.randr.key)
+        self.screen = self.conn.get_setup().roots[self.conn.pref_screen]
+        self.root = self.screen.root
+
+        reply = self.randr.QueryVersion(1, 5).reply()
+        self.randr_version = (reply.major_version, reply.minor_version)
+        self._edid_atom = None
+
+    def version(self):
+        return "Server reports RandR version %d.%d\n" % self.randr_version
+
+    def output_lines(self, *args):
+        raise NotImplementedError("The xcb backend does not run xrandr.")
+
+    #################### loading ####################
+
+    def _resources(self, probe):
+        if probe or self.randr_version < (1, 3):
+            return self.randr.GetScreenResources(self.root).reply()
+        return self.randr.GetScreenResourcesCurrent(self.root).reply()
+
+    @staticmethod
+    def _modes(resources):
+        """Return a dict of mode id to ModeInfo and name"""
+        modes = {}
+        names = _to_str(resources.names)
+        offset = 0
+        for info in resources.modes:
+            modes[info.id] = (info, names[offset:offset + info.name_len])
+            offset += info.name_len
+        return modes
+
+    def _edid(self, output_id):
+        """Return the EDID property of an output the way xrandr prints it, or
+        None if it has none."""
+        if not self._edid_atom:
+            # the atom only exists once the server has seen an EDID
+            self._edid_atom = self.conn.core.InternAtom(True, len('EDID'), 'EDID').reply().atom
+            if not self._edid_atom:
+                return None
+        reply = self.randr.GetOutputProperty(
+            output_id, self._edid_atom, xcffib.xproto.GetPropertyType.Any, 0, 256, False, False
+        ).reply()
+        data = _to_bytes(reply.data)
+        return data.hex() if data else None
+
+    def load(self, xrandr, query_mode):
+        resources = self._resources(query_mode == QueryMode.PROBE)
+        modes = self._modes(resources)
+
+        size_range = self.randr.GetScreenSizeRange(self.root).reply()
+        root_geometry = self.conn.core.GetGeometry(self.root).reply()
+        xrandr.state.virtual = xrandr.state.Virtual(
+            min_mode=Size((size_range.min_width, size_range.min_height)),
+            max_mode=Size((size_range.max_width, size_range.max_height))
+        )
+        xrandr.configuration.virtual = Size((root_geometry.width, root_geometry.height))
+
+        primary_output = None
+        if Feature.PRIMARY in xrandr.features:
+            primary_output = self.randr.GetOutputPrimary(self.root).reply().output
+
+        # send all requests before waiting for the first reply
+        output_cookies = [
+            (output_id, self.randr.GetOutputInfo(output_id, resources.config_timestamp))
+            for output_id in resources.outputs
+        ]
+        output_infos = [(output_id, cookie.reply()) for (output_id, cookie) in output_cookies]
+        crtc_cookies = dict(
+            (crtc, self.randr.GetCrtcInfo(crtc, resources.config_timestamp))
+            for crtc in resources.crtcs
+        )
+        crtc_infos = dict((crtc, cookie.reply()) for (crtc, cookie) in crtc_cookies.items())
+
+        for output_id, info in output_infos:
+            self._load_output(xrandr, output_id, info, crtc_infos, modes, output_id == primary_output)
+
+    def _load_output(self, xrandr, output_id, info, crtc_infos, modes, primary):  # pylint: disable=too-many-arguments
+        output = xrandr.state.Output(_to_str(info.name))
+        output.connected = info.connection in (RR_CONNECTED, RR_UNKNOWN_CONNECTION)
+        output.xid = output_id
+        if output.connected:
+            edid = self._edid(output_id)
+            if edid is not None:
+                output.properties['EDID'] = edid
+
+        crtc = crtc_infos.get(info.crtc)
+        rotation_crtc = crtc or (crtc_infos.get(info.crtcs[0]) if info.crtcs else None)
+        output.rotations = set(
+            rotation for (rotation, bit) in ROTATION_BITS.items()
+            if rotation_crtc is not None and rotation_crtc.rotations & bit
+        )
+
+        if crtc is not None and crtc.mode:
+            rotation = NORMAL
+            for candidate, bit in ROTATION_BITS.items():
+                if crtc.rotation & bit:
+                    rotation = candidate
+            headinfo = (True, primary, Geometry(crtc.width, crtc.height, crtc.x, crtc.y), rotation)
+            current_mode_id = crtc.mode
+        else:
+            headinfo = (False, False, None, None)
+            current_mode_id = None
+
+        if current_mode_id is not None and current_mode_id not in modes:
+            raise Exception(
+                "Output %s uses mode 0x%x, which the server does not list." % (output.name, current_mode_id)
+            )
+
+        current = None, None
+        for mode_id in self._mode_ids(info, crtc):
+            mode_info, name = modes[mode_id]
+            rate = mode_rate(mode_info)
+            data = (name, "0x%x" % mode_id, mode_info.width, mode_info.height, rate, mode_id == current_mode_id)
+            mode = xrandr._load_parse_mode(output, headinfo, data)  # pylint: disable=protected-access
+            if mode_id == current_mode_id:
+                current = rate, mode
+        xrandr._load_add_output(output, headinfo, current)  # pylint: disable=protected-access
+
+    @staticmethod
+    def _mode_ids(info, crtc):
+        """The modes of an output, including the mode of its `crtc` (as
+        xrandr does) if that is missing from the output's list"""
+        if crtc is not None and crtc.mode and crtc.mode not in info.modes:
+            return list(info.modes) + [crtc.mode]
+        return info.modes
+
+    def load_changes(self, xrandr, changes):
+        resources = self._resources(False)
+        if set(o.xid for o in xrandr.state.outputs.values()) != set(resources.outputs):
+            return False  # outputs appeared or vanished
+        modes = self._modes(resources)
+        timestamp = resources.config_timestamp
+
+        try:
+            crtc_infos = dict(
+                (crtc, self.randr.GetCrtcInfo(crtc, timestamp).reply())
+                for crtc in changes.crtcs if crtc in resources.crtcs
+            )
+            output_ids = set(changes.outputs)
+            for info in crtc_infos.values():
+                output_ids.update(info.outputs)
+            output_infos = [
+                (output_id, self.randr.GetOutputInfo(output_id, timestamp).reply())
+                for output_id in output_ids
+            ]
+            for _output_id, info in output_infos:
+                for crtc in [info.crtc] + list(info.crtcs)[:1]:
+                    if crtc and crtc not in crtc_infos:
+                        crtc_infos[crtc] = self.randr.GetCrtcInfo(crtc, timestamp).reply()
+        except xcffib.XcffibException:
+            return False
+
+        if changes.screen:
+            root_geometry = self.conn.core.GetGeometry(self.root).reply()
+            xrandr.configuration.virtual = Size((root_geometry.width, root_geometry.height))
+
+        primary_output = None
+        if Feature.PRIMARY in xrandr.features:
+            primary_output = self.randr.GetOutputPrimary(self.root).reply().output
+
+        for output_id, info in output_infos:
+            self._load_output(xrandr, output_id, info, crtc_infos, modes, output_id == primary_output)
+        return True
+
+    #################### applying ####################
+
+    def apply(self, xrandr, diff=None):  # pylint: disable=too-many-locals,too-many-branches
+        """Configure the CRTCs like xrandr does: switch off CRTCs that are
+        unused or would not fit in the new screen, resize the screen, and
+        set up the changed CRTCs. Given a `diff`, only the CRTCs of the
+        outputs in it are touched, and only if the server's current state
+        differs; without it, all CRTCs are set up again."""
+        resources = self._resources(False)
+        modes = self._modes(resources)
+        timestamp = resources.config_timestamp
+        configuration = xrandr.configuration
+
+        infos = {}
+        for output_id in resources.outputs:
+            info = self.randr.GetOutputInfo(output_id, timestamp).reply()
+            infos[_to_str(info.name)] = (output_id, info)
+        crtc_infos = dict(
+            (crtc, self.randr.GetCrtcInfo(crtc, timestamp).reply())
+            for crtc in resources.crtcs
+        )
+
+        # desired crtc -> (x, y, mode id, rotation bit, output id)
+        wanted = {}
+        # outputs that keep their CRTC come first, so others don't take it
+        for output_name, output_config in sorted(configuration.outputs.items(), key=lambda i: not infos[i[0]][1].crtc):
+            if not output_config.active:
+                continue
+            output_id, info = infos[output_name]
+            mode_id = self._find_mode(
+                self._mode_ids(info, crtc_infos.get(info.crtc)), modes, output_config.mode.name,
+                getattr(output_config, 'rate', None)
+            )
+            crtc = info.crtc if info.crtc and info.crtc not in wanted else None
+            if crtc is None:
+                free = [c for c in info.crtcs if c not in wanted and not crtc_infos[c].outputs]
+                free = free or [c for c in info.crtcs if c not in wanted]
+                if not free:
+                    raise Exception("No CRTC available for output %s." % output_name)
+                crtc = free[0]
+            wanted[crtc] = (
+                output_config.position[0], output_config.position[1], mode_id,
+                ROTATION_BITS[output_config.rotation], output_id
+            )
+
+        active = [o for o in configuration.outputs.values() if o.active]
+        width = max([xrandr.state.virtual.min[0]] + [o.position[0] + o.size[0] for o in active])
+        height = max([xrandr.state.virtual.min[1]] + [o.position[1] + o.size[1] for o in active])
+        root_geometry = self.conn.core.GetGeometry(self.root).reply()
+
+        def unchanged(crtc):
+            info = crtc_infos[crtc]
+            if crtc not in wanted:
+                return not info.mode
+            x, y, mode_id, rotation, output_id = wanted[crtc]
+            return (info.x, info.y, info.mode, info.rotation, list(info.outputs)) == \
+                (x, y, mode_id, rotation, [output_id])
+
+        if diff is None:
+            changed = [crtc for crtc in crtc_infos if crtc in wanted or crtc_infos[crtc].mode]
+        else:
+            # like xrandr given only the changed outputs, leave the others alone
+            touched = set(infos[name][0] for name in diff if name in infos)
+            changed = [
+                crtc for crtc in crtc_infos
+                if (touched.intersection(crtc_infos[crtc].outputs) or
+                    crtc in wanted and wanted[crtc][4] in touched) and not unchanged(crtc)
+            ]
+
+        self.conn.core.GrabServer()
+        try:
+            for crtc in changed:
+                info = crtc_infos[crtc]
+                if info.mode and (crtc not in wanted or info.x + info.width > width or info.y + info.height > height):
+                    self._set_crtc(crtc, timestamp, 0, 0, 0, 1, [])
+            if (width, height) != (root_geometry.width, root_geometry.height):
+                self._set_screen_size(width, height)
+            for crtc in changed:
+                if crtc in wanted:
+                    x, y, mode_id, rotation, output_id = wanted[crtc]
+                    self._set_crtc(crtc, timestamp, x, y, mode_id, rotation, [output_id])
+            if Feature.PRIMARY in xrandr.features and (diff is None or any('primary' in c for c in diff.values())):
+                primary = [infos[name][0] for (name, o) in configuration.outputs.items() if o.active and o.primary]
+                self.randr.SetOutputPrimaryChecked(self.root, primary[0] if primary else 0).check()
+        finally:
+            self.conn.core.UngrabServer()
+            self.conn.flush()
+
+    @staticmethod
+    def _find_mode(mode_ids, modes, name, rate):
+        candidates = [m for m in mode_ids if m in modes and modes[m][1] == name]
+        if not candidates:
+            raise Exception("Not a known mode: %s" % name)
+        for mode_id in candidates:
+            if mode_rate(modes[mode_id][0]) == rate:
+                return mode_id
+        return candidates[0]
+
+    def _set_crtc(self, crtc, timestamp, x, y, mode_id, rotation, outputs):  # pylint: disable=too-many-arguments
+        reply = self.randr.SetCrtcConfig(
+            crtc, xcffib.xproto.Time.CurrentTime, timestamp,
+            x, y, mode_id, rotation, len(outputs), outputs
+        ).reply()
+        if reply.status != 0:
+            raise Exception("Configuring CRTC 0x%x failed with status %d." % (crtc, reply.status))
+
+    def _set_screen_size(self, width, height):
+        # keep the dpi of the current screen
+        mm_width = int(width * self.screen.width_in_millimeters / self.screen.width_in_pixels)
+        mm_height = int(height * self.screen.height_in_millimeters / self.screen.height_in_pixels)
+        self.randr.SetScreenSizeChecked(self.root, width, height, mm_width, mm_height).check()
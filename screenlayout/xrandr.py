@@ -16,38 +16,253 @@
 """Wrapper around command line xrandr (mostly 1.2 per output features supported)"""
 # pylint: disable=too-few-public-methods,wrong-import-position,missing-docstring,fixme
 
+import copy
 import os
+import re
 import subprocess
+import threading
+import time
 import warnings
-from functools import reduce
 
 from .auxiliary import (
     BetterList, Size, Position, Geometry, FileLoadError, FileSyntaxError,
-    InadequateConfiguration, Rotation, ROTATIONS, NORMAL, Mode,
+    InadequateConfiguration, CallCancelled, CallTimeout, Rotation, ROTATIONS, NORMAL, Mode,
 )
+from . import diagnostics, profiles, profiling
+from .edid import EDID
 from .i18n import _
 
 SHELLSHEBANG = '#!/bin/sh'
 
+MODE_NAME_SIZE = re.compile(r'^(\d+)x(\d+)')
+
+
+def parse_properties(text):
+    """Parse the property block of an output in the output of ``xrandr
+    --verbose`` into a dictionary of property names to values. Values that
+    span several lines (like the EDID, or the supported values that follow a
+    property) are joined by newlines."""
+    properties = {}
+    name = None
+    for line in text.splitlines():
+        if line[1:2].isspace():  # continuation of a property
+            if name is not None:
+                value = line.strip()
+                properties[name] = properties[name] + '\n' + value if properties[name] else value
+            continue
+        name, _colon, value = line[1:].partition(':')
+        properties[name] = value.strip()
+    return properties
+
 
 class Feature:
     PRIMARY = 1
 
 
+class QueryMode:
+    """Ways of asking the server for its state.
+
+    PROBE makes the server re-probe all outputs (slow, can make monitors
+    flicker), CURRENT returns the server's cached state, and PLAIN returns the
+    cached state without output properties and mode details."""
+    PROBE = 'probe'
+    CURRENT = 'current'
+    PLAIN = 'plain'
+
+    ARGUMENTS = {
+        PROBE: ('--verbose',),
+        CURRENT: ('--current', '--verbose'),
+        PLAIN: ('--current',),
+    }
+
+
+class Backend:
+    """Means of talking to the X server's RandR extension.
+
+    Backends that talk to the xrandr program (or replay its output) implement
+    output_lines and can rely on the default load and apply implementations,
+    which parse and generate xrandr command lines; backends that talk to the
+    server directly override version, load and apply."""
+
+    def output_lines(self, *args):
+        """Yield the lines xrandr prints when called with `args`."""
+        raise NotImplementedError
+
+    def output(self, *args):
+        return "".join(self.output_lines(*args))
+
+    def version(self):
+        """Return a version description in the style of ``xrandr --version``."""
+        return self.output("--version")
+
+    def load(self, xrandr, query_mode):
+        """Populate the empty `xrandr`.state and .configuration from the server."""
+        xrandr._load_from_lines(  # pylint: disable=protected-access
+            self.output_lines(*QueryMode.ARGUMENTS[query_mode]),
+            verbose=(query_mode != QueryMode.PLAIN)
+        )
+
+    def cancel(self):
+        """Abort all running calls, making them raise CallCancelled. Backends
+        that never block for long don't need to implement this."""
+
+    def load_changes(self, xrandr, changes):  # pylint: disable=no-self-use,unused-argument
+        """Update `xrandr`.state and .configuration for what the server
+        reported as `changes` (see events.Changes). Return False if that is not
+        possible, in which case everything is loaded again."""
+        return False
+
+    def apply(self, xrandr, diff=None):
+        """Make the server use `xrandr`.configuration. If a `diff` (see
+        Configuration.diff) is given, only the changes in it need to be sent."""
+        self.output(*xrandr.configuration.commandlineargs(diff))
+
+
+class SubprocessBackend(Backend):
+    """Backend that runs the xrandr program. Calls that take longer than
+    `timeout` seconds are killed, raising CallTimeout."""
+
+    DEFAULT_TIMEOUT = 30
+
+    def __init__(self, display=None, timeout=DEFAULT_TIMEOUT):
+        self.environ = dict(os.environ)
+        if display:
+            self.environ['DISPLAY'] = display
+        self.timeout = timeout
+        self._running = set()
+        self._killed = {}
+
+    def _kill(self, proc, reason):
+        self._killed.setdefault(proc, reason)
+        try:
+            proc.kill()
+        except OSError:
+            pass  # already gone
+
+    def cancel(self):
+        for proc in list(self._running):
+            self._kill(proc, CallCancelled)
+
+    def output_lines(self, *args):
+        """Run xrandr with `args` and yield its standard output line by line."""
+        profiling.count('xrandr.calls')
+        start = profiling.clock()
+        proc = subprocess.Popen(
+            ("xrandr",) + args,
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=self.environ
+        )
+        profiling.record('xrandr.spawn', profiling.clock() - start)
+        self._running.add(proc)
+        try:
+            start = profiling.clock()
+            try:
+                # both pipes are read at once, so a chatty stderr can't block xrandr
+                out, err = proc.communicate(timeout=self.timeout or None)
+            except subprocess.TimeoutExpired:
+                self._kill(proc, CallTimeout)
+                out, err = proc.communicate()
+            read = profiling.clock()
+            profiling.record('xrandr.wait', read - start)
+            text = out.decode('utf-8')
+            profiling.record('xrandr.decode', profiling.clock() - read)
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+                proc.wait()
+            self._running.discard(proc)
+        reason = self._killed.pop(proc, None)
+        if reason is not None:
+            raise reason("xrandr %s was aborted." % " ".join(args))
+        if proc.returncode != 0:
+            raise Exception("XRandR returned error code %d: %s" %
+                            (proc.returncode, err))
+        if err:
+            warnings.warn(
+                "XRandR wrote to stderr, but did not report an error (Message was: %r)" % err)
+        for line in text.splitlines(True):
+            yield line
+
+
+class AsyncCall:
+    """Runs `function` in a worker thread. Its result is passed to `callback`,
+    or an exception it raises to `errback`; both are called through
+    `dispatch`, which is given a function and its arguments (e.g.
+    GLib.idle_add, to have them called from a GLib main loop).
+
+    Cancelling makes `errback` receive CallCancelled, even if the function
+    finished in the meantime, and calls `cancel` to abort the function."""
+
+    def __init__(self, function, callback, errback, dispatch=None, cancel=None):  # pylint: disable=too-many-arguments
+        self._cancel = cancel
+        self.cancelled = False
+        self._thread = threading.Thread(
+            target=self._run, args=(function, callback, errback, dispatch or self._call), daemon=True
+        )
+        self._thread.start()
+
+    @staticmethod
+    def _call(function, *args):
+        function(*args)
+        return False  # for GLib.idle_add: don't call again
+
+    def _run(self, function, callback, errback, dispatch):
+        try:
+            result = function()
+        except Exception as exc:  # pylint: disable=broad-except
+            dispatch(self._call, errback, exc)
+            return
+        dispatch(self._finish, callback, errback, result)
+
+    def _finish(self, callback, errback, result):
+        if self.cancelled:
+            errback(CallCancelled())
+        else:
+            callback(result)
+        return False
+
+    def cancel(self):
+        self.cancelled = True
+        if self._cancel is not None:
+            self._cancel()
+
+    def join(self, timeout=None):
+        self._thread.join(timeout)
+
+
+BACKENDS = ('xrandr', 'xcb')
+
+
+def create_backend(name, display=None):
+    """Create a backend by its name in BACKENDS for `display`."""
+    if name == 'xrandr':
+        return SubprocessBackend(display)
+    if name == 'xcb':
+        from .xcbbackend import XCBBackend  # pylint: disable=import-outside-toplevel
+        return XCBBackend(display)
+    raise ValueError("Unknown backend: %s" % name)
+
+
 class XRandR:
-    DEFAULTTEMPLATE = [SHELLSHEBANG, '%(xrandr)s']
+    DEFAULTTEMPLATE = [SHELLSHEBANG, '%(fingerprints)s', '%(xrandr)s']
+    POLL_INTERVAL = 2  # seconds between loads in watch() without change notifications
 
     configuration = None
+    loaded_configuration = None
     state = None
+    state_is_cached = False  # state was not loaded from X along with the configuration
 
-    def __init__(self, display=None, force_version=False):
+    def __init__(self, display=None, force_version=False, query_mode=QueryMode.PROBE, backend=None):
         """Create proxy object and check for xrandr at `display`. Fail with
-        untested versions unless `force_version` is True."""
-        self.environ = dict(os.environ)
-        if display:
-            self.environ['DISPLAY'] = display
+        untested versions unless `force_version` is True. `query_mode` tells
+        how load_from_x asks the server by default (see QueryMode).
+
+        Unless another `backend` is given, the xrandr program is used."""
+        if query_mode not in QueryMode.ARGUMENTS:
+            raise ValueError("Unknown query mode: %s" % query_mode)
+        self.query_mode = query_mode
+        self.backend = backend if backend is not None else SubprocessBackend(display)
 
-        version_output = self._output("--version")
+        version_output = self.backend.version()
         supported_versions = ["1.2", "1.3", "1.4", "1.5"]
         if not any(x in version_output for x in supported_versions) and not force_version:
             raise Exception("XRandR %s required." %
@@ -64,23 +279,43 @@ class XRandR:
 
     #################### calling xrandr ####################
 
-    def _output(self, *args):
-        proc = subprocess.Popen(
-            ("xrandr",) + args,
-            stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=self.environ
-        )
-        ret, err = proc.communicate()
-        status = proc.wait()
-        if status != 0:
-            raise Exception("XRandR returned error code %d: %s" %
-                            (status, err))
-        if err:
-            warnings.warn(
-                "XRandR wrote to stderr, but did not report an error (Message was: %r)" % err)
-        return ret.decode('utf-8')
-
-    def _run(self, *args):
-        self._output(*args)
+    def run_async(self, function, callback, errback, dispatch=None, keep_edits=False):  # pylint: disable=too-many-arguments
+        """Call `function` with a copy of this object in a worker thread, and
+        return the AsyncCall. When it is done, this object takes over the copy's
+        state and configuration before `callback` gets the function's result.
+        With `keep_edits`, the copy's results are dropped instead if this
+        object's configuration was edited meanwhile, and `errback` gets
+        CallCancelled.
+
+        For example, ``run_async(lambda x: x.load_from_x(), ...)`` loads from X
+        without touching the current state until everything is loaded."""
+        worker = copy.copy(self)
+        started = self.configuration.copy() if keep_edits and self.configuration is not None else None
+        # the worker gets copies of what loading may update in place (see
+        # load_changes), so a cancelled or failed call leaves this object as it was
+        if self.state is not None:
+            worker.state = self.state.copy()
+        for name in ('configuration', 'loaded_configuration'):
+            configuration = getattr(self, name)
+            if configuration is not None:
+                configuration = configuration.copy()
+                configuration._xrandr = worker  # pylint: disable=protected-access
+                setattr(worker, name, configuration)
+
+        def done(result):
+            if started is not None and self.configuration.diff(started):
+                errback(CallCancelled())
+                return
+            self.state = worker.state
+            self.configuration = worker.configuration
+            self.loaded_configuration = worker.loaded_configuration
+            self.state_is_cached = worker.state_is_cached
+            for configuration in (self.configuration, self.loaded_configuration):
+                if configuration is not None:
+                    configuration._xrandr = self  # pylint: disable=protected-access
+            callback(result)
+
+        return AsyncCall(lambda: function(worker), done, errback, dispatch, self.backend.cancel)
 
     #################### loading ####################
 
@@ -102,10 +337,20 @@ class XRandR:
         self._load_from_commandlineargs(lines[xrandrlines[0]].strip())
         lines[xrandrlines[0]] = '%(xrandr)s'
 
+        # a recorded set of monitors (see profiles) is updated when saving
+        for i, line in enumerate(lines):
+            if line.startswith(profiles.FINGERPRINTS_PREFIX):
+                lines[i] = '%(fingerprints)s'
+
         return lines
 
     def _load_from_commandlineargs(self, commandline):
-        self.load_from_x()
+        if self.loaded_configuration is None:
+            self.load_from_x()
+        else:
+            # parse against the known state; it is refreshed when applying
+            self.configuration = self.loaded_configuration.copy()
+            self.state_is_cached = True
 
         args = BetterList(commandline.split(" "))
         if args.pop(0) != 'xrandr':
@@ -132,12 +377,10 @@ class XRandR:
                 ]
                 for part in parts:
                     if part[0] == '--mode':
-                        for namedmode in output_state.modes:
-                            if namedmode.name == part[1]:
-                                output.mode = namedmode
-                                break
-                        else:
+                        namedmode = output_state.mode_by_name(part[1])
+                        if namedmode is None:
                             raise FileLoadError("Not a known mode: %s" % part[1])
+                        output.mode = namedmode
                     elif part[0] == '--pos':
                         output.position = Position(part[1])
                     elif part[0] == '--rotate':
@@ -150,116 +393,252 @@ class XRandR:
                         raise FileSyntaxError()
                 output.active = True
 
-    def load_from_x(self):  # FIXME -- use a library
+    def load_from_x(self, probe=False):  # FIXME -- use a library
+        """Load state and configuration from X. The server is asked according
+        to the query_mode, unless `probe` forces a re-probe of all outputs."""
+        self._load_from_x(QueryMode.PROBE if probe else self.query_mode)
+
+    def _load_from_x(self, query_mode):
+        self.loaded_configuration = None  # only load_changes updates it output by output
         self.configuration = self.Configuration(self)
         self.state = self.State()
-
-        screenline, items = self._load_raw_lines()
-
-        self._load_parse_screenline(screenline)
-
-        for headline, details in items:
-            if headline.startswith("  "):
-                continue  # a currently disconnected part of the screen i can't currently get any info out of
-            if headline == "":
-                continue  # noise
-
-            headline = headline.replace(
-                'unknown connection', 'unknown-connection')
-            hsplit = headline.split(" ")
-            output = self.state.Output(hsplit[0])
-            assert hsplit[1] in (
-                "connected", "disconnected", 'unknown-connection')
-
-            output.connected = (hsplit[1] in ('connected', 'unknown-connection'))
-
-            primary = False
-            if 'primary' in hsplit:
-                if Feature.PRIMARY in self.features:
-                    primary = True
-                hsplit.remove('primary')
-
-            if not hsplit[2].startswith("("):
-                active = True
-
-                geometry = Geometry(hsplit[2])
-
-                # modeid = hsplit[3].strip("()")
-
-                if hsplit[4] in ROTATIONS:
-                    current_rotation = Rotation(hsplit[4])
-                else:
-                    current_rotation = NORMAL
-            else:
-                active = False
-                geometry = None
-                # modeid = None
-                current_rotation = None
-
-            output.rotations = set()
-            for rotation in ROTATIONS:
-                if rotation in headline:
-                    output.rotations.add(rotation)
-
-            current_mode = None
-            current_rate = None
-            for detail, w, hclock, h, vclock in details:
-                name, _mode_raw = detail[0:2]
-                rate = vclock.split("Hz")[0].strip()
-                mode_id = _mode_raw.strip("()")
-                try:
-                    size = Size([int(w), int(h)])
-                except ValueError:
-                    raise Exception(
-                        "Output %s parse error: modename %s modeid %s." % (output.name, name, mode_id)
-                    )
-                for old_mode in output.modes:
-                    if old_mode.name == name:
-                        if rate not in old_mode.rates:
-                            old_mode.rates.append(rate)
-                        mode = old_mode
-                        if tuple(old_mode) != tuple(size):
-                            warnings.warn((
-                                "Supressing duplicate mode %s even "
-                                "though it has different resolutions (%s, %s)."
-                            ) % (name, size, old_mode))
-                        break
-                else:
-                    mode = Mode(size, name=name, rates=[rate])
-                    output.modes.append(mode)
-                if "*current" in detail:
-                    current_mode = mode
-                    current_rate = rate
-                for x in ["+preferred", "*current"]:
-                    if x in detail:
-                        detail.remove(x)
-            self.state.outputs[output.name] = output
-            self.configuration.outputs[output.name] = self.configuration.OutputConfiguration(
-                active, primary, geometry, current_rotation, current_rate, current_mode
-            )
-
-    def _load_raw_lines(self):
-        output = self._output("--verbose")
-        items = []
+        with profiling.timer('parse', exclude=('xrandr.spawn', 'xrandr.wait', 'xrandr.decode')):
+            self.backend.load(self, query_mode)
+        self.loaded_configuration = self.configuration.copy()
+        self.state_is_cached = False
+
+    def load_snapshot(self, state, configuration):
+        """Use a `state` and `configuration` obtained earlier (possibly from
+        another XRandR object) as if they had just been loaded from X. Files
+        can then be loaded without asking the server; the state is refreshed
+        when the configuration is applied."""
+        self.state = state
+        self.loaded_configuration = configuration.copy()
+        self.loaded_configuration._xrandr = self  # pylint: disable=protected-access
+        self.configuration = self.loaded_configuration.copy()
+        self.state_is_cached = True
+
+    def refresh_from_x(self):
+        """Load the state from X again, keeping the edits to the configuration
+        of outputs that are still there."""
+        edited = self.configuration
+        self.load_from_x()
+        for output_name, output in edited.outputs.items():
+            if output_name not in self.state.outputs:
+                if output.active:
+                    raise InadequateConfiguration("Output %s is not available any more." % output_name)
+                continue
+            self.configuration.outputs[output_name] = output
+
+    def load_changes(self, changes):
+        """Update state and configuration after the server reported `changes`
+        (see events.Changes). Only the affected outputs are loaded again if the
+        backend supports it; otherwise, everything is reloaded: from the
+        server's current state, unless a hotplug makes it probe all outputs
+        (like the polling in watch())."""
+        if not self.backend.load_changes(self, changes):
+            self._load_from_x(QueryMode.PROBE if changes.hotplug else QueryMode.CURRENT)
+
+    def watch(self, display=None, interval=POLL_INTERVAL):
+        """Yield whenever the layout may have changed, after updating state and
+        configuration, forever. The server's change notifications are waited
+        for with an events.RandRWatcher on `display` if xcffib is available;
+        otherwise, the server's cached state is loaded every `interval`
+        seconds."""
+        try:
+            from .events import RandRWatcher  # pylint: disable=import-outside-toplevel
+        except ImportError:
+            warnings.warn("xcffib is not available; polling for changes every %s seconds" % interval)
+            query_mode = QueryMode.CURRENT if self.query_mode == QueryMode.PROBE else self.query_mode
+            while True:
+                time.sleep(interval)
+                self._load_from_x(query_mode)
+                yield
+
+        watcher = RandRWatcher(display)
+        try:
+            while True:
+                self.load_changes(watcher.wait())
+                yield
+        finally:
+            watcher.close()
+
+    def _load_from_lines(self, lines, verbose=True):
+        """Fill state and configuration from the lines of xrandr's output
+        (``--verbose`` unless `verbose` is False) in a single pass over `lines`."""
         screenline = None
-        for line in output.split('\n'):
-            if line.startswith("Screen "):
+        output = None
+        for kind, data in self._load_raw_lines(lines, verbose):
+            if kind == 'mode':
+                mode = self._load_parse_mode(output, headinfo, data)
+                if data[5]:
+                    current = data[4], mode
+            elif kind == 'properties':
+                output.raw_properties = data
+            elif kind == 'output':
+                if output is not None:
+                    self._load_add_output(output, headinfo, current)
+                output, headinfo = self._load_parse_headline(data)
+                current = None, None
+            else:
                 assert screenline is None
-                screenline = line
-            elif line.startswith('\t'):
+                screenline = data
+                self._load_parse_screenline(screenline)
+        if output is not None:
+            self._load_add_output(output, headinfo, current)
+
+        assert screenline is not None
+
+    def _load_raw_lines(self, lines, verbose=True):
+        """Tokenize xrandr output (``--verbose`` unless `verbose` is False).
+
+        Yields ('screen', line), ('output', headline), ('properties', text)
+        and ('mode', (name, mode_id, width, height, rate, is_current)) tuples.
+        The text of an output's property block is passed on as it is, to be
+        parsed by parse_properties only if the properties are needed. Lines are
+        consumed as they come in, so `lines` can be a pipe."""
+        if not verbose:
+            for token in self._load_raw_plain_lines(lines):
+                yield token
+            return
+
+        detail = width = None
+        block = []  # lines of the property block being read
+        for line in lines:
+            if line.startswith('\t'):
+                block.append(line)
                 continue
-            elif line.startswith(2 * ' '):  # [mode, width, height]
+            if block:
+                yield 'properties', ''.join(block)
+                block = []
+            line = line.rstrip('\n')
+            if line.startswith(2 * ' '):  # [mode, width, height]
                 line = line.strip()
-                if reduce(bool.__or__, [line.startswith(x + ':') for x in "hv"]):
-                    clock = line.split("clock")[-1]
-                    line = line[-len(line):line.index(" start") - len(line)]
-                    items[-1][1][-1].append(line[line.rindex(' '):])
-                    items[-1][1][-1].append(clock)
+                if line.startswith('h:'):
+                    width = line.split()[2]
+                elif line.startswith('v:'):
+                    vsplit = line.split()
+                    rate = vsplit[-1].split("Hz")[0]
+                    yield 'mode', (detail[0], detail[1].strip("()"), width, vsplit[2], rate, "*current" in detail)
                 else:  # mode
-                    items[-1][1].append([line.split()])
-            else:
-                items.append([line, []])
-        return screenline, items
+                    detail = line.split()
+            elif line.startswith("Screen "):
+                yield 'screen', line
+            elif line:
+                yield 'output', line
+        if block:
+            yield 'properties', ''.join(block)
+
+    @staticmethod
+    def _load_raw_plain_lines(lines):
+        """Like _load_raw_lines, but for the mode lines of the non-verbose
+        output, which list all rates of a mode name on one line and do not
+        tell mode ids (and sizes of modes not named after their size)."""
+        for line in lines:
+            line = line.rstrip('\n')
+            if line.startswith(2 * ' '):
+                msplit = line.split()
+                name = msplit.pop(0)
+                size = MODE_NAME_SIZE.match(name)
+                width, height = size.groups() if size else (None, None)
+                rates = []
+                for token in msplit:
+                    if not token.strip('*+'):
+                        # flags separated by padding, e.g. "60.00 +"
+                        rates[-1][1] += token
+                    else:
+                        rates.append([token.rstrip('*+'), token])
+                for rate, flags in rates:
+                    yield 'mode', (name, None, width, height, rate, '*' in flags)
+            elif line.startswith("Screen "):
+                yield 'screen', line
+            elif line:
+                yield 'output', line
+
+    def _load_parse_headline(self, headline):
+        headline = headline.replace(
+            'unknown connection', 'unknown-connection')
+        hsplit = headline.split(" ")
+        output = self.state.Output(hsplit[0])
+        assert hsplit[1] in (
+            "connected", "disconnected", 'unknown-connection')
+
+        output.connected = (hsplit[1] in ('connected', 'unknown-connection'))
+
+        primary = False
+        if 'primary' in hsplit:
+            if Feature.PRIMARY in self.features:
+                primary = True
+            hsplit.remove('primary')
+
+        if not hsplit[2].startswith("("):
+            active = True
+
+            geometry = Geometry(hsplit[2])
+
+            # verbose output always lists mode id and rotation, the plain
+            # output only lists rotation if it is not normal
+            current_rotation = NORMAL
+            for token in hsplit[3:]:
+                if token in ROTATIONS:
+                    current_rotation = Rotation(token)
+                    break
+                if token.startswith("(") and not token.startswith("(0x"):
+                    break  # list of available rotations
+        else:
+            active = False
+            geometry = None
+            current_rotation = None
+
+        output.rotations = set()
+        for rotation in ROTATIONS:
+            if rotation in headline:
+                output.rotations.add(rotation)
+
+        return output, (active, primary, geometry, current_rotation)
+
+    def _load_parse_mode(self, output, headinfo, data):  # pylint: disable=no-self-use
+        name, mode_id, w, h, rate, is_current = data
+        if w is None:
+            _active, _primary, geometry, rotation = headinfo
+            if not is_current:
+                warnings.warn("Ignoring mode %s of unknown size on output %s." % (name, output.name))
+                return None
+            w, h = reversed(geometry.size) if rotation.is_odd else geometry.size
+        try:
+            size = Size([int(w), int(h)])
+        except ValueError:
+            raise Exception(
+                "Output %s parse error: modename %s modeid %s." % (output.name, name, mode_id)
+            )
+        mode = output.mode_by_name(name)
+        if mode is not None:
+            if rate not in mode.rates:
+                mode.rates.append(rate)
+            if tuple(mode) != tuple(size):
+                warnings.warn((
+                    "Supressing duplicate mode %s even "
+                    "though it has different resolutions (%s, %s)."
+                ) % (name, size, mode))
+        else:
+            mode = Mode(size, name=name, rates=[rate])
+            output.add_mode(mode)
+        return mode
+
+    def _load_add_output(self, output, headinfo, current):
+        active, primary, geometry, current_rotation = headinfo
+        current_rate, current_mode = current
+        output.intern_modes(self.state)
+        self.state.outputs[output.name] = output
+        output_config = self.configuration.OutputConfiguration(
+            active, primary, geometry, current_rotation, current_rate, current_mode
+        )
+        if active:
+            output_config.mode = self.state.intern_mode(output_config.mode)
+        self.configuration.outputs[output.name] = output_config
+        if self.loaded_configuration is not None:
+            # keep track of what is on the server when updating single outputs
+            self.loaded_configuration.outputs[output.name] = copy.copy(self.configuration.outputs[output.name])
 
     def _load_parse_screenline(self, screenline):
         assert screenline is not None
@@ -287,29 +666,56 @@ class XRandR:
 
         You may specify a template, which must contain a %(xrandr)s parameter
         and optionally others, which will be filled from the additional dictionary.
+        A %(fingerprints)s parameter is replaced with a comment that tells which
+        monitors are connected (see profiles).
         """
         if not template:
             template = self.DEFAULTTEMPLATE
         template = '\n'.join(template) + '\n'
 
         data = {
-            'xrandr': "xrandr " + " ".join(self.configuration.commandlineargs())
+            'xrandr': "xrandr " + " ".join(self.configuration.commandlineargs()),
         }
+        if '%(fingerprints)s' in template:
+            # reading the EDIDs parses the output properties (see State.Output)
+            data['fingerprints'] = profiles.fingerprints_line(self.state)
         if additional:
             data.update(additional)
 
         return template % data
 
-    def save_to_x(self):
-        self.check_configuration()
-        self._run(*self.configuration.commandlineargs())
+    def save_to_x(self, force=False):
+        """Apply the configuration. Only what differs from the configuration
+        last loaded from X is sent, and nothing at all if nothing changed,
+        unless `force` is True.
 
-    def check_configuration(self):
+        If the configuration was not loaded along with the state (see
+        load_snapshot), the state is loaded from X first."""
+        if self.state_is_cached:
+            self.refresh_from_x()
+        self.check_configuration()
+        diff = None if force else self.configuration_diff()
+        if diff is not None and not diff:
+            return
+        with profiling.timer('apply'):
+            self.backend.apply(self, diff)
+        self.loaded_configuration = self.configuration.copy()
+
+    def configuration_diff(self):
+        """Return what save_to_x would change, see Configuration.diff."""
+        return self.configuration.diff(self.loaded_configuration)
+
+    @profiling.timed('check_configuration')
+    def check_configuration(self, output_name=None):
+        """Raise InadequateConfiguration if an active output does not fit in
+        the virtual screen, and return the diagnose() results otherwise. If
+        only the output `output_name` changed, only that one is checked."""
         vmax = self.state.virtual.max
 
-        for output_name in self.outputs:
-            output_config = self.configuration.outputs[output_name]
-            # output_state = self.state.outputs[output_name]
+        names = self.outputs if output_name is None else (output_name,)
+        for name in names:
+            output_config = self.configuration.outputs[name]
+            # output_state = self.state.outputs[name]
 
             if not output_config.active:
                 continue
@@ -323,17 +729,32 @@ class XRandR:
             # if output_config.mode not in output_state.modes:
             #    raise InadequateConfiguration("Mode not allowed.")
 
-            x = output_config.position[0] + output_config.size[0]
-            y = output_config.position[1] + output_config.size[1]
+            left, top, right, bottom = output_config.bounds
 
-            if x > vmax[0] or y > vmax[1]:
+            if right > vmax[0] or bottom > vmax[1]:
                 raise InadequateConfiguration(
                     _("A part of an output is outside the virtual screen."))
 
-            if output_config.position[0] < 0 or output_config.position[1] < 0:
+            if left < 0 or top < 0:
                 raise InadequateConfiguration(
                     _("An output is outside the virtual screen."))
 
+        return self.diagnose(output_name)
+
+    def diagnose(self, output_name=None):
+        """Return a list of diagnostics.Diagnostic about overlapping, mirrored
+        and detached active outputs. If `output_name` is given, only the
+        overlaps and mirrors involving that output are determined (see
+        diagnostics.diagnose_output), along with the detached groups, which
+        one output can change for all others (see diagnostics.merge)."""
+        bounds = dict(
+            (name, output.bounds) for (name, output) in self.configuration.outputs.items() if output.active
+        )
+        if output_name is None:
+            return diagnostics.diagnose(bounds)
+        found = diagnostics.diagnose_output(bounds, output_name) if output_name in bounds else []
+        return found + diagnostics.detached(bounds)
+
     #################### sub objects ####################
 
     class State:
@@ -343,6 +764,27 @@ class XRandR:
 
         def __init__(self):
             self.outputs = {}
+            self._modes = {}
+
+        def intern_mode(self, mode):
+            """Return the mode of this state that equals `mode` in name, size
+            and rates, registering `mode` if there is none yet. Interned modes
+            are shared between outputs, so their rates become a tuple."""
+            key = (mode.name, tuple(mode), tuple(mode.rates))
+            interned = self._modes.get(key)
+            if interned is None:
+                mode.rates = key[2]
+                interned = self._modes[key] = mode
+            return interned
+
+        def copy(self):
+            """Return a copy to which outputs and modes can be added
+            independently."""
+            other = type(self)()
+            other.virtual = self.virtual
+            other.outputs = dict(self.outputs)
+            other._modes = dict(self._modes)  # pylint: disable=protected-access
+            return other
 
         def __repr__(self):
             return '<%s for %d Outputs, %d connected>' % (
@@ -356,12 +798,74 @@ class XRandR:
                 self.max = max_mode
 
         class Output:
-            rotations = None
-            connected = None
+            __slots__ = (
+                'name', 'modes', 'rotations', 'connected', 'xid', 'raw_properties', '_properties',
+                '_modes_by_name', '_first_mode_by_size',
+            )
 
             def __init__(self, name):
                 self.name = name
+                self.rotations = None
+                self.connected = None
+                self.xid = None  # only known to backends that talk to the server directly
+                self.raw_properties = None  # property block of xrandr --verbose, parsed when needed
+                self._properties = None
+                self.modes = []
+                self._modes_by_name = {}
+                self._first_mode_by_size = {}
+
+            def add_mode(self, mode):
+                """Append `mode` to the modes. Always use this instead of
+                modifying the modes list directly to keep the indices in sync."""
+                self.modes.append(mode)
+                self._modes_by_name.setdefault(mode.name, mode)
+                self._first_mode_by_size.setdefault(tuple(mode), mode)
+
+            def intern_modes(self, state):
+                """Replace the modes by the equal ones interned in `state`."""
+                modes = self.modes
                 self.modes = []
+                self._modes_by_name = {}
+                self._first_mode_by_size = {}
+                for mode in modes:
+                    self.add_mode(state.intern_mode(mode))
+
+            def mode_by_name(self, name):
+                """Return the first mode called `name`, or None."""
+                return self._modes_by_name.get(name)
+
+            @property
+            def properties(self):
+                """Dictionary of property names to values as xrandr prints
+                them (see parse_properties)"""
+                if self._properties is None:
+                    self._properties = parse_properties(self.raw_properties) if self.raw_properties else {}
+                    self.raw_properties = None
+                return self._properties
+
+            @property
+            def edid(self):
+                """The edid.EDID of the connected monitor, or None if it is
+                not known"""
+                if 'EDID' not in self.properties:
+                    return None
+                return EDID.from_hex(self.properties['EDID'])
+
+            @property
+            def fingerprint(self):
+                """A string that identifies the connected monitor (see
+                edid.EDID), or None if it is not known"""
+                edid = self.edid
+                return edid.fingerprint if edid is not None else None
+
+            def first_fitting_mode(self, max_size):
+                """Return the first mode that is not larger than `max_size`,
+                or None if there is no such mode."""
+                # sizes are indexed in order of their first appearance
+                for size, mode in self._first_mode_by_size.items():
+                    if size[0] <= max_size[0] and size[1] <= max_size[1]:
+                        return mode
+                return None
 
             def __repr__(self):
                 return '<%s %r (%d modes)>' % (type(self).__name__, self.name, len(self.modes))
@@ -384,30 +888,98 @@ class XRandR:
                 len([x for x in self.outputs.values() if x.active])
             )
 
-        def commandlineargs(self):
+        def copy(self):
+            """Return a copy whose outputs can be changed independently."""
+            other = type(self)(self._xrandr)
+            other.virtual = self.virtual
+            other.outputs = dict((name, copy.copy(output)) for (name, output) in self.outputs.items())
+            return other
+
+        ATTRIBUTES = ('active', 'primary', 'mode', 'rate', 'position', 'rotation')
+
+        def diff(self, base):
+            """Return how this configuration differs from the `base`
+            configuration, as a dictionary of the names of changed outputs to
+            sets of their changed ATTRIBUTES. It is empty if both are the same.
+
+            Apart from being switched off, changes to inactive outputs are
+            not considered."""
+            result = {}
+            for output_name, output in self.outputs.items():
+                old = base.outputs.get(output_name) if base is not None else None
+                if old is None:
+                    result[output_name] = set(self.ATTRIBUTES)
+                    continue
+                if not output.active and not old.active:
+                    continue
+
+                changed = set()
+                if output.active != old.active:
+                    changed.add('active')
+                if output.primary != old.primary and Feature.PRIMARY in self._xrandr.features:
+                    changed.add('primary')
+                if output.active and old.active:
+                    if output.mode.name != old.mode.name or tuple(output.mode) != tuple(old.mode):
+                        changed.add('mode')
+                    if getattr(output, 'rate', None) != getattr(old, 'rate', None):
+                        changed.add('rate')
+                    if output.position != old.position:
+                        changed.add('position')
+                    if output.rotation != old.rotation:
+                        changed.add('rotation')
+                if changed:
+                    result[output_name] = changed
+            return result
+
+        def commandlineargs(self, diff=None):
+            """Return the xrandr arguments that set up this configuration. If
+            a `diff` is given, only its outputs and attributes are included."""
             args = []
+            if diff is not None and Feature.PRIMARY in self._xrandr.features:
+                if any('primary' in changed for changed in diff.values()) and \
+                        not any(o.active and o.primary for o in self.outputs.values()):
+                    args.append("--noprimary")
             for output_name, output in self.outputs.items():
-                args.append("--output")
-                args.append(output_name)
+                if diff is None or 'active' in diff.get(output_name, ()):
+                    changed = self.ATTRIBUTES
+                elif output_name in diff:
+                    changed = diff[output_name]
+                else:
+                    continue
+
+                output_args = []
                 if not output.active:
-                    args.append("--off")
+                    output_args.append("--off")
                 else:
-                    if Feature.PRIMARY in self._xrandr.features:
+                    if Feature.PRIMARY in self._xrandr.features and 'primary' in changed:
                         if output.primary:
-                            args.append("--primary")
-                    args.append("--mode")
-                    args.append(str(output.mode.name))
-                    args.append("--rate")
-                    args.append(output.rate)
-                    args.append("--pos")
-                    args.append(str(output.position))
-                    args.append("--rotate")
-                    args.append(output.rotation)
+                            output_args.append("--primary")
+                    if 'mode' in changed or 'rate' in changed:
+                        output_args.append("--mode")
+                        output_args.append(str(output.mode.name))
+                        output_args.append("--rate")
+                        output_args.append(output.rate)
+                    if 'position' in changed:
+                        output_args.append("--pos")
+                        output_args.append(str(output.position))
+                    if 'rotation' in changed:
+                        output_args.append("--rotate")
+                        output_args.append(output.rotation)
+                if output_args or diff is None:
+                    args.append("--output")
+                    args.append(output_name)
+                    args.extend(output_args)
             return args
 
         class OutputConfiguration:
+            # position, rotation, rate and mode are only set for active outputs
+            __slots__ = (
+                'active', 'primary', 'rate', '_position', '_rotation', '_mode', '_size', '_bounds',
+                'tentative_position',
+            )
 
             def __init__(self, active, primary, geometry, rotation, rate, mode):
+                self._size = self._bounds = None
                 self.active = active
                 self.primary = primary
                 if active:
@@ -421,6 +993,40 @@ class XRandR:
                         self.mode = Mode(
                             geometry.size, name=mode.name, rates=mode.rates)
 
-            size = property(lambda self: Mode(
-                Size(reversed(self.mode)), name=self.mode.name, rates=self.mode.rates
-            ) if self.rotation.is_odd else self.mode)
+            # size and bounds are cached; setting any of these invalidates them
+
+            def _set_position(self, position):
+                self._position = position
+                self._bounds = None
+
+            def _set_rotation(self, rotation):
+                self._rotation = rotation
+                self._size = self._bounds = None
+
+            def _set_mode(self, mode):
+                self._mode = mode
+                self._size = self._bounds = None
+
+            position = property(lambda self: self._position, _set_position)
+            rotation = property(lambda self: self._rotation, _set_rotation)
+            mode = property(lambda self: self._mode, _set_mode)
+
+            @property
+            def size(self):
+                """The mode as it appears on the screen, i.e. with width and
+                height swapped for outputs rotated by 90 degree"""
+                if self._size is None:
+                    mode = self._mode
+                    self._size = Mode(
+                        Size(reversed(mode)), name=mode.name, rates=mode.rates
+                    ) if self._rotation.is_odd else mode
+                return self._size
+
+            @property
+            def bounds(self):
+                """(left, top, right, bottom) of the area the output covers"""
+                if self._bounds is None:
+                    left, top = self._position
+                    size = self.size
+                    self._bounds = (left, top, left + size[0], top + size[1])
+                return self._bounds
@@ -0,0 +1,52 @@
+# ARandR -- Another XRandR GUI
+# Copyright (C) 2008 -- 2011 chrysn <chrysn@fsfe.org>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Captured xrandr output for the tests
+
+xrandr-verbose.txt is the output of ``xrandr --verbose`` (and ``--current
+--verbose``) for a laptop panel, a rotated monitor with an interlaced mode,
+and a disconnected output; xrandr-plain.txt is ``xrandr --current`` for the
+same setup."""
+
+import os
+
+from screenlayout.snapshot import ReplayBackend
+from screenlayout.xrandr import XRandR, QueryMode
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+
+def read(name):
+    with open(os.path.join(DATA, name)) as data:
+        return data.read()
+
+
+def raw():
+    """The captured output, keyed like a snapshot's raw xrandr output"""
+    verbose = read('xrandr-verbose.txt')
+    return {
+        ' '.join(QueryMode.ARGUMENTS[QueryMode.PROBE]): verbose,
+        ' '.join(QueryMode.ARGUMENTS[QueryMode.CURRENT]): verbose,
+        ' '.join(QueryMode.ARGUMENTS[QueryMode.PLAIN]): read('xrandr-plain.txt'),
+    }
+
+
+def load(query_mode=QueryMode.PROBE):
+    """Return an XRandR loaded from the captured output; what it applies is
+    recorded in .backend.applied."""
+    xrandr = XRandR(backend=ReplayBackend({'raw': raw()}), query_mode=query_mode)
+    xrandr.load_from_x()
+    return xrandr
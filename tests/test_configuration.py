@@ -0,0 +1,102 @@
+# ARandR -- Another XRandR GUI
+# Copyright (C) 2008 -- 2011 chrysn <chrysn@fsfe.org>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests of applying only what changed in a configuration"""
+
+import unittest
+
+from screenlayout.auxiliary import Position, NORMAL
+
+import fixtures
+
+
+class DiffTest(unittest.TestCase):
+
+    def setUp(self):
+        self.xrandr = fixtures.load()
+        self.configuration = self.xrandr.configuration
+        self.applied = self.xrandr.backend.applied
+
+    def changed_args(self):
+        return self.configuration.commandlineargs(self.xrandr.configuration_diff())
+
+    def test_unchanged(self):
+        self.assertEqual(self.xrandr.configuration_diff(), {})
+        self.assertEqual(self.changed_args(), [])
+
+    def test_position(self):
+        self.configuration.outputs['HDMI-1'].position = Position((1920, 100))
+        self.assertEqual(self.xrandr.configuration_diff(), {'HDMI-1': {'position'}})
+        self.assertEqual(self.changed_args(), ['--output', 'HDMI-1', '--pos', '1920x100'])
+
+    def test_rate(self):
+        self.configuration.outputs['eDP-1'].rate = '48.04'
+        self.assertEqual(self.xrandr.configuration_diff(), {'eDP-1': {'rate'}})
+        self.assertEqual(self.changed_args(), ['--output', 'eDP-1', '--mode', '1920x1080', '--rate', '48.04'])
+
+    def test_activate(self):
+        output = self.configuration.outputs['DP-1']
+        output.active = True
+        output.mode = self.xrandr.state.outputs['DP-1'].modes[0]
+        output.rate = '60.00'
+        output.position = Position((0, 1080))
+        output.rotation = NORMAL
+        self.assertEqual(self.xrandr.configuration_diff(), {'DP-1': {'active'}})
+        # all attributes are set for newly enabled outputs
+        self.assertEqual(self.changed_args(), [
+            '--output', 'DP-1', '--mode', '1024x768', '--rate', '60.00', '--pos', '0x1080', '--rotate', 'normal',
+        ])
+
+    def test_deactivate(self):
+        self.configuration.outputs['HDMI-1'].active = False
+        self.assertEqual(self.xrandr.configuration_diff(), {'HDMI-1': {'active'}})
+        self.assertEqual(self.changed_args(), ['--output', 'HDMI-1', '--off'])
+
+    def test_inactive_changes_ignored(self):
+        self.configuration.outputs['HDMI-1'].active = False
+        self.xrandr.save_to_x()
+        self.configuration.outputs['HDMI-1'].position = Position((0, 0))
+        self.assertEqual(self.xrandr.configuration_diff(), {})
+
+    def test_primary(self):
+        self.configuration.outputs['eDP-1'].primary = False
+        self.configuration.outputs['HDMI-1'].primary = True
+        self.assertEqual(self.xrandr.configuration_diff(), {'eDP-1': {'primary'}, 'HDMI-1': {'primary'}})
+        self.assertEqual(self.changed_args(), ['--output', 'HDMI-1', '--primary'])
+
+    def test_drop_primary(self):
+        self.configuration.outputs['eDP-1'].primary = False
+        self.assertEqual(self.changed_args(), ['--noprimary'])
+
+    def test_save_skips_empty_diff(self):
+        self.xrandr.save_to_x()
+        self.assertEqual(self.applied, [])
+
+    def test_save_applies_diff(self):
+        self.configuration.outputs['HDMI-1'].position = Position((1920, 100))
+        self.xrandr.save_to_x()
+        self.assertEqual(self.applied, [['--output', 'HDMI-1', '--pos', '1920x100']])
+        # what was applied is now the base of the diff
+        self.xrandr.save_to_x()
+        self.assertEqual(len(self.applied), 1)
+
+    def test_save_force(self):
+        self.xrandr.save_to_x(force=True)
+        self.assertEqual(self.applied, [self.configuration.commandlineargs()])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+# ARandR -- Another XRandR GUI
+# Copyright (C) 2008 -- 2011 chrysn <chrysn@fsfe.org>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests of the layout diagnostics against brute-force versions"""
+
+import itertools
+import random
+import unittest
+
+from screenlayout import diagnostics
+from screenlayout.diagnostics import Diagnostic, ADJACENT
+
+
+def brute_pairs(bounds):
+    """All related pairs, as frozensets with their relation"""
+    found = set()
+    for first, second in itertools.combinations(sorted(bounds), 2):
+        kind = diagnostics.relation(bounds[first], bounds[second])
+        if kind is not None:
+            found.add((frozenset((first, second)), kind))
+    return found
+
+
+def brute_diagnose(bounds):
+    pairs = brute_pairs(bounds)
+    found = set(Diagnostic(kind, names) for (names, kind) in pairs if kind != ADJACENT)
+
+    neighbours = dict((name, set()) for name in bounds)
+    for names, _kind in pairs:
+        first, second = names
+        neighbours[first].add(second)
+        neighbours[second].add(first)
+    components, seen = [], set()
+    for name in sorted(bounds):
+        if name in seen:
+            continue
+        component, todo = set(), [name]
+        while todo:
+            current = todo.pop()
+            if current not in component:
+                component.add(current)
+                todo.extend(neighbours[current])
+        seen |= component
+        components.append(sorted(component))
+    components.sort(key=lambda names: (-len(names), names))
+    found.update(Diagnostic(Diagnostic.DETACHED, names) for names in components[1:])
+    return found
+
+
+def random_layout(rng, count):
+    """Outputs on a coarse grid, so that many of them touch or overlap"""
+    bounds = {}
+    for number in range(count):
+        left, top = rng.randrange(0, 40, 10), rng.randrange(0, 40, 10)
+        width, height = rng.choice((10, 20)), rng.choice((10, 20))
+        bounds['out%d' % number] = (left, top, left + width, top + height)
+    return bounds
+
+
+class DiagnosticsTest(unittest.TestCase):
+
+    def test_related_pairs(self):
+        rng = random.Random(1)
+        for _ in range(300):
+            bounds = random_layout(rng, rng.randrange(1, 9))
+            found = [(frozenset((a, b)), kind) for (a, b, kind) in diagnostics.related_pairs(bounds)]
+            self.assertEqual(len(found), len(set(found)))
+            self.assertEqual(set(found), brute_pairs(bounds), bounds)
+
+    def test_diagnose(self):
+        rng = random.Random(2)
+        for _ in range(300):
+            bounds = random_layout(rng, rng.randrange(1, 9))
+            self.assertEqual(set(diagnostics.diagnose(bounds)), brute_diagnose(bounds), bounds)
+
+    def test_incremental(self):
+        """Moving or removing outputs one at a time, merging what is found
+        for each of them, gives the same as diagnosing the whole layout."""
+        rng = random.Random(3)
+        for _ in range(100):
+            bounds = random_layout(rng, rng.randrange(2, 9))
+            found = diagnostics.diagnose(bounds)
+            for _step in range(10):
+                name = rng.choice(sorted(bounds))
+                if len(bounds) > 1 and rng.random() < 0.2:
+                    del bounds[name]  # switched off, see XRandR.diagnose
+                    output_found = diagnostics.detached(bounds)
+                else:
+                    bounds[name] = random_layout(rng, 1)['out0']
+                    output_found = diagnostics.diagnose_output(bounds, name) + diagnostics.detached(bounds)
+                found = diagnostics.merge(found, name, output_found)
+                self.assertEqual(set(found), brute_diagnose(bounds), bounds)
+                self.assertEqual(len(found), len(set(found)))
+
+    def test_moving_away_regroups(self):
+        bounds = {
+            'A': (0, 0, 10, 10), 'B': (10, 0, 20, 10),
+            'C': (100, 0, 110, 10), 'D': (110, 0, 120, 10),
+        }
+        found = diagnostics.diagnose(bounds)
+        self.assertEqual(found, [Diagnostic(Diagnostic.DETACHED, ('C', 'D'))])
+
+        bounds['A'] = (0, 100, 10, 110)
+        found = diagnostics.merge(found, 'A', diagnostics.diagnose_output(bounds, 'A') + diagnostics.detached(bounds))
+        self.assertEqual(set(found), set([
+            Diagnostic(Diagnostic.DETACHED, ('A',)), Diagnostic(Diagnostic.DETACHED, ('B',)),
+        ]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,218 @@
+# ARandR -- Another XRandR GUI
+# Copyright (C) 2008 -- 2011 chrysn <chrysn@fsfe.org>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests of parsing captured xrandr output"""
+
+import unittest
+
+from screenlayout.auxiliary import NORMAL, LEFT, ROTATIONS
+from screenlayout.xrandr import QueryMode, parse_properties
+
+import fixtures
+
+
+def modes(output):
+    return [(mode.name, tuple(mode), tuple(mode.rates)) for mode in output.modes]
+
+
+class VerboseParserTest(unittest.TestCase):
+
+    query_mode = QueryMode.PROBE
+
+    def setUp(self):
+        self.xrandr = fixtures.load(self.query_mode)
+
+    def test_screen(self):
+        self.assertEqual(tuple(self.xrandr.state.virtual.min), (320, 200))
+        self.assertEqual(tuple(self.xrandr.state.virtual.max), (16384, 16384))
+        self.assertEqual(tuple(self.xrandr.configuration.virtual), (3840, 1080))
+        self.assertEqual(list(self.xrandr.state.outputs), ['eDP-1', 'HDMI-1', 'DP-1'])
+
+    def test_primary_output(self):
+        output = self.xrandr.state.outputs['eDP-1']
+        config = self.xrandr.configuration.outputs['eDP-1']
+        self.assertTrue(output.connected)
+        self.assertEqual(output.rotations, set(ROTATIONS))
+        self.assertEqual(modes(output), [
+            ('1920x1080', (1920, 1080), ('60.05', '48.04')),
+            ('1680x1050', (1680, 1050), ('59.95',)),
+        ])
+        self.assertTrue(config.active)
+        self.assertTrue(config.primary)
+        self.assertEqual(tuple(config.position), (0, 0))
+        self.assertEqual(config.rotation, NORMAL)
+        self.assertEqual(config.rate, '60.05')
+        self.assertEqual(config.mode.name, '1920x1080')
+
+    def test_rotated_output(self):
+        config = self.xrandr.configuration.outputs['HDMI-1']
+        self.assertTrue(config.active)
+        self.assertFalse(config.primary)
+        self.assertEqual(config.rotation, LEFT)
+        self.assertEqual(tuple(config.position), (1920, 0))
+        self.assertEqual(tuple(config.mode), (1920, 1080))
+        self.assertEqual(tuple(config.size), (1080, 1920))
+        self.assertEqual(config.bounds, (1920, 0, 3000, 1920))
+
+    def test_interlaced_mode(self):
+        output = self.xrandr.state.outputs['HDMI-1']
+        self.assertIn(('1920x1080i', (1920, 1080), ('60.00',)), modes(output))
+        self.assertEqual(output.mode_by_name('1920x1080i').name, '1920x1080i')
+
+    def test_disconnected_output(self):
+        output = self.xrandr.state.outputs['DP-1']
+        self.assertFalse(output.connected)
+        self.assertFalse(self.xrandr.configuration.outputs['DP-1'].active)
+        self.assertEqual(modes(output), [('1024x768', (1024, 768), ('60.00',))])
+        self.assertIsNone(output.fingerprint)
+
+    def test_properties(self):
+        properties = self.xrandr.state.outputs['eDP-1'].properties
+        self.assertEqual(properties['Identifier'], '0x42')
+        self.assertEqual(properties['CRTCs'], '0 1 2')
+        self.assertEqual(properties['Clones'], '')
+        self.assertEqual(properties['scaling mode'], 'Full aspect\nsupported: Full, Center, Full aspect')
+        self.assertEqual(properties['Transform'].split('\n')[-1], 'filter:')
+        self.assertEqual(len(properties['EDID'].split('\n')), 8)
+        self.assertEqual(self.xrandr.state.outputs['DP-1'].properties, {
+            'Identifier': '0x44', 'link-status': 'Good\nsupported: Good, Bad',
+        })
+
+    def test_edid(self):
+        self.assertEqual(self.xrandr.state.outputs['eDP-1'].fingerprint, 'AUO-573d-00000000')
+        edid = self.xrandr.state.outputs['HDMI-1'].edid
+        self.assertEqual(edid.fingerprint, 'DEL-a06c-H7J4X68H2BKL')
+        self.assertEqual(edid.name, 'DELL U2415')
+
+    def test_tokens(self):
+        lines = fixtures.read('xrandr-verbose.txt').splitlines(True)
+        tokens = list(self.xrandr._load_raw_lines(lines))  # pylint: disable=protected-access
+        self.assertEqual([kind for (kind, _data) in tokens[:3]], ['screen', 'output', 'properties'])
+        self.assertIn(('mode', ('1920x1080i', '0x52', '1920', '1080', '60.00', False)), tokens)
+        self.assertIn(('mode', ('1920x1080', '0x47', '1920', '1080', '60.05', True)), tokens)
+        self.assertEqual(len([kind for (kind, _data) in tokens if kind == 'properties']), 3)
+
+    def test_commandline(self):
+        self.assertEqual(self.xrandr.configuration.commandlineargs(), [
+            '--output', 'eDP-1', '--primary', '--mode', '1920x1080', '--rate', '60.05', '--pos', '0x0',
+            '--rotate', 'normal',
+            '--output', 'HDMI-1', '--mode', '1920x1080', '--rate', '60.00', '--pos', '1920x0',
+            '--rotate', 'left',
+            '--output', 'DP-1', '--off',
+        ])
+
+
+def eager_properties(lines):
+    """The properties of each output as the tokenizer used to parse them
+    while reading, line by line, before they were parsed on demand"""
+    result = {}
+    output = prop = None  # prop is [name, value lines] of the property being read
+    for line in lines:
+        line = line.rstrip('\n')
+        if line.startswith('\t'):
+            if line[1:2].isspace():  # continuation of a property
+                if prop is not None:
+                    prop[1].append(line.strip())
+                continue
+            if prop is not None:
+                result[output][prop[0]] = '\n'.join(prop[1])
+            name, _colon, value = line[1:].partition(':')
+            prop = [name, [value.strip()] if value.strip() else []]
+            continue
+        if prop is not None:
+            result[output][prop[0]] = '\n'.join(prop[1])
+            prop = None
+        if line and not line.startswith(' ') and not line.startswith('Screen '):
+            output = line.split()[0]
+            result[output] = {}
+    if prop is not None:
+        result[output][prop[0]] = '\n'.join(prop[1])
+    return result
+
+
+class LazyPropertiesTest(unittest.TestCase):
+
+    def test_against_eager(self):
+        xrandr = fixtures.load()
+        expected = eager_properties(fixtures.read('xrandr-verbose.txt').splitlines(True))
+        self.assertEqual(set(expected), set(xrandr.state.outputs))
+        for name, output in xrandr.state.outputs.items():
+            self.assertEqual(output.properties, expected[name])
+
+    def test_parsed_on_demand(self):
+        output = fixtures.load().state.outputs['HDMI-1']
+        self.assertIsNotNone(output.raw_properties)
+        self.assertEqual(output.fingerprint, 'DEL-a06c-H7J4X68H2BKL')
+        self.assertIsNone(output.raw_properties)
+        self.assertIs(output.properties, output.properties)
+
+    def test_edge_cases(self):
+        block = (
+            "\t\tstray continuation\n"
+            "\tEDID: \n"
+            "\t\t00ff\n"
+            "\t\tffff\n"
+            "\tnon-desktop: 0 \n"
+            "\t\trange: (0, 1)\n"
+            "\tTearFree: off\n"
+            "\tBorder: 0 0 0 0\n"
+            "\t\trange: (0, 512)\n"
+            "\t\trange: (0, 512)\n"
+            "\tkey: a: b\n"
+            "\tempty:\n"
+        )
+        lines = ["HDMI-1 connected\n"] + block.splitlines(True)
+        self.assertEqual(parse_properties(block), eager_properties(lines)['HDMI-1'])
+        self.assertEqual(parse_properties(block)['key'], 'a: b')
+        self.assertEqual(parse_properties(block)['EDID'], '00ff\nffff')
+
+
+class CurrentParserTest(VerboseParserTest):
+    """``--current --verbose`` prints the same as ``--verbose``"""
+
+    query_mode = QueryMode.CURRENT
+
+
+class PlainParserTest(unittest.TestCase):
+    """``--current`` has neither properties nor mode ids, and lists the rates
+    of all modes of the same name on one line"""
+
+    def setUp(self):
+        self.xrandr = fixtures.load(QueryMode.PLAIN)
+
+    def test_outputs(self):
+        verbose = fixtures.load()
+        self.assertEqual(list(self.xrandr.state.outputs), list(verbose.state.outputs))
+        self.assertEqual(self.xrandr.configuration.diff(verbose.configuration), {})
+        self.assertEqual(self.xrandr.configuration.commandlineargs(), verbose.configuration.commandlineargs())
+
+    def test_modes(self):
+        self.assertEqual(modes(self.xrandr.state.outputs['HDMI-1']), [
+            ('1920x1080', (1920, 1080), ('60.00',)),
+            ('1920x1080i', (1920, 1080), ('60.00',)),
+            ('1280x720', (1280, 720), ('60.00', '50.00', '59.94')),
+        ])
+        # modes of disconnected outputs are not listed
+        self.assertEqual(modes(self.xrandr.state.outputs['DP-1']), [])
+
+    def test_no_properties(self):
+        for output in self.xrandr.state.outputs.values():
+            self.assertEqual(output.properties, {})
+            self.assertIsNone(output.fingerprint)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,182 @@
+# ARandR -- Another XRandR GUI
+# Copyright (C) 2008 -- 2011 chrysn <chrysn@fsfe.org>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests of telling monitors apart by their EDID, and of finding the layout
+scripts saved for them"""
+
+import hashlib
+import os
+import tempfile
+import unittest
+
+from screenlayout import profiles
+from screenlayout.edid import EDID
+from screenlayout.xrandr import SHELLSHEBANG
+
+import fixtures
+
+XRANDR_LINE = "xrandr --output eDP-1 --primary --mode 1920x1080 --pos 0x0 --rotate normal"
+FINGERPRINTS = "# fingerprints: AUO-573d-00000000 DEL-a06c-H7J4X68H2BKL"
+
+
+def edid_data(output_name):
+    """The EDID of an output in the xrandr fixture"""
+    return bytes.fromhex(''.join(fixtures.load().state.outputs[output_name].properties['EDID'].split()))
+
+
+class EDIDTest(unittest.TestCase):
+
+    def test_descriptors(self):
+        edid = EDID(edid_data('HDMI-1'))
+        self.assertEqual(edid.manufacturer, 'DEL')
+        self.assertEqual(edid.product, 0xa06c)
+        self.assertEqual(edid.serial, 'H7J4X68H2BKL')
+        self.assertEqual(edid.name, 'DELL U2415')
+        self.assertEqual(edid.fingerprint, 'DEL-a06c-H7J4X68H2BKL')
+
+    def test_numeric_serial(self):
+        # no serial number descriptor, and a serial number of 0
+        edid = EDID(edid_data('eDP-1'))
+        self.assertEqual(edid.manufacturer, 'AUO')
+        self.assertEqual(edid.serial, '00000000')
+        self.assertIsNone(edid.name)
+        self.assertEqual(edid.fingerprint, 'AUO-573d-00000000')
+
+    def test_serial_with_spaces(self):
+        data = bytearray(edid_data('HDMI-1'))
+        data[72 + 5:72 + 18] = b'AB 12\n       '
+        self.assertEqual(EDID(bytes(data)).fingerprint, 'DEL-a06c-AB_12')
+
+    def test_hash_fallback(self):
+        data = edid_data('HDMI-1')
+        for broken in (b'\x01' + data[1:], data[:100]):
+            self.assertEqual(
+                EDID(broken).fingerprint, 'edid-' + hashlib.sha1(broken[:128]).hexdigest()[:16]
+            )
+            self.assertIsNone(EDID(broken).manufacturer)
+        # only the base block counts
+        self.assertEqual(EDID(b'\x01' + data[1:] + b'extension').fingerprint, EDID(b'\x01' + data[1:]).fingerprint)
+
+    def test_from_hex(self):
+        text = fixtures.load().state.outputs['HDMI-1'].properties['EDID']
+        self.assertEqual(EDID.from_hex(text).fingerprint, 'DEL-a06c-H7J4X68H2BKL')
+        self.assertIsNone(EDID.from_hex(''))
+        self.assertIsNone(EDID.from_hex('not hex'))
+
+
+class ProfileIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.xrandr = fixtures.load()
+        self._directory = tempfile.TemporaryDirectory()
+        self.directory = self._directory.name
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def write(self, name, fingerprints, mtime=1000000000):
+        filename = os.path.join(self.directory, name)
+        with open(filename, 'w') as script:
+            script.write("\n".join([SHELLSHEBANG] + ([fingerprints] if fingerprints else []) + [XRANDR_LINE, ""]))
+        os.utime(filename, (mtime, mtime))
+        return filename
+
+    def test_key(self):
+        self.assertEqual(profiles.setup_key(self.xrandr.state), ('AUO-573d-00000000', 'DEL-a06c-H7J4X68H2BKL'))
+        self.assertEqual(profiles.fingerprints_line(self.xrandr.state), FINGERPRINTS)
+
+    def test_lookup(self):
+        docked = self.write('docked.sh', FINGERPRINTS)
+        self.write('laptop.sh', "# fingerprints: AUO-573d-00000000")
+        self.write('unmarked.sh', None)
+        self.write('notes.txt', FINGERPRINTS, mtime=2000000000)
+        index = profiles.ProfileIndex(self.directory)
+        self.assertEqual(len(index.profiles), 2)
+        self.assertEqual(index.lookup(self.xrandr.state), docked)
+
+        self.xrandr.configuration.outputs['HDMI-1'].active = False
+        self.xrandr.state.outputs['HDMI-1'].connected = False
+        self.assertEqual(index.lookup(self.xrandr.state), os.path.join(self.directory, 'laptop.sh'))
+        self.xrandr.state.outputs['eDP-1'].connected = False
+        self.assertIsNone(index.lookup(self.xrandr.state))
+
+    def test_most_recent(self):
+        self.write('old.sh', FINGERPRINTS, mtime=1000000000)
+        new = self.write('new.sh', "# fingerprints: DEL-a06c-H7J4X68H2BKL AUO-573d-00000000", mtime=1500000000)
+        index = profiles.ProfileIndex(self.directory)
+        self.assertEqual(index.lookup(self.xrandr.state), new)
+
+    def test_refresh(self):
+        index = profiles.ProfileIndex(self.directory)
+        self.assertIsNone(index.lookup(self.xrandr.state))
+        docked = self.write('docked.sh', FINGERPRINTS)
+        os.utime(self.directory, (2000000000, 2000000000))
+        index.refresh()
+        self.assertEqual(index.lookup(self.xrandr.state), docked)
+
+    def test_missing_directory(self):
+        index = profiles.ProfileIndex(os.path.join(self.directory, 'missing'))
+        self.assertEqual(index.profiles, {})
+        index.refresh()
+        self.assertIsNone(index.lookup(self.xrandr.state))
+
+    def test_apply(self):
+        filename = os.path.join(self.directory, 'docked.sh')
+        with open(filename, 'w') as script:
+            script.write("\n".join([SHELLSHEBANG, FINGERPRINTS, XRANDR_LINE + " --output HDMI-1 --off", ""]))
+        index = profiles.ProfileIndex(self.directory)
+        self.assertEqual(index.apply(self.xrandr), filename)
+        # only what differs from the current layout is applied
+        self.assertEqual(self.xrandr.backend.applied, [['--output', 'HDMI-1', '--off']])
+
+        self.xrandr.state.outputs['HDMI-1'].connected = False
+        self.assertIsNone(index.apply(self.xrandr))
+        self.assertEqual(len(self.xrandr.backend.applied), 1)
+
+
+class TemplateTest(unittest.TestCase):
+
+    def setUp(self):
+        self.xrandr = fixtures.load()
+
+    def test_user_script_unchanged(self):
+        script = "\n".join([SHELLSHEBANG, "# my layout", XRANDR_LINE, "xset s off", ""])
+        template = self.xrandr.load_from_string(script)
+        self.assertEqual(template, [SHELLSHEBANG, "# my layout", "%(xrandr)s", "xset s off"])
+        self.assertNotIn(profiles.FINGERPRINTS_PREFIX, self.xrandr.save_to_shellscript_string(template))
+
+    def test_fingerprints_updated(self):
+        script = "\n".join([SHELLSHEBANG, "# fingerprints: @eDP-1", XRANDR_LINE, ""])
+        template = self.xrandr.load_from_string(script)
+        self.assertEqual(template, [SHELLSHEBANG, "%(fingerprints)s", "%(xrandr)s"])
+        self.assertEqual(self.xrandr.save_to_shellscript_string(template).split("\n")[1], FINGERPRINTS)
+
+    def test_with_fingerprints(self):
+        template = [SHELLSHEBANG, "# my layout", "%(xrandr)s"]
+        self.assertEqual(
+            profiles.with_fingerprints(template), [SHELLSHEBANG, "%(fingerprints)s", "# my layout", "%(xrandr)s"]
+        )
+        self.assertEqual(template, [SHELLSHEBANG, "# my layout", "%(xrandr)s"])
+        self.assertEqual(profiles.with_fingerprints(self.xrandr.DEFAULTTEMPLATE), self.xrandr.DEFAULTTEMPLATE)
+
+    def test_in_directory(self):
+        self.assertTrue(profiles.in_directory('/home/user/.screenlayout/a.sh', '/home/user/.screenlayout/'))
+        self.assertFalse(profiles.in_directory('/home/user/.screenlayout/old/a.sh', '/home/user/.screenlayout'))
+        self.assertFalse(profiles.in_directory('/home/user/a.sh', '/home/user/.screenlayout'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+# ARandR -- Another XRandR GUI
+# Copyright (C) 2008 -- 2011 chrysn <chrysn@fsfe.org>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests of the profiling timers when used from several threads"""
+
+import threading
+import unittest
+
+from screenlayout import profiling
+
+
+class ProfilingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.was_enabled = profiling.enabled
+        profiling.enabled = True
+        profiling.reset()
+
+    def tearDown(self):
+        profiling.reset()
+        profiling.enabled = self.was_enabled
+
+    def test_exclude_only_own_thread(self):
+        other_done = threading.Event()
+
+        def other():
+            profiling.record('wait', 10.0)
+            other_done.set()
+
+        with profiling.timer('parse', exclude=('wait',)):
+            thread = threading.Thread(target=other)
+            thread.start()
+            other_done.wait()
+            thread.join()
+        # the other thread's wait is not subtracted from this thread's parsing
+        self.assertGreaterEqual(profiling.total('parse'), 0)
+        self.assertEqual(profiling.total('wait'), 10.0)
+
+        with profiling.timer('parse', exclude=('wait',)):
+            profiling.record('wait', 10.0)
+        self.assertLess(profiling.total('parse'), 1.0)
+
+    def test_concurrent_counts(self):
+        def work():
+            for _ in range(2000):
+                profiling.count('calls')
+                profiling.record('step', 0.001)
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(profiling.counters['calls'], 16000)
+        self.assertEqual(profiling.timers['step'][0], 16000)
+        self.assertIn('calls', profiling.summary())
+
+
+if __name__ == '__main__':
+    unittest.main()
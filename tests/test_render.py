@@ -0,0 +1,98 @@
+# ARandR -- Another XRandR GUI
+# Copyright (C) 2008 -- 2011 chrysn <chrysn@fsfe.org>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests of painting layouts
+
+They are skipped unless cairo and PangoCairo are available."""
+
+import os
+import tempfile
+import unittest
+
+try:
+    import cairo
+    import gi
+    gi.require_version('PangoCairo', '1.0')
+    from gi.repository import PangoCairo  # pylint: disable=unused-import
+except (ImportError, ValueError):
+    cairo = None  # pylint: disable=invalid-name
+else:
+    from screenlayout import render
+
+import fixtures
+
+
+def pixel(surface, x, y):
+    """(red, green, blue) of a pixel of an ARGB32 ImageSurface"""
+    data = surface.get_data()
+    offset = y * surface.get_stride() + x * 4
+    blue, green, red = data[offset], data[offset + 1], data[offset + 2]
+    return (red, green, blue)
+
+
+@unittest.skipIf(cairo is None, "needs cairo and PangoCairo")
+class RenderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.xrandr = fixtures.load()
+
+    def test_draw(self):
+        # the outputs cover 3000x1920 of the 3840x1080 screen; at 1/10 scale
+        surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, 400, 192)
+        renderer = render.Renderer(10)
+        context = cairo.Context(surface)
+        clip = renderer.set_up_scale(context)
+        self.assertEqual(clip, [0, 0, 4000, 1920])
+        renderer.draw(self.xrandr, context, clip=clip)
+        surface.flush()
+
+        self.assertEqual(set(renderer.drawn), {'eDP-1', 'HDMI-1'})
+        screen = pixel(surface, 350, 20)
+        outside = pixel(surface, 10, 180)
+        self.assertNotEqual(screen, outside)
+        self.assertEqual(pixel(surface, 350, 150), outside)
+        # inside the outputs, but away from their labels and frames
+        self.assertNotIn(pixel(surface, 20, 20), (screen, outside))
+        self.assertNotIn(pixel(surface, 200, 20), (screen, outside))
+
+    def test_exclude(self):
+        surface = cairo.ImageSurface(cairo.FORMAT_ARGB32, 400, 192)
+        renderer = render.Renderer(10)
+        context = cairo.Context(surface)
+        renderer.draw(self.xrandr, context, clip=renderer.set_up_scale(context), exclude='HDMI-1')
+        surface.flush()
+        self.assertEqual(set(renderer.drawn), {'eDP-1'})
+        self.assertEqual(pixel(surface, 200, 20), pixel(surface, 350, 20))
+
+    def test_render_png(self):
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'layout.png')
+            render.render(self.xrandr, filename, size=100)
+            surface = cairo.ImageSurface.create_from_png(filename)
+        self.assertEqual(max(surface.get_width(), surface.get_height()), 100)
+
+    def test_render_script(self):
+        with tempfile.TemporaryDirectory() as directory:
+            script = os.path.join(directory, 'layout.sh')
+            with open(script, 'w') as scriptfile:
+                scriptfile.write(self.xrandr.save_to_shellscript_string())
+            filename = os.path.join(directory, 'layout.svg')
+            render.render_script(script, filename, file_format='svg')
+            self.assertGreater(os.path.getsize(filename), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
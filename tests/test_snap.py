@@ -0,0 +1,151 @@
+# ARandR -- Another XRandR GUI
+# Copyright (C) 2008 -- 2011 chrysn <chrysn@fsfe.org>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests of Snap against the linear implementation it replaced"""
+
+import random
+import unittest
+
+from screenlayout.auxiliary import Position, Size
+from screenlayout.snap import Snap
+
+
+class LinearSnap:
+    """The previous Snap, which checks every candidate: it snaps each
+    coordinate to some edge or centre within the tolerance"""
+
+    def __init__(self, size, tolerance, positions):
+        self.tolerance = tolerance
+
+        self.horizontal = set()
+        self.vertical = set()
+        for i in positions:
+            self.vertical.add(i[0].left)
+            self.vertical.add(i[0].left + i[1].width)
+            self.horizontal.add(i[0].top)
+            self.horizontal.add(i[0].top + i[1].height)
+
+            self.vertical.add(i[0].left - size.width)
+            self.vertical.add(i[0].left + i[1].width - size.width)
+            self.horizontal.add(i[0].top - size.height)
+            self.horizontal.add(i[0].top + i[1].height - size.height)
+
+            self.vertical.add((i[0].left + i[1].width / 2) - size.width / 2)
+            self.horizontal.add((i[0].top + i[1].height / 2) - size.height / 2)
+
+    def candidates(self, position):
+        """The candidates the linear search accepts for each coordinate"""
+        return (
+            [x for x in self.vertical if abs(x - position[0]) < self.tolerance],
+            [y for y in self.horizontal if abs(y - position[1]) < self.tolerance],
+        )
+
+
+def edges(size, positions):
+    """Edge candidates (without centres) for each coordinate"""
+    vertical, horizontal = set(), set()
+    for position, other in positions:
+        vertical.update((
+            position.left, position.left + other.width,
+            position.left - size.width, position.left + other.width - size.width,
+        ))
+        horizontal.update((
+            position.top, position.top + other.height,
+            position.top - size.height, position.top + other.height - size.height,
+        ))
+    return vertical, horizontal
+
+
+def random_setup(rng):
+    size = Size((rng.randrange(10, 60), rng.randrange(10, 60)))
+    positions = [
+        (Position((rng.randrange(0, 200), rng.randrange(0, 200))), Size((rng.randrange(10, 60), rng.randrange(10, 60))))
+        for _ in range(rng.randrange(1, 6))
+    ]
+    return size, rng.randrange(1, 12), positions
+
+
+class SnapTest(unittest.TestCase):
+
+    def test_against_linear(self):
+        rng = random.Random(1)
+        for _ in range(300):
+            size, tolerance, positions = random_setup(rng)
+            snap = Snap(size, tolerance, positions)
+            linear = LinearSnap(size, tolerance, positions)
+            corners = list(Snap._corners(size, positions))  # pylint: disable=protected-access
+            vertical_edges, horizontal_edges = edges(size, positions)
+            for _point in range(50):
+                position = Position((rng.randrange(-60, 260), rng.randrange(-60, 260)))
+                suggested, kind = snap.snap(position)
+                linear_candidates = linear.candidates(position)
+
+                near_corners = [
+                    c for c in corners
+                    if abs(c[0] - position[0]) < tolerance and abs(c[1] - position[1]) < tolerance
+                ]
+                if near_corners:
+                    # corners take precedence, and the nearest one is used
+                    self.assertEqual(kind, Snap.CORNER)
+                    self.assertIn(tuple(suggested), near_corners)
+                    self.assertEqual(
+                        sum(abs(a - b) for (a, b) in zip(suggested, position)),
+                        min(abs(c[0] - position[0]) + abs(c[1] - position[1]) for c in near_corners)
+                    )
+                    self.assertTrue(all(linear_candidates))
+                    continue
+                self.assertNotEqual(kind, Snap.CORNER)
+
+                for axis, axis_edges in enumerate((vertical_edges, horizontal_edges)):
+                    # snapped exactly where the linear search found candidates
+                    if not linear_candidates[axis]:
+                        self.assertEqual(suggested[axis], position[axis])
+                        continue
+                    self.assertIn(suggested[axis], linear_candidates[axis])
+                    distance = abs(suggested[axis] - position[axis])
+                    near_edges = [e for e in axis_edges if abs(e - position[axis]) < tolerance]
+                    if near_edges:
+                        # edges take precedence over centres, nearest first
+                        self.assertIn(suggested[axis], near_edges)
+                        self.assertEqual(distance, min(abs(e - position[axis]) for e in near_edges))
+                        self.assertEqual(kind, Snap.EDGE)
+                    else:
+                        self.assertEqual(distance, min(abs(c - position[axis]) for c in linear_candidates[axis]))
+                        self.assertIn(kind, (Snap.EDGE, Snap.CENTRE))
+                if not any(linear_candidates):
+                    self.assertIsNone(kind)
+                    self.assertEqual(suggested, position)
+
+    def test_corner_tolerance_is_symmetric(self):
+        size = Size((100, 100))
+        snap = Snap(size, 10, [(Position((0, 0)), Size((100, 100)))])
+        # the corner at (100, 100) is diagonally adjacent
+        for offset in (-9, 9):
+            self.assertEqual(snap.snap(Position((100 + offset, 100)))[1], Snap.CORNER)
+            self.assertEqual(snap.snap(Position((100, 100 + offset)))[1], Snap.CORNER)
+        for offset in (-10, 10):
+            self.assertNotEqual(snap.snap(Position((100 + offset, 100)))[1], Snap.CORNER)
+            self.assertNotEqual(snap.snap(Position((100, 100 + offset)))[1], Snap.CORNER)
+
+    def test_nearest_candidate(self):
+        snap = Snap(Size((10, 10)), 10, [(Position((0, 0)), Size((100, 100)))])
+        # right edge candidates at 90 and 100 horizontally; 96 is nearer to 100
+        self.assertEqual(snap.suggest(Position((96, 300))), Position((100, 300)))
+        self.assertEqual(snap.suggest(Position((94, 300))), Position((90, 300)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,155 @@
+# ARandR -- Another XRandR GUI
+# Copyright (C) 2008 -- 2011 chrysn <chrysn@fsfe.org>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests of storing and replaying snapshots"""
+
+import unittest
+
+from screenlayout import snapshot
+from screenlayout.auxiliary import FileLoadError, FileSyntaxError, Position
+from screenlayout.xrandr import XRandR, Feature, QueryMode
+
+import fixtures
+
+VERSION = "xrandr program version       1.5.1\nServer reports RandR version 1.6\n"
+
+
+def recorded_snapshot():
+    """A snapshot taken through a RecordingBackend from the fixture"""
+    raw = fixtures.raw()
+    raw['--version'] = VERSION
+    xrandr = XRandR(backend=snapshot.RecordingBackend(snapshot.ReplayBackend({'raw': raw})))
+    xrandr.load_from_x()
+    return xrandr, snapshot.take(xrandr)
+
+
+def describe(xrandr):
+    """What should survive a round trip"""
+    return (
+        tuple(xrandr.state.virtual.min), tuple(xrandr.state.virtual.max),
+        [
+            (o.name, o.connected, sorted(o.rotations), dict(o.properties),
+             [(m.name, tuple(m), list(m.rates)) for m in o.modes])
+            for o in xrandr.state.outputs.values()
+        ],
+        tuple(xrandr.configuration.virtual),
+        xrandr.configuration.commandlineargs(),
+    )
+
+
+class SnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        self.xrandr, self.snapshot = recorded_snapshot()
+
+    def test_recorded(self):
+        # only the query and --version are recorded
+        self.assertEqual(set(self.snapshot['raw']), {'--verbose', '--version'})
+        self.assertEqual(self.snapshot['raw']['--verbose'], fixtures.read('xrandr-verbose.txt'))
+        self.assertEqual(self.snapshot['features'], sorted(self.xrandr.features))
+
+    def test_round_trip(self):
+        for binary in (False, True):
+            data = snapshot.dumps(self.snapshot, binary)
+            self.assertIsInstance(data, bytes if binary else str)
+            self.assertEqual(snapshot.loads(data), self.snapshot)
+        self.assertTrue(snapshot.dumps(self.snapshot, True).startswith(snapshot.BINARY_MAGIC))
+        self.assertLess(len(snapshot.dumps(self.snapshot, True)), len(snapshot.dumps(self.snapshot)))
+
+    def test_restore(self):
+        restored = XRandR(backend=snapshot.ReplayBackend(self.snapshot))
+        snapshot.restore(restored, snapshot.loads(snapshot.dumps(self.snapshot, True)))
+        self.assertEqual(describe(restored), describe(self.xrandr))
+        self.assertEqual(restored.configuration_diff(), {})
+        self.assertTrue(restored.state_is_cached)
+
+    def test_encoded_state(self):
+        # without raw output, the encoded state and configuration are used
+        encoded = dict(self.snapshot)
+        del encoded['raw']
+        replayed = XRandR(backend=snapshot.ReplayBackend(snapshot.loads(snapshot.dumps(encoded))))
+        replayed.load_from_x()
+        self.assertEqual(describe(replayed), describe(self.xrandr))
+
+    def test_output_without_rate(self):
+        # outputs that were switched on have no rate until one is chosen
+        output = self.xrandr.configuration.outputs['DP-1']
+        output.active = True
+        output.mode = self.xrandr.state.outputs['DP-1'].modes[0]
+        output.position = Position((0, 1080))
+        output.rotation = self.xrandr.configuration.outputs['eDP-1'].rotation
+        self.xrandr.loaded_configuration = self.xrandr.configuration
+        taken = snapshot.loads(snapshot.dumps(snapshot.take(self.xrandr)))
+        self.assertIsNone([o for o in taken['configuration']['outputs'] if o['name'] == 'DP-1'][0]['rate'])
+
+        restored = XRandR(backend=snapshot.ReplayBackend(taken))
+        snapshot.restore(restored, taken)
+        self.assertFalse(hasattr(restored.configuration.outputs['DP-1'], 'rate'))
+        self.assertEqual(list(restored.configuration.outputs['DP-1'].mode.rates), ['60.00'])
+
+    def test_raw_output(self):
+        text = fixtures.read('xrandr-verbose.txt')
+        self.assertEqual(snapshot.loads(text), snapshot.from_output(text))
+        self.assertEqual(set(snapshot.loads(text.encode('utf-8'))['raw']), {'--verbose'})
+        self.assertEqual(set(snapshot.from_output(fixtures.read('xrandr-plain.txt'))['raw']), {'--current'})
+
+    def test_invalid(self):
+        with self.assertRaises(FileSyntaxError):
+            snapshot.loads("{not json")
+        with self.assertRaises(FileSyntaxError):
+            snapshot.loads('{"format": "something else"}')
+        with self.assertRaises(FileSyntaxError):
+            snapshot.loads(snapshot.BINARY_MAGIC + b'not compressed')
+        with self.assertRaises(FileLoadError):
+            snapshot.loads('{"format": "%s", "version": %d}' % (snapshot.FORMAT, snapshot.FORMAT_VERSION + 1))
+
+
+class ReplayBackendTest(unittest.TestCase):
+
+    def test_query_modes(self):
+        backend = snapshot.ReplayBackend({'raw': {'--current': fixtures.read('xrandr-plain.txt')}})
+        # the verbose queries fall back to the recorded plain one
+        for query_mode in (QueryMode.PROBE, QueryMode.CURRENT, QueryMode.PLAIN):
+            xrandr = XRandR(backend=backend, query_mode=query_mode)
+            xrandr.load_from_x()
+            self.assertEqual(xrandr.state.outputs['eDP-1'].properties, {})
+            self.assertEqual(tuple(xrandr.configuration.outputs['HDMI-1'].position), (1920, 0))
+
+    def test_version(self):
+        self.assertIn(Feature.PRIMARY, XRandR(backend=snapshot.ReplayBackend({'raw': {}})).features)
+        old = XRandR(backend=snapshot.ReplayBackend({'raw': {}, 'features': []}))
+        self.assertNotIn(Feature.PRIMARY, old.features)
+
+    def test_apply(self):
+        xrandr = fixtures.load()
+        xrandr.configuration.outputs['HDMI-1'].position = Position((1920, 100))
+        xrandr.save_to_x()
+        xrandr.save_to_x(force=True)
+        self.assertEqual(xrandr.backend.applied, [
+            ['--output', 'HDMI-1', '--pos', '1920x100'],
+            xrandr.configuration.commandlineargs(),
+        ])
+
+    def test_missing(self):
+        backend = snapshot.ReplayBackend({'raw': {}})
+        with self.assertRaises(Exception):
+            backend.output('--verbose')
+        with self.assertRaises(Exception):
+            XRandR(backend=backend).load_from_x()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+# ARandR -- Another XRandR GUI
+# Copyright (C) 2008 -- 2011 chrysn <chrysn@fsfe.org>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests of GridIndex against checking every rectangle, and of ZOrder"""
+
+import random
+import unittest
+
+from screenlayout.spatial import GridIndex, ZOrder
+
+
+def linear_query(bounds, margin, x, y):
+    return set(
+        name for (name, (left, top, right, bottom)) in bounds.items()
+        if left - margin <= x <= right + margin and top - margin <= y <= bottom + margin
+    )
+
+
+class GridIndexTest(unittest.TestCase):
+
+    def test_against_linear(self):
+        rng = random.Random(1)
+        for _ in range(200):
+            bounds = {}
+            for number in range(rng.randrange(0, 8)):
+                left, top = rng.randrange(-500, 3000), rng.randrange(-500, 3000)
+                bounds['out%d' % number] = (left, top, left + rng.randrange(1, 2000), top + rng.randrange(1, 2000))
+            margin = rng.randrange(0, 30)
+            index = GridIndex(bounds, margin)
+            for _point in range(100):
+                x, y = rng.uniform(-600, 5100), rng.uniform(-600, 5100)
+                self.assertEqual(index.query(x, y), linear_query(bounds, margin, x, y))
+
+    def test_edges(self):
+        index = GridIndex({'a': (0, 0, 100, 100), 'b': (100, 0, 200, 100)}, margin=5)
+        self.assertEqual(index.query(100, 50), {'a', 'b'})
+        self.assertEqual(index.query(-5, -5), {'a'})
+        self.assertEqual(index.query(-5.5, 50), set())
+        self.assertEqual(index.query(205, 105), {'b'})
+        self.assertEqual(index.query(206, 50), set())
+
+    def test_empty(self):
+        self.assertEqual(GridIndex({}).query(0, 0), set())
+
+
+class ZOrderTest(unittest.TestCase):
+
+    def test_raise(self):
+        order = ZOrder(['a', 'b', 'c'])
+        self.assertEqual(list(order), ['a', 'b', 'c'])
+        order.raise_('a')
+        self.assertEqual(list(order), ['b', 'c', 'a'])
+        self.assertEqual(order.top(), 'a')
+        order.raise_('a')
+        self.assertEqual(list(order), ['b', 'c', 'a'])
+        order.raise_('d')
+        self.assertEqual(list(order), ['b', 'c', 'a', 'd'])
+        self.assertIn('d', order)
+        self.assertEqual(len(order), 4)
+
+    def test_lower(self):
+        order = ZOrder(['a', 'b', 'c', 'd'])
+        order.lower_below('d', 'b')
+        self.assertEqual(list(order), ['a', 'd', 'b', 'c'])
+        order.lower_below('c', 'a')
+        self.assertEqual(list(order), ['c', 'a', 'd', 'b'])
+        order.lower_below('a', 'a')
+        self.assertEqual(list(order), ['c', 'a', 'd', 'b'])
+        self.assertEqual(order.topmost(['a', 'c', 'd']), 'd')
+        self.assertEqual(order.bottommost(['a', 'b', 'd']), 'a')
+
+    def test_remove(self):
+        order = ZOrder(['a', 'b', 'c'])
+        order.remove('b')
+        self.assertNotIn('b', order)
+        self.assertEqual(list(order), ['a', 'c'])
+        order.raise_('b')
+        self.assertEqual(list(order), ['a', 'c', 'b'])
+
+    def test_repeated_lowering(self):
+        # every lowering halves the gap between the keys below 'b', until the
+        # keys are renumbered
+        order = ZOrder(['a', 'c', 'd', 'b'])
+        for number in range(200):
+            name = 'cd'[number % 2]
+            order.lower_below(name, 'b')
+            self.assertEqual(list(order), ['a', 'dc'[number % 2], name, 'b'])
+
+    def test_against_list(self):
+        rng = random.Random(1)
+        names = ['out%d' % i for i in range(6)]
+        order = ZOrder(names)
+        expected = list(names)
+        for _ in range(2000):
+            name, other = rng.choice(names), rng.choice(names)
+            if rng.random() < 0.5:
+                order.raise_(name)
+                expected.remove(name)
+                expected.append(name)
+            elif name != other:
+                order.lower_below(name, other)
+                expected.remove(name)
+                expected.insert(expected.index(other), name)
+            self.assertEqual(list(order), expected)
+            self.assertEqual(order.top(), expected[-1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+# ARandR -- Another XRandR GUI
+# Copyright (C) 2008 -- 2011 chrysn <chrysn@fsfe.org>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests of running xrandr, with a shell script standing in for it"""
+
+import os
+import stat
+import tempfile
+import threading
+import time
+import unittest
+import warnings
+
+from screenlayout.auxiliary import CallCancelled, CallTimeout
+from screenlayout.xrandr import SubprocessBackend, SHELLSHEBANG
+
+
+class SubprocessBackendTest(unittest.TestCase):
+
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.backend = SubprocessBackend(timeout=5)
+        self.backend.environ['PATH'] = self._directory.name + os.pathsep + self.backend.environ.get('PATH', '')
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def xrandr(self, *commands):
+        filename = os.path.join(self._directory.name, 'xrandr')
+        with open(filename, 'w') as script:
+            script.write("\n".join((SHELLSHEBANG,) + commands + ("",)))
+        os.chmod(filename, stat.S_IRWXU)
+
+    def test_output(self):
+        self.xrandr('echo "$@"', 'echo second line')
+        self.assertEqual(list(self.backend.output_lines('--verbose')), ["--verbose\n", "second line\n"])
+
+    def test_large_stderr(self):
+        # much more than fits in a pipe, written before stdout is closed
+        self.xrandr('head -c 1000000 /dev/zero | tr "\\0" x >&2', 'echo done')
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            self.assertEqual(list(self.backend.output_lines()), ["done\n"])
+        self.assertEqual(len(caught), 1)
+
+    def test_error(self):
+        self.xrandr('echo "cannot find mode" >&2', 'exit 1')
+        with self.assertRaisesRegex(Exception, "error code 1.*cannot find mode"):
+            list(self.backend.output_lines('--mode', 'x'))
+
+    def test_timeout(self):
+        self.xrandr('exec sleep 10')
+        self.backend.timeout = 0.2
+        start = time.time()
+        with self.assertRaises(CallTimeout):
+            list(self.backend.output_lines())
+        self.assertLess(time.time() - start, 5)
+
+    def test_cancel(self):
+        self.xrandr('exec sleep 10')
+        timer = threading.Timer(0.2, self.backend.cancel)
+        timer.start()
+        start = time.time()
+        try:
+            with self.assertRaises(CallCancelled):
+                list(self.backend.output_lines())
+        finally:
+            timer.cancel()
+        self.assertLess(time.time() - start, 5)
+        self.assertFalse(self.backend._running)  # pylint: disable=protected-access
+
+
+if __name__ == '__main__':
+    unittest.main()
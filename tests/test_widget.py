@@ -0,0 +1,72 @@
+# ARandR -- Another XRandR GUI
+# Copyright (C) 2008 -- 2011 chrysn <chrysn@fsfe.org>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests of editing a layout in the widget
+
+They are skipped unless cairo, GTK and a display are available."""
+
+import unittest
+
+try:
+    import cairo  # pylint: disable=unused-import
+    import gi
+    gi.require_version('Gtk', '3.0')
+    from gi.repository import Gdk
+except (ImportError, ValueError):
+    Gdk = None  # pylint: disable=invalid-name
+else:
+    from screenlayout.widget import ARandRWidget
+
+from screenlayout.xrandr import QueryMode
+
+import fixtures
+
+
+@unittest.skipIf(Gdk is None or Gdk.Display.get_default() is None, "needs cairo, GTK and a display")
+class WidgetTest(unittest.TestCase):
+
+    def setUp(self):
+        self.widget = ARandRWidget(
+            None, query_mode=QueryMode.CURRENT, backend=fixtures.load().backend
+        )
+        self.widget.load_from_x()
+        self.applied = self.widget._xrandr.backend.applied  # pylint: disable=protected-access
+        self.configuration = self.widget._xrandr.configuration  # pylint: disable=protected-access
+
+    def test_activate_output(self):
+        # DP-1 was off when the layout was loaded, so it has no rate yet
+        self.widget.set_active('DP-1', True)
+        self.assertEqual(self.configuration.outputs['DP-1'].rate, '60.00')
+        self.widget.save_to_x()
+        self.assertEqual(self.applied[-1], [
+            '--output', 'DP-1', '--mode', '1024x768', '--rate', '60.00', '--pos', '0x0', '--rotate', 'normal',
+        ])
+
+    def test_resolution_keeps_valid_rate(self):
+        state = self.widget._xrandr.state.outputs['eDP-1']  # pylint: disable=protected-access
+        self.widget.set_refresh_rate('eDP-1', '48.04')
+        self.widget.set_resolution('eDP-1', state.mode_by_name('1920x1080'))
+        self.assertEqual(self.configuration.outputs['eDP-1'].rate, '48.04')
+
+        # 48.04 is no rate of 1680x1050
+        self.widget.set_resolution('eDP-1', state.mode_by_name('1680x1050'))
+        self.assertEqual(self.configuration.outputs['eDP-1'].rate, '59.95')
+        self.widget.save_to_x()
+        self.assertEqual(self.applied[-1], ['--output', 'eDP-1', '--mode', '1680x1050', '--rate', '59.95'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,131 @@
+# ARandR -- Another XRandR GUI
+# Copyright (C) 2008 -- 2011 chrysn <chrysn@fsfe.org>
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests of the xcb backend against a virtual X server
+
+They are skipped unless the xcffib module and the Xvfb program are
+available."""
+
+import os
+import shutil
+import subprocess
+import time
+import unittest
+
+try:
+    import xcffib  # pylint: disable=unused-import
+except ImportError:
+    xcffib = None  # pylint: disable=invalid-name
+
+from screenlayout.xrandr import XRandR
+
+XVFB = shutil.which('Xvfb')
+
+
+@unittest.skipIf(xcffib is None or XVFB is None, "needs xcffib and Xvfb")
+class XCBBackendTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.display = None
+        for number in range(99, 199):
+            if not os.path.exists('/tmp/.X11-unix/X%d' % number) and not os.path.exists('/tmp/.X%d-lock' % number):
+                cls.display = ':%d' % number
+                break
+        cls.server = subprocess.Popen(
+            [XVFB, cls.display, '-screen', '0', '1024x768x24', '+extension', 'RANDR', '-nolisten', 'tcp'],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        deadline = time.time() + 10
+        while not os.path.exists('/tmp/.X11-unix/X%s' % cls.display[1:]):
+            if cls.server.poll() is not None or time.time() > deadline:
+                cls.server.kill()
+                raise unittest.SkipTest("Xvfb did not start")
+            time.sleep(0.05)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.terminate()
+        cls.server.wait()
+
+    def _xrandr(self):
+        from screenlayout.xcbbackend import XCBBackend  # pylint: disable=import-outside-toplevel
+        xrandr = XRandR(backend=XCBBackend(self.display))
+        xrandr.load_from_x()
+        return xrandr
+
+    def _output_name(self, xrandr):
+        return [name for (name, output) in xrandr.state.outputs.items() if output.connected][0]
+
+    def test_load(self):
+        xrandr = self._xrandr()
+        name = self._output_name(xrandr)
+        output = xrandr.configuration.outputs[name]
+        self.assertTrue(output.active)
+        self.assertEqual(tuple(output.size), (1024, 768))
+        self.assertEqual(tuple(xrandr.configuration.virtual), (1024, 768))
+        self.assertIn(output.mode, xrandr.state.outputs[name].modes)
+        self.assertEqual(xrandr.configuration_diff(), {})
+
+    def test_apply(self):
+        xrandr = self._xrandr()
+        name = self._output_name(xrandr)
+        try:
+            xrandr.configuration.outputs[name].active = False
+            xrandr.save_to_x()
+            self.assertFalse(self._xrandr().configuration.outputs[name].active)
+        finally:
+            xrandr.configuration.outputs[name].active = True
+            xrandr.save_to_x()
+        reloaded = self._xrandr()
+        self.assertTrue(reloaded.configuration.outputs[name].active)
+        self.assertEqual(reloaded.configuration.diff(xrandr.configuration), {})
+
+    def test_apply_unchanged(self):
+        xrandr = self._xrandr()
+        xrandr.save_to_x()  # nothing to do
+        xrandr.save_to_x(force=True)
+        self.assertEqual(self._xrandr().configuration.diff(xrandr.configuration), {})
+
+    def test_load_changes(self):
+        from screenlayout.events import Changes, RandRWatcher  # pylint: disable=import-outside-toplevel
+        watched = self._xrandr()
+        watcher = RandRWatcher(self.display)
+        name = self._output_name(watched)
+        xrandr = self._xrandr()
+        try:
+            xrandr.configuration.outputs[name].active = False
+            xrandr.save_to_x()
+
+            changes = Changes()
+            deadline = time.time() + 5
+            while not changes.crtcs and time.time() < deadline:
+                changes.update(watcher.pending())
+                time.sleep(0.05)
+            self.assertTrue(changes)
+
+            watched.load_changes(changes)
+            self.assertFalse(watched.configuration.outputs[name].active)
+            self.assertEqual(watched.configuration_diff(), {})
+            self.assertEqual(watched.configuration.diff(self._xrandr().configuration), {})
+        finally:
+            watcher.close()
+            xrandr.configuration.outputs[name].active = True
+            xrandr.save_to_x()
+
+
+if __name__ == '__main__':
+    unittest.main()